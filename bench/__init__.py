@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the scanner / parser pipeline (run from the repo root with python -m bench.<name>)."""
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Node counts and traversal time: raw parse tree vs. the lowered AST.
+
+    python -m bench.ast_lowering --copies 500
+
+A pass over the tree is modelled by a full pre-order walk that touches every
+node: over PTNode objects, over the TreeStore arrays and over the AST. The
+one-off cost of lowering itself is reported alongside.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+from typing import Callable, List
+
+from bench.common import SAMPLE, ReplayScanner, scan_all
+from bench.generator import GenConfig, generate
+from lowering import lower, walk
+from parse_tree import PTNode
+from parser import Parser
+
+
+def best_time(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    r = 0
+    while r < repeat:
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+        r += 1
+    return best
+
+
+def walk_ptnode(root: PTNode) -> int:
+    n = 0
+    stack: List[PTNode] = [root]
+    while stack:
+        node = stack.pop()
+        n += 1
+        stack.extend(node.children)
+    return n
+
+
+def report(label: str, src: str, repeat: int) -> None:
+    tokens, index = scan_all(src)
+    ptree = Parser(ReplayScanner(tokens, index), "int", "ptnode").parse()
+    view = Parser(ReplayScanner(tokens, index), "int", "store").parse()
+    ast = lower(view)
+
+    n_ptree = walk_ptnode(ptree)
+    n_ast = sum(1 for _ in walk(ast))
+
+    t_ptnode = best_time(lambda: walk_ptnode(ptree), repeat)
+    t_store = best_time(lambda: sum(1 for _ in view.store.walk()), repeat)
+    t_ast = best_time(lambda: sum(1 for _ in walk(ast)), repeat)
+    t_lower = best_time(lambda: lower(view), repeat)
+
+    print(f"{label}: {len(tokens)} tokens")
+    print(f"  parse tree nodes: {n_ptree:10d}")
+    print(f"  AST nodes:        {n_ast:10d}   ({n_ptree / n_ast:.1f}x fewer)")
+    print(f"  walk PTNode:      {t_ptnode * 1e3:10.2f} ms")
+    print(f"  walk TreeStore:   {t_store * 1e3:10.2f} ms")
+    print(f"  walk AST:         {t_ast * 1e3:10.2f} ms   ({t_ptnode / t_ast:.1f}x faster than PTNode)")
+    print(f"  lower (once):     {t_lower * 1e3:10.2f} ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--copies", type=int, default=500, help="number of sample program copies")
+    ap.add_argument("--decls", type=int, default=400, help="declarations in the generated program")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    report("sample", "".join(SAMPLE.format(i=i) for i in range(args.copies)), args.repeat)
+    report("generated", generate(GenConfig(decls=args.decls, depth=12, seed=1)), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
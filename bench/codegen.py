@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Generated parser vs. the table-driven engines: cross-check, then ns/token.
+
+    python -m bench.codegen --programs 200
+
+Every generated program, with and without injected errors, is parsed by the
+"int" and "gen" engines; trees and error lists must match (exit status 1 on
+the first mismatch). The timing uses the sample program with no tree built.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from typing import List, Tuple
+
+from bench.common import SAMPLE, ReplayScanner, scan_all
+from bench.generator import GenConfig, generate
+from parse_tree import render_tree
+from parser import Parser
+from scanner import Scanner, Token
+from source_index import LineIndex
+
+
+def parse_with(src: str, engine: str) -> Tuple[str, List[str]]:
+    parser = Parser(Scanner(src, "regex"), engine, "store")
+    tree = parser.parse()
+    return render_tree(tree), parser.errors
+
+
+def cross_check(programs: int, seed: int) -> int:
+    checked = 0
+    i = 0
+    while i < programs:
+        cfg = GenConfig(
+            decls=20,
+            depth=10,
+            garbage_rate=0.01 if i % 3 == 2 else 0.0,
+            error_rate=0.02 if i % 2 else 0.0,
+            seed=seed + i,
+        )
+        src = generate(cfg)
+        if parse_with(src, "int") != parse_with(src, "gen"):
+            print(f"MISMATCH: {cfg}")
+            sys.exit(1)
+        checked += 1
+        i += 1
+    return checked
+
+
+def best_of(tokens: List[Token], index: LineIndex, engine: str, repeat: int) -> float:
+    best = float("inf")
+    r = 0
+    while r < repeat:
+        parser = Parser(ReplayScanner(tokens, index), engine, "none")
+        t0 = time.perf_counter()
+        parser.parse()
+        best = min(best, time.perf_counter() - t0)
+        r += 1
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--programs", type=int, default=200, help="generated programs to cross-check")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--copies", type=int, default=500, help="number of sample program copies")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"cross-checked: {cross_check(args.programs, args.seed)} programs, trees and errors identical")
+
+    src = "".join(SAMPLE.format(i=i) for i in range(args.copies))
+    tokens, index = scan_all(src)
+    n = len(tokens)
+
+    t_int = best_of(tokens, index, "int", args.repeat)
+    t_gen = best_of(tokens, index, "gen", args.repeat)
+
+    print(f"tokens: {n}")
+    print(f"int engine: {t_int * 1e9 / n:8.1f} ns/token")
+    print(f"gen engine: {t_gen * 1e9 / n:8.1f} ns/token")
+    print(f"speedup:    {t_int / t_gen:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Helpers shared by the benchmarks."""
+
+from __future__ import annotations
+
+from typing import List, Tuple
+
+from scanner import Scanner, Token
+from source_index import LineIndex
+
+
+SAMPLE = """
+int g{i};
+int arr{i}[10];
+void f{i}(int a, int b[]) {{
+    int k;
+    for (k = 0; k < 10; k = k + 1) {{
+        if (a == b[k]) break; else a = a * 2 - (b[k] / 3);
+    }}
+    return;
+}}
+int main{i}(void) {{
+    int x;
+    x = f{i}(1, arr{i}) + g{i};
+    return x;
+}}
+"""
+
+
+class ReplayScanner:
+    """Hands out pre-scanned tokens so only the parser is measured."""
+
+    def __init__(self, tokens: List[Token], index: LineIndex):
+        self.tokens = tokens
+        self.index = index
+        self.i = 0
+
+    def get_next_token(self) -> Token:
+        tok = self.tokens[self.i]
+        if self.i < len(self.tokens) - 1:
+            self.i += 1
+        return tok
+
+
+def scan_all(src: str, engine: str = "regex") -> Tuple[List[Token], LineIndex]:
+    scanner = Scanner(src, engine)
+    out: List[Token] = []
+    while True:
+        tok = scanner.get_next_token()
+        out.append(tok)
+        if tok.typ == "EOF":
+            return out, scanner.index
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Synthetic C-minus program generator driven by grammar.GRAMMAR.
+
+Programs are random derivations of the grammar (so they parse cleanly),
+optionally decorated with comments and damaged with garbage / token errors.
+
+    python -m bench.generator --decls 100 --depth 12 --error-rate 0.01 > prog.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from grammar import EPS, GRAMMAR, NONTERMINALS
+
+
+@dataclass
+class GenConfig:
+    decls: int = 100                # top-level declarations
+    depth: int = 12                 # derivation depth after which the shortest production is forced
+    comment_rate: float = 0.0       # probability of a comment between two tokens
+    id_len: int = 6                 # mean identifier length
+    garbage_rate: float = 0.0       # probability of garbage characters between two tokens
+    error_rate: float = 0.0         # probability of dropping / duplicating / replacing a token
+    seed: int = 0
+
+
+_KEYWORDS = {"break", "else", "for", "if", "int", "return", "void"}
+_GARBAGE = ["$", "@@", "#x", "!", "12abc", "a$b", "?", "007", "~~", "*/"]
+_RANDOM_TERMINALS = [";", "(", ")", "{", "}", "[", "]", "=", "==", "<", "+", "-", "*", ",", "int", "if", "else"]
+
+
+def _min_heights(grammar: Dict[str, List[List[str]]]) -> Dict[str, int]:
+    # Height of the shortest derivation tree of every nonterminal (fixed point)
+    inf = 1 << 30
+    height: Dict[str, int] = {A: inf for A in grammar}
+    changed = True
+    while changed:
+        changed = False
+        items = list(grammar.items())
+        i = 0
+        while i < len(items):
+            A, prods = items[i]
+            j = 0
+            while j < len(prods):
+                h = 1 + max([height[s] for s in prods[j] if s in grammar] or [0])
+                if h < height[A]:
+                    height[A] = h
+                    changed = True
+                j += 1
+            i += 1
+    return height
+
+
+_HEIGHT = _min_heights(GRAMMAR)
+
+
+def _shortest(A: str) -> List[str]:
+    prods = GRAMMAR[A]
+    best = prods[0]
+    best_h = 1 << 30
+    i = 0
+    while i < len(prods):
+        h = max([_HEIGHT[s] for s in prods[i] if s in GRAMMAR] or [0])
+        if h < best_h:
+            best, best_h = prods[i], h
+        i += 1
+    return best
+
+
+class Generator:
+    def __init__(self, cfg: GenConfig):
+        self.cfg = cfg
+        self.rng = random.Random(cfg.seed)
+
+    def identifier(self) -> str:
+        rng = self.rng
+        n = max(1, int(rng.expovariate(1.0 / self.cfg.id_len)) + 1)
+        first = "abcdefghijklmnopqrstuvwxyz_"
+        rest = first + "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+        while True:
+            name = rng.choice(first) + "".join(rng.choice(rest) for _ in range(n - 1))
+            if name not in _KEYWORDS:
+                return name
+
+    def lexeme(self, terminal: str) -> str:
+        if terminal == "ID":
+            return self.identifier()
+        if terminal == "NUM":
+            return str(self.rng.randint(0, 9999))
+        return terminal
+
+    def terminals(self) -> List[str]:
+        """A random sentence of the grammar, as a list of terminals."""
+        cfg = self.cfg
+        rng = self.rng
+        out: List[str] = []
+        decls = 0
+
+        stack: List[Tuple[str, int]] = [("Program", 0)]
+        while stack:
+            sym, depth = stack.pop()
+            if sym not in NONTERMINALS:
+                out.append(sym)
+                continue
+
+            if sym == "Declaration-list" and depth <= 1:
+                # Top-level chain: exactly cfg.decls declarations
+                prod = GRAMMAR[sym][0] if decls < cfg.decls else [EPS]
+                decls += 1
+            elif depth >= cfg.depth or rng.random() < depth / (2.0 * cfg.depth):
+                prod = _shortest(sym)
+            else:
+                prod = rng.choice(GRAMMAR[sym])
+
+            # The top-level Declaration-list stays at depth 1 so it is recognised
+            child_depth = depth if sym == "Declaration-list" and depth <= 1 else depth + 1
+            i = len(prod) - 1
+            while i >= 0:
+                if prod[i] != EPS:
+                    stack.append((prod[i], child_depth if prod[i] == "Declaration-list" else depth + 1))
+                i -= 1
+
+        return out
+
+    def damage(self, terms: List[str]) -> List[str]:
+        rate = self.cfg.error_rate
+        if rate <= 0:
+            return terms
+        rng = self.rng
+        out: List[str] = []
+        i = 0
+        while i < len(terms):
+            t = terms[i]
+            r = rng.random()
+            if r < rate / 3:
+                pass                                    # drop it
+            elif r < 2 * rate / 3:
+                out.append(t)
+                out.append(t)                           # duplicate it
+            elif r < rate:
+                out.append(rng.choice(_RANDOM_TERMINALS))   # replace it
+            else:
+                out.append(t)
+            i += 1
+        return out
+
+    def comment(self) -> str:
+        rng = self.rng
+        words = " ".join(self.identifier() for _ in range(rng.randint(1, 8)))
+        if rng.random() < 0.5:
+            return f"// {words}\n"
+        return f"/* {words}\n   {words} */"
+
+    def source(self) -> str:
+        cfg = self.cfg
+        rng = self.rng
+        terms = self.damage(self.terminals())
+
+        parts: List[str] = []
+        i = 0
+        while i < len(terms):
+            t = terms[i]
+            parts.append(self.lexeme(t))
+            if cfg.comment_rate and rng.random() < cfg.comment_rate:
+                parts.append(" " + self.comment())
+            if cfg.garbage_rate and rng.random() < cfg.garbage_rate:
+                parts.append(" " + rng.choice(_GARBAGE))
+            if t in (";", "{", "}"):
+                parts.append("\n")
+            else:
+                parts.append(" ")
+            i += 1
+        return "".join(parts)
+
+
+def generate(cfg: GenConfig) -> str:
+    return Generator(cfg).source()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Emit a synthetic C-minus program on stdout.")
+    ap.add_argument("--decls", type=int, default=GenConfig.decls)
+    ap.add_argument("--depth", type=int, default=GenConfig.depth)
+    ap.add_argument("--comment-rate", type=float, default=GenConfig.comment_rate)
+    ap.add_argument("--id-len", type=int, default=GenConfig.id_len)
+    ap.add_argument("--garbage-rate", type=float, default=GenConfig.garbage_rate)
+    ap.add_argument("--error-rate", type=float, default=GenConfig.error_rate)
+    ap.add_argument("--seed", type=int, default=GenConfig.seed)
+    args = ap.parse_args()
+
+    print(generate(GenConfig(
+        decls=args.decls,
+        depth=args.depth,
+        comment_rate=args.comment_rate,
+        id_len=args.id_len,
+        garbage_rate=args.garbage_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Latency per edit: incremental.reparse vs. a full scan + parse of the edited text."""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from typing import List
+
+from bench.common import SAMPLE
+from incremental import Edit, parse_document, reparse
+from parser import Parser
+from scanner import Scanner
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--copies", type=int, default=500, help="number of sample program copies")
+    ap.add_argument("--edits", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    text = "".join(SAMPLE.format(i=i) for i in range(args.copies))
+    state = parse_document(text)
+
+    incr: List[float] = []
+    full: List[float] = []
+    e = 0
+    while e < args.edits:
+        # Typing inside a function body: insert a statement, or a newline half the time
+        anchor = state.text.find("return", rng.randrange(len(state.text) - 100))
+        if anchor < 0:
+            continue
+        inserted = "x = x + 1; " if e % 2 else "\n"
+
+        t0 = time.perf_counter()
+        state = reparse(state, Edit(anchor, 0, inserted))
+        incr.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        Parser(Scanner(state.text, "regex"), "int").parse()
+        full.append(time.perf_counter() - t0)
+        e += 1
+
+    print(f"source: {len(state.text)} chars, {len(state.tokens)} tokens, {len(state.decls)} declarations")
+    print(f"incremental reparse: {statistics.median(incr) * 1e3:8.2f} ms/edit (median)")
+    print(f"full scan + parse:   {statistics.median(full) * 1e3:8.2f} ms/edit (median)")
+    print(f"speedup:             {statistics.median(full) / statistics.median(incr):8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
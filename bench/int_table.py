@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Per-token cost of the dict-driven parser vs. the integer-coded table driver."""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import List
+
+from bench.common import SAMPLE, ReplayScanner, scan_all
+from parser import Parser
+from scanner import Token
+from source_index import LineIndex
+
+
+def best_of(tokens: List[Token], index: LineIndex, engine: str, repeat: int) -> float:
+    best = float("inf")
+    r = 0
+    while r < repeat:
+        parser = Parser(ReplayScanner(tokens, index), engine)
+        t0 = time.perf_counter()
+        parser.parse()
+        best = min(best, time.perf_counter() - t0)
+        r += 1
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--copies", type=int, default=500, help="number of sample program copies")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    src = "".join(SAMPLE.format(i=i) for i in range(args.copies))
+    tokens, index = scan_all(src)
+    n = len(tokens)
+
+    t_dict = best_of(tokens, index, "dict", args.repeat)
+    t_int = best_of(tokens, index, "int", args.repeat)
+
+    print(f"tokens: {n}")
+    print(f"dict engine: {t_dict * 1e9 / n:8.1f} ns/token")
+    print(f"int engine:  {t_int * 1e9 / n:8.1f} ns/token")
+    print(f"speedup:     {t_dict / t_int:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""compile_many on a thread pool vs. a process pool, by worker count.
+
+    python -m bench.library_api --files 200 --workers 1,2,4
+
+Every run compiles the same generated programs and must return the same
+results as a serial compile_source loop. Threads only run in parallel on a
+free-threaded CPython build (the GIL state is printed first); processes
+pay for pickling each source and result instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List
+
+from bench.generator import GenConfig, generate
+from compiler import CompileResult, compile_many, compile_source
+
+
+def timed(make: Callable[[int], Executor], workers: int, sources: List[str], expected: List[CompileResult]) -> float:
+    with make(workers) as executor:
+        compile_many(sources[:workers], executor=executor, workers=workers)      # start-up and warm-up
+        t0 = time.perf_counter()
+        results = compile_many(sources, executor=executor, workers=workers)
+        elapsed = time.perf_counter() - t0
+    if results != expected:
+        print(f"MISMATCH with {make.__name__} x{workers}")
+        sys.exit(1)
+    return elapsed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200, help="number of generated programs")
+    ap.add_argument("--decls", type=int, default=40, help="declarations per program")
+    ap.add_argument("--workers", default=None, help="comma-separated worker counts (default: 1,2,4,.. up to CPUs)")
+    args = ap.parse_args()
+
+    cpus = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(w) for w in args.workers.split(",")]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= cpus:
+            counts.append(counts[-1] * 2)
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    sources = [generate(GenConfig(decls=args.decls, depth=10, error_rate=0.01, seed=i)) for i in range(args.files)]
+    total = sum(len(s) for s in sources)
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, {cpus} CPU(s)")
+    print(f"{len(sources)} sources, {total} characters")
+
+    t0 = time.perf_counter()
+    expected = [compile_source(s) for s in sources]
+    serial = time.perf_counter() - t0
+    print(f"serial:             {serial * 1e3:9.1f} ms")
+
+    i = 0
+    while i < len(counts):
+        w = counts[i]
+        t_thread = timed(ThreadPoolExecutor, w, sources, expected)
+        t_proc = timed(ProcessPoolExecutor, w, sources, expected)
+        print(
+            f"{w:3d} worker(s): threads {t_thread * 1e3:9.1f} ms ({serial / t_thread:4.2f}x)   "
+            f"processes {t_proc * 1e3:9.1f} ms ({serial / t_proc:4.2f}x)"
+        )
+        i += 1
+
+
+if __name__ == "__main__":
+    main()
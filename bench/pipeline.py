@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""End-to-end scan + parse time: in-process scanner vs. the pipelined scanner process.
+
+    python -m bench.pipeline --decls 4000
+
+A generated program is written to a temporary file and parsed from there,
+as main.py does, with each scanner engine and with and without building
+the tree. Trees and errors are checked to be identical before timing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+from bench.generator import GenConfig, generate
+from parse_tree import render_tree
+from parser import Parser
+from pipeline import PipelinedScanner
+from scanner import Scanner
+
+
+def run(make_scanner: Callable[[], object], engine: str, tree: str) -> Tuple[object, List[str]]:
+    scanner = make_scanner()
+    parser = Parser(scanner, engine, tree)
+    result = parser.parse()
+    scanner.close()
+    return result, parser.errors
+
+
+def best_time(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    r = 0
+    while r < repeat:
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+        r += 1
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--decls", type=int, default=4000, help="declarations in the generated program")
+    ap.add_argument("--error-rate", type=float, default=0.001)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    src = generate(GenConfig(decls=args.decls, depth=12, comment_rate=0.05, error_rate=args.error_rate, seed=1))
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(src)
+    try:
+        print(f"input: {len(src)} characters")
+        cases = [
+            ("char", "dict", "ptnode"),
+            ("char", "int", "store"),
+            ("regex", "int", "store"),
+            ("regex", "int", "none"),
+        ]
+        i = 0
+        while i < len(cases):
+            scan, engine, tree = cases[i]
+
+            def serial() -> Tuple[object, List[str]]:
+                return run(lambda: Scanner.from_file(path, scan), engine, tree)
+
+            def piped() -> Tuple[object, List[str]]:
+                return run(lambda: PipelinedScanner.from_file(path, scan), engine, tree)
+
+            a, b = serial(), piped()
+            if a[1] != b[1] or (tree != "none" and render_tree(a[0]) != render_tree(b[0])):
+                print(f"MISMATCH: scanner={scan} engine={engine} tree={tree}")
+                sys.exit(1)
+
+            t_serial = best_time(serial, args.repeat)
+            t_piped = best_time(piped, args.repeat)
+            print(
+                f"scanner={scan:5s} engine={engine:4s} tree={tree:6s}  "
+                f"in-process {t_serial * 1e3:8.1f} ms  pipelined {t_piped * 1e3:8.1f} ms  "
+                f"({t_serial / t_piped:.2f}x)"
+            )
+            i += 1
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
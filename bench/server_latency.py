@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Per-snippet latency: one-shot main.py vs. the warm compile server.
+
+    python -m bench.server_latency --snippets 50 --workers 2
+
+Three ways of compiling the same small generated programs are timed:
+a fresh `python main.py` per snippet, a fresh `python client.py` per snippet
+talking to a running server.py, and one persistent client connection.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from bench.generator import GenConfig, generate
+from client import Client
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def latencies(fn: Callable[[int], None], n: int) -> List[float]:
+    out: List[float] = []
+    i = 0
+    while i < n:
+        t0 = time.perf_counter()
+        fn(i)
+        out.append(time.perf_counter() - t0)
+        i += 1
+    return out
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "median_ms": statistics.median(ordered) * 1e3,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e3,
+        "mean_ms": statistics.fmean(ordered) * 1e3,
+    }
+
+
+def wait_for(path: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise SystemExit(f"server did not create {path} within {timeout:.0f} s")
+        time.sleep(0.02)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--snippets", type=int, default=30)
+    ap.add_argument("--decls", type=int, default=3, help="top-level declarations per snippet")
+    ap.add_argument("--workers", type=int, default=1, help="server worker processes")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dirs: List[str] = []
+        sources: List[str] = []
+        i = 0
+        while i < args.snippets:
+            src = generate(GenConfig(decls=args.decls, depth=8, seed=i))
+            d = os.path.join(tmp, f"s{i}")
+            os.makedirs(d)
+            with open(os.path.join(d, "input.txt"), "w", encoding="utf-8") as f:
+                f.write(src)
+            dirs.append(d)
+            sources.append(src)
+            i += 1
+
+        def one_shot(k: int) -> None:
+            subprocess.run([sys.executable, os.path.join(ROOT, "main.py")], cwd=dirs[k], check=True)
+
+        sock = os.path.join(tmp, "server.sock")
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "server.py"), "--socket", sock, "-j", str(args.workers)], cwd=ROOT
+        )
+        try:
+            wait_for(sock, 30.0)
+
+            def client_process(k: int) -> None:
+                subprocess.run(
+                    [sys.executable, os.path.join(ROOT, "client.py"), "--socket", sock, "input.txt"],
+                    cwd=dirs[k],
+                    check=True,
+                )
+
+            with Client(sock) as conn:
+                conn.compile(sources[0])    # let the workers start before timing
+
+                def persistent(k: int) -> None:
+                    conn.compile(sources[k])
+
+                results = {
+                    "one-shot main.py": summarize(latencies(one_shot, args.snippets)),
+                    "client.py process": summarize(latencies(client_process, args.snippets)),
+                    "persistent client": summarize(latencies(persistent, args.snippets)),
+                }
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.snippets} snippets of {args.decls} declarations, server with {args.workers} worker(s)")
+    print(f"{'mode':20s} {'median ms':>10s} {'p95 ms':>10s} {'mean ms':>10s}")
+    names = list(results)
+    i = 0
+    while i < len(names):
+        r = results[names[i]]
+        print(f"{names[i]:20s} {r['median_ms']:10.2f} {r['p95_ms']:10.2f} {r['mean_ms']:10.2f}")
+        i += 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Cold-start cost of the grammar tables: computed at import vs. loaded from the artifact."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import grammar
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child process: time the import of the parser (which pulls in the tables)
+CHILD = (
+    "import time; t0 = time.perf_counter(); import parser; "
+    "print(time.perf_counter() - t0)"
+)
+
+
+def run_child(env: Dict[str, str]) -> Tuple[float, float]:
+    t0 = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env, check=True, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - t0
+    return wall, float(out.stdout.strip())
+
+
+def measure(env: Dict[str, str], repeat: int) -> Tuple[List[float], List[float]]:
+    walls: List[float] = []
+    imports: List[float] = []
+    r = 0
+    while r < repeat:
+        wall, imp = run_child(env)
+        walls.append(wall)
+        imports.append(imp)
+        r += 1
+    return walls, imports
+
+
+def in_process(fn: Callable[[], object], repeat: int) -> float:
+    times: List[float] = []
+    r = 0
+    while r < repeat:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        r += 1
+    return statistics.median(times)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        artifact = os.path.join(tmp, "grammar_tables.bin")
+        grammar.write_cache(artifact, grammar.compute_tables())
+
+        t_compute = in_process(grammar.compute_tables, args.repeat * 10)
+        t_load = in_process(lambda: grammar.read_cache(artifact), args.repeat * 10)
+        print(f"compute tables: {t_compute * 1e3:7.3f} ms   load artifact: {t_load * 1e3:7.3f} ms")
+
+        base = dict(os.environ)
+        runs = [
+            ("no artifact", dict(base, GRAMMAR_CACHE="")),
+            ("artifact", dict(base, GRAMMAR_CACHE=artifact)),
+        ]
+
+        # Warm the .pyc files so both variants pay the same bytecode cost
+        run_child(runs[1][1])
+
+        i = 0
+        while i < len(runs):
+            label, env = runs[i]
+            walls, imports = measure(env, args.repeat)
+            print(
+                f"{label:12s} import parser: {statistics.median(imports) * 1e3:7.2f} ms"
+                f"   process wall: {statistics.median(walls) * 1e3:7.2f} ms (median of {args.repeat})"
+            )
+            i += 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite: scanner, parser and renderer throughput on generated programs.
+
+    python -m bench.suite --out results.json
+    python -m bench.suite --out new.json --compare results.json --threshold 0.10
+
+Each scenario is generated with bench.generator; the phases are timed
+separately (best of --repeat runs) and peak memory is measured in an extra
+tracemalloc run per phase. --compare exits with status 1 when a throughput
+drops by more than --threshold against the given results file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from bench.common import ReplayScanner, scan_all
+from bench.generator import GenConfig, generate
+from parse_tree import render_tree
+from parser import Parser
+
+
+SCENARIOS: Dict[str, GenConfig] = {
+    "valid": GenConfig(decls=400, depth=12, seed=1),
+    "deep": GenConfig(decls=40, depth=60, seed=2),
+    "comments": GenConfig(decls=400, depth=12, comment_rate=0.3, seed=3),
+    "long-ids": GenConfig(decls=400, depth=12, id_len=40, seed=4),
+    "broken": GenConfig(decls=400, depth=12, garbage_rate=0.05, error_rate=0.03, seed=5),
+}
+
+
+def count_nodes(root) -> int:
+    n = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        n += 1
+        stack.extend(node.children)
+    return n
+
+
+def best_time(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    r = 0
+    while r < repeat:
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+        r += 1
+    return best
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_scenario(cfg: GenConfig, scanner_engine: str, parser_engine: str, repeat: int) -> Dict[str, object]:
+    src = generate(cfg)
+    tokens, index = scan_all(src, scanner_engine)
+    tree = Parser(ReplayScanner(tokens, index), parser_engine).parse()
+    n_tokens = len(tokens)
+    n_nodes = count_nodes(tree)
+
+    def scan() -> object:
+        return scan_all(src, scanner_engine)
+
+    def parse() -> object:
+        return Parser(ReplayScanner(tokens, index), parser_engine).parse()
+
+    def validate() -> object:
+        return Parser(ReplayScanner(tokens, index), "int", "none").parse()
+
+    def render() -> object:
+        return render_tree(tree)
+
+    phases: Dict[str, Dict[str, float]] = {}
+    t = best_time(scan, repeat)
+    phases["scan"] = {"seconds": t, "tokens_per_sec": n_tokens / t, "peak_bytes": peak_memory(scan)}
+    t = best_time(parse, repeat)
+    phases["parse"] = {
+        "seconds": t,
+        "tokens_per_sec": n_tokens / t,
+        "nodes_per_sec": n_nodes / t,
+        "peak_bytes": peak_memory(parse),
+    }
+    t = best_time(validate, repeat)
+    phases["validate"] = {"seconds": t, "tokens_per_sec": n_tokens / t, "peak_bytes": peak_memory(validate)}
+    t = best_time(render, repeat)
+    phases["render"] = {"seconds": t, "nodes_per_sec": n_nodes / t, "peak_bytes": peak_memory(render)}
+
+    return {
+        "config": vars(cfg),
+        "chars": len(src),
+        "tokens": n_tokens,
+        "nodes": n_nodes,
+        "phases": phases,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(new: Dict[str, object], old: Dict[str, object], threshold: float) -> List[str]:
+    """Return one line per throughput metric that dropped by more than threshold."""
+    regressions: List[str] = []
+    names = sorted(set(new["scenarios"]) & set(old["scenarios"]))
+    i = 0
+    while i < len(names):
+        name = names[i]
+        new_phases = new["scenarios"][name]["phases"]
+        old_phases = old["scenarios"][name]["phases"]
+        phase_names = sorted(set(new_phases) & set(old_phases))
+        j = 0
+        while j < len(phase_names):
+            phase = phase_names[j]
+            metrics = sorted(k for k in new_phases[phase] if k.endswith("_per_sec") and k in old_phases[phase])
+            k = 0
+            while k < len(metrics):
+                m = metrics[k]
+                before = old_phases[phase][m]
+                after = new_phases[phase][m]
+                if before > 0 and (before - after) / before > threshold:
+                    regressions.append(f"{name}/{phase}/{m}: {before:,.0f} -> {after:,.0f} ({after / before - 1:+.1%})")
+                k += 1
+            j += 1
+        i += 1
+    return regressions
+
+
+def print_results(results: Dict[str, object]) -> None:
+    print(f"{'scenario':10s} {'phase':8s} {'tokens/s':>12s} {'nodes/s':>12s} {'peak MiB':>9s}")
+    names = list(results["scenarios"])
+    i = 0
+    while i < len(names):
+        scen = results["scenarios"][names[i]]
+        phase_names = list(scen["phases"])
+        j = 0
+        while j < len(phase_names):
+            ph = scen["phases"][phase_names[j]]
+            tps = f"{ph['tokens_per_sec']:12,.0f}" if "tokens_per_sec" in ph else f"{'-':>12s}"
+            nps = f"{ph['nodes_per_sec']:12,.0f}" if "nodes_per_sec" in ph else f"{'-':>12s}"
+            print(f"{names[i]:10s} {phase_names[j]:8s} {tps} {nps} {ph['peak_bytes'] / (1 << 20):9.2f}")
+            j += 1
+        i += 1
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="run only these (repeatable)")
+    ap.add_argument("--scale", type=float, default=1.0, help="multiply every scenario's size")
+    ap.add_argument("--scanner-engine", default="regex")
+    ap.add_argument("--parser-engine", default="int")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", help="write results as JSON here")
+    ap.add_argument("--compare", help="earlier results JSON to check for regressions")
+    ap.add_argument("--threshold", type=float, default=0.10, help="allowed relative throughput drop")
+    args = ap.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    results: Dict[str, object] = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "scanner_engine": args.scanner_engine,
+            "parser_engine": args.parser_engine,
+            "scale": args.scale,
+        },
+        "scenarios": {},
+    }
+
+    i = 0
+    while i < len(names):
+        base = SCENARIOS[names[i]]
+        cfg = GenConfig(**dict(vars(base), decls=max(1, int(base.decls * args.scale))))
+        results["scenarios"][names[i]] = run_scenario(cfg, args.scanner_engine, args.parser_engine, args.repeat)
+        i += 1
+
+    print_results(results)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        regressions = compare(results, old, args.threshold)
+        j = 0
+        while j < len(regressions):
+            print("REGRESSION", regressions[j])
+            j += 1
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
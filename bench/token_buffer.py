@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Memory per token and tokens/sec: a list of Token objects vs. a TokenBuffer.
+
+    python -m bench.token_buffer --copies 500
+
+Storage is measured with tracemalloc while scanning the whole input into
+either container (the scanner's own memory is part of both). Parsing is
+timed from each container, with the TreeStore keeping its leaves in a
+TokenBuffer either way; then the memory a finished tree holds on to,
+leaves included, and its rendering speed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import io
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from bench.common import SAMPLE, ReplayScanner
+from bench.generator import GenConfig, generate
+from parse_tree import write_tree
+from parser import Parser
+from scanner import Scanner, Token
+from token_buffer import TokenBuffer
+
+
+def scan_list(src: str) -> List[Token]:
+    scanner = Scanner(src, "regex")
+    out: List[Token] = []
+    while True:
+        tok = scanner.get_next_token()
+        out.append(tok)
+        if tok.typ == "EOF":
+            return out
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Tuple[float, int]:
+    """(best time, peak traced bytes) of fn."""
+    best = float("inf")
+    r = 0
+    while r < repeat:
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+        r += 1
+    gc.collect()
+    tracemalloc.start()
+    kept = fn()
+    peak = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return best, peak
+
+
+def report(label: str, src: str, repeat: int) -> None:
+    t_list, m_list = measure(lambda: scan_list(src), repeat)
+    t_buf, m_buf = measure(lambda: TokenBuffer.from_scanner(Scanner(src, "regex")), repeat)
+
+    buf = TokenBuffer.from_scanner(Scanner(src, "regex"))
+    tokens = scan_list(src)
+    n = len(buf)
+
+    def parse_list() -> object:
+        return Parser(ReplayScanner(tokens, buf.index), "int", "store").parse()
+
+    def parse_buf() -> object:
+        return Parser(buf, "int", "store").parse()
+
+    p_list, _ = measure(parse_list, repeat)
+    p_buf, _ = measure(parse_buf, repeat)
+    _, m_tree = measure(lambda: Parser(Scanner(src, "regex"), "int", "store").parse(), 1)
+    tree = parse_buf()
+    w_store, _ = measure(lambda: write_tree(tree, io.StringIO()), repeat)
+
+    print(f"{label}: {n} tokens, {len(buf.lexemes)} distinct lexemes")
+    print(f"  scan into list[Token]:  {m_list / n:7.1f} bytes/token  {n / t_list:12,.0f} tokens/s")
+    print(f"  scan into TokenBuffer:  {m_buf / n:7.1f} bytes/token  {n / t_buf:12,.0f} tokens/s")
+    print(f"  parse from list:        {n / p_list:12,.0f} tokens/s")
+    print(f"  parse from TokenBuffer: {n / p_buf:12,.0f} tokens/s")
+    print(f"  TreeStore with leaves:  {m_tree / n:7.1f} bytes/token")
+    print(f"  render TreeStore:       {n / w_store:12,.0f} tokens/s")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--copies", type=int, default=500, help="number of sample program copies")
+    ap.add_argument("--decls", type=int, default=2000, help="declarations in the generated program")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    report("sample", "".join(SAMPLE.format(i=i) for i in range(args.copies)), args.repeat)
+    report("generated", generate(GenConfig(decls=args.decls, depth=12, seed=1)), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
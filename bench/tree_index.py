@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Structural queries on a parse tree: walking the TreeStore vs. a TreeIndex.
+
+    python -m bench.tree_index --decls 4000
+
+The query is "every Return-stmt inside function f" for a sample of the
+program's functions, answered by a walk over the whole tree (find the
+function's Declaration, then its subtree) and by the index. Both must
+return the same ids. Index build, save and load times are printed too.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Iterator, List, Optional
+
+from bench.generator import GenConfig, generate
+from grammar import ID_ID, SYMBOL_ID
+from parse_tree import NodeView
+from parser import Parser
+from scanner import Scanner
+from tree_index import build_index, load_index
+
+
+def _preorder(store: object, root: int) -> Iterator[int]:
+    first = store.first
+    nxt = store.next
+    stack = [root]
+    while stack:
+        i = stack.pop()
+        yield i
+        kids: List[int] = []
+        c = first[i]
+        while c >= 0:
+            kids.append(c)
+            c = nxt[c]
+        stack.extend(reversed(kids))
+
+
+def walk_returns(tree: NodeView, name: str) -> Optional[List[int]]:
+    """Return-stmt ids inside function `name`, by a pre-order walk from the root."""
+    store = tree.store
+    sym = store.sym
+    first = store.first
+    nxt = store.next
+    declaration = SYMBOL_ID["Declaration"]
+    fun_prime = SYMBOL_ID["Fun-declaration-prime"]
+    ret = SYMBOL_ID["Return-stmt"]
+
+    # Declaration -> Declaration-initial Declaration-prime; Declaration-initial -> Type-specifier ID
+    nodes = _preorder(store, tree.index)
+    d = next(nodes, -1)
+    while d >= 0:
+        if sym[d] == declaration:
+            initial = first[d]
+            ident = nxt[first[initial]] if first[initial] >= 0 else -1
+            prime = nxt[initial]
+            if (
+                ident >= 0 and sym[ident] == ID_ID and store.tokens.lexeme(store.tok[ident]) == name
+                and prime >= 0 and first[prime] >= 0 and sym[first[prime]] == fun_prime
+            ):
+                return [i for i in _preorder(store, d) if sym[i] == ret]
+        d = next(nodes, -1)
+    return None
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--decls", type=int, default=4000, help="declarations in the generated program")
+    ap.add_argument("--queries", type=int, default=200, help="functions to query")
+    args = ap.parse_args()
+
+    src = generate(GenConfig(decls=args.decls, depth=10, seed=1))
+    parser = Parser(Scanner(src, "regex"), "int", "store")
+    tree = parser.parse()
+
+    t0 = time.perf_counter()
+    index = build_index(tree, parser.index)
+    t_build = time.perf_counter() - t0
+    names = [n for n in index.by_lexeme if index.function(n) is not None][: args.queries]
+    print(f"{len(index)} nodes, {len(names)} functions queried")
+    print(f"build index:   {t_build * 1e3:9.1f} ms")
+
+    t0 = time.perf_counter()
+    walked = [walk_returns(tree, n) for n in names]
+    t_walk = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    indexed = [index.nodes("Return-stmt", within=index.function(n)) for n in names]
+    t_index = time.perf_counter() - t0
+    if walked != indexed:
+        print("MISMATCH between the walk and the index")
+        raise SystemExit(1)
+    print(f"walk queries:  {t_walk * 1e3:9.1f} ms")
+    print(f"index queries: {t_index * 1e3:9.1f} ms ({t_walk / t_index:.0f}x)")
+
+    fd, path = tempfile.mkstemp(suffix=".idx")
+    os.close(fd)
+    try:
+        t0 = time.perf_counter()
+        index.save(path)
+        t_save = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        load_index(path, tree)
+        t_load = time.perf_counter() - t0
+        print(f"save:          {t_save * 1e3:9.1f} ms  ({os.path.getsize(path) / 1024:.0f} KiB)")
+        print(f"load:          {t_load * 1e3:9.1f} ms")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Memory per parse tree node: PTNode objects vs. the array-backed TreeStore."""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import tracemalloc
+from typing import List
+
+from bench.common import SAMPLE, ReplayScanner, scan_all
+from parser import Parser
+from scanner import Token
+from source_index import LineIndex
+
+
+def traced_parse(tokens: List[Token], index: LineIndex, tree: str):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = Parser(ReplayScanner(tokens, index), "int", tree).parse()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def count_nodes(root) -> int:
+    n = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        n += 1
+        stack.extend(node.children)
+    return n
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--copies", type=int, default=500, help="number of sample program copies")
+    args = ap.parse_args()
+
+    src = "".join(SAMPLE.format(i=i) for i in range(args.copies))
+    tokens, index = scan_all(src)   # token objects are shared by both runs and not counted
+
+    tree, ptnode_bytes = traced_parse(tokens, index, "ptnode")
+    nodes = count_nodes(tree)
+    del tree
+
+    view, store_bytes = traced_parse(tokens, index, "store")
+    assert len(view.store) == nodes
+
+    print(f"nodes: {nodes}")
+    print(f"PTNode tree: {ptnode_bytes / nodes:7.1f} bytes/node")
+    print(f"TreeStore:   {store_bytes / nodes:7.1f} bytes/node  (arrays: {view.store.nbytes() / nodes:.1f})")
+    print(f"ratio:       {ptnode_bytes / store_bytes:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
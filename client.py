@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Thin client for server.py, and the wire format they share.
+
+Every message is a frame: a 4-byte big-endian length followed by that many
+bytes of UTF-8 JSON. A request is
+
+    {"id": <any>, "source": "<program text>", "outputs": ["tree", "errors"]}
+
+and its response carries the same id plus "tree" (the parse_tree.txt text)
+and/or "errors" (the syntax_errors.txt text), or "error" with a message when
+the request itself was malformed. Responses on one connection may arrive out
+of order when requests are pipelined.
+
+    python client.py --socket /tmp/cminus.sock input.txt
+
+writes parse_tree.txt and syntax_errors.txt like main.py, without loading the
+parser into this process.
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+import struct
+from typing import BinaryIO, Dict, Optional, Sequence
+
+HEADER = struct.Struct(">I")
+MAX_FRAME = 256 << 20
+
+OUTPUTS = ("tree", "errors")
+
+
+def encode_frame(message: Dict[str, object]) -> bytes:
+    body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(len(body)) + body
+
+
+def decode_body(body: bytes) -> Dict[str, object]:
+    message = json.loads(body.decode("utf-8"))
+    if not isinstance(message, dict):
+        raise ValueError("frame is not a JSON object")
+    return message
+
+
+def read_frame(stream: BinaryIO) -> Optional[Dict[str, object]]:
+    """Blocking read of one frame; None on a clean end of stream."""
+    header = stream.read(HEADER.size)
+    if not header:
+        return None
+    if len(header) < HEADER.size:
+        raise EOFError("truncated frame header")
+    (n,) = HEADER.unpack(header)
+    if n > MAX_FRAME:
+        raise ValueError(f"frame of {n} bytes exceeds the limit")
+    body = stream.read(n)
+    if len(body) < n:
+        raise EOFError("truncated frame")
+    return decode_body(body)
+
+
+class Client:
+    """One connection to a compile server on a Unix domain socket."""
+
+    def __init__(self, path: str):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.stream = self.sock.makefile("rwb")
+        self._next_id = 0
+
+    def compile(self, source: str, outputs: Sequence[str] = OUTPUTS) -> Dict[str, object]:
+        self._next_id += 1
+        self.stream.write(encode_frame({"id": self._next_id, "source": source, "outputs": list(outputs)}))
+        self.stream.flush()
+        reply = read_frame(self.stream)
+        if reply is None:
+            raise ConnectionError("server closed the connection")
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def close(self) -> None:
+        self.stream.close()
+        self.sock.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def main() -> None:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Compile one file through a running server.py.")
+    ap.add_argument("input", nargs="?", default="input.txt")
+    ap.add_argument("--socket", required=True, help="server socket path")
+    ap.add_argument("--errors-only", action="store_true", help="only write syntax_errors.txt")
+    args = ap.parse_args()
+
+    # Same decoding as the file scanner: UTF-8, universal newlines
+    with open(args.input, "r", encoding="utf-8") as f:
+        source = f.read()
+
+    outputs = ["errors"] if args.errors_only else ["tree", "errors"]
+    with Client(args.socket) as client:
+        reply = client.compile(source, outputs)
+
+    if "tree" in reply:
+        with open("parse_tree.txt", "w", encoding="utf-8") as f:
+            f.write(reply["tree"])
+    with open("syntax_errors.txt", "w", encoding="utf-8") as f:
+        f.write(reply["errors"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""In-process library API: compile sources to tree text, errors and stats in memory.
+
+    from compiler import compile_source, compile_many
+
+    result = compile_source("int main(void) { return; }")
+    result.tree       # the parse_tree.txt text
+    result.errors     # the syntax_errors.txt lines
+    results = compile_many(sources, outputs=("errors",))
+
+Nothing here reads or writes files or module-level state: every call has
+its own scanner, parser, tree and Stats, and the grammar tables are only
+read. compile_source is therefore safe to call from many threads at once,
+and compile_many runs it on a thread pool by default. On a free-threaded
+CPython build the threads run in parallel; with the GIL they take turns,
+and a ProcessPoolExecutor passed as executor is the way to use more cores.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+from instrument import Stats
+from parse_tree import write_tree
+from parser import Parser
+from scanner import Scanner
+
+
+# What compile_source can return; results have None for outputs not asked for
+OUTPUTS = ("tree", "errors", "stats")
+
+DEFAULT_OUTPUTS = ("tree", "errors")
+
+
+@dataclass
+class CompileResult:
+    tree: Optional[str]                     # parse_tree.txt contents
+    errors: Optional[List[str]]             # syntax errors, in order
+    stats: Optional[Dict[str, object]]      # Stats.to_dict()
+
+
+def errors_text(errors: List[str]) -> str:
+    """Contents of syntax_errors.txt for these errors."""
+    return "\n".join(errors) if errors else "No syntax errors found."
+
+
+def compile_source(source: Union[str, bytes], outputs: Sequence[str] = DEFAULT_OUTPUTS) -> CompileResult:
+    """Parse one program; bytes are decoded as UTF-8, newlines are translated like main.py's input.txt."""
+    unknown = [o for o in outputs if o not in OUTPUTS]
+    if unknown:
+        raise ValueError(f"unknown outputs {unknown}, expected a subset of {OUTPUTS}")
+    want_tree = "tree" in outputs
+    stats = Stats() if "stats" in outputs else None
+
+    data = source.encode("utf-8") if isinstance(source, str) else source
+    scanner = Scanner.from_stream(io.BytesIO(data), engine="regex", stats=stats)
+    parser = Parser(scanner, engine="int", tree="store" if want_tree else "none", stats=stats)
+    tree = parser.parse()
+
+    text: Optional[str] = None
+    if want_tree:
+        buf = io.StringIO()
+        write_tree(tree, buf, stats)
+        text = buf.getvalue()
+    return CompileResult(
+        text,
+        parser.errors if "errors" in outputs else None,
+        stats.to_dict() if stats is not None else None,
+    )
+
+
+def compile_many(
+    sources: Iterable[Union[str, bytes]],
+    outputs: Sequence[str] = DEFAULT_OUTPUTS,
+    executor: Optional[Executor] = None,
+    workers: Optional[int] = None,
+    chunksize: Optional[int] = None,
+) -> List[CompileResult]:
+    """compile_source over every source, results in input order.
+
+    Without an executor a thread pool of `workers` threads (default: one
+    per CPU) is created for the call. A given executor is used as is and
+    left running; a ProcessPoolExecutor works too. chunksize is how many
+    sources a ProcessPoolExecutor gets per task; by default about four
+    tasks per worker, with `workers` standing for the executor's size
+    (default: one per CPU). Thread pools ignore it.
+    """
+    items = list(sources)
+    fn = partial(compile_source, outputs=tuple(outputs))
+    n = workers or os.cpu_count() or 1
+    if executor is not None:
+        if chunksize is None:
+            chunksize = max(1, len(items) // (n * 4))
+        return list(executor.map(fn, items, chunksize=chunksize))
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(fn, items))
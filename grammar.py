@@ -1,9 +1,26 @@
 # -*- coding: utf-8 -*-
-"""Grammar + FIRST/FOLLOW + LL(1) parsing table."""
+"""Grammar + FIRST/FOLLOW + LL(1) parsing table.
+
+FIRST, FOLLOW, PARSE_TABLE and the integer tables are loaded lazily on first
+access, from the grammar_tables.bin artifact when its key matches GRAMMAR.
+Prebuild it with: python grammar.py --build-cache
+
+Other grammars can be analyzed from a file (format below, see parse_grammar):
+    python grammar.py --grammar variant.grammar     # FIRST/FOLLOW + conflict report
+    python grammar.py --dump-grammar                # the built-in grammar in that format
+The parser itself always uses the built-in GRAMMAR.
+"""
 
 from __future__ import annotations
 
-from typing import Dict, List, Set, Tuple
+import _thread
+import marshal
+import os
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
 
 
 EPS = "EPSILON"
@@ -61,182 +78,232 @@ GRAMMAR: Dict[str, List[List[str]]] = {
 NONTERMINALS: Set[str] = set(GRAMMAR.keys())
 
 
-def compute_first_follow(grammar: Dict[str, List[List[str]]]) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]:
-    nts = set(grammar.keys())
-    first: Dict[str, Set[str]] = {A: set() for A in nts}
-
-    # FIRST
-    changed = True
-    while changed:
-        changed = False
-
-        items = list(grammar.items())
-        i_items = 0
-        while i_items < len(items):
-            A, prods = items[i_items]
-
-            i_prod = 0
-            while i_prod < len(prods):
-                prod = prods[i_prod]
-
-                if prod == [EPS]:
-                    if EPS not in first[A]:
-                        first[A].add(EPS)
-                        changed = True
-                    i_prod += 1
-                    continue
-
-                nullable_prefix = True
-                i_sym = 0
-                while i_sym < len(prod):
-                    sym = prod[i_sym]
-
-                    if sym == EPS:
-                        if EPS not in first[A]:
-                            first[A].add(EPS)
-                            changed = True
-                        nullable_prefix = False
-                        break
-
-                    if sym in nts:
-                        add = first[sym] - {EPS}
-                        if not add.issubset(first[A]):
-                            first[A] |= add
-                            changed = True
-                        if EPS in first[sym]:
-                            i_sym += 1
-                            continue
-                        nullable_prefix = False
-                        break
-                    else:
-                        if sym not in first[A]:
-                            first[A].add(sym)
-                            changed = True
-                        nullable_prefix = False
-                        break
-
-                if nullable_prefix:
-                    if EPS not in first[A]:
-                        first[A].add(EPS)
-                        changed = True
-
-                i_prod += 1
-
-            i_items += 1
-
-    follow: Dict[str, Set[str]] = {A: set() for A in nts}
-    follow["Program"].add("$")
-
-    def first_of_seq(seq: List[str]) -> Set[str]:
-        out: Set[str] = set()
-        if not seq or seq == [EPS]:
-            out.add(EPS)
-            return out
-
-        i = 0
-        while i < len(seq):
-            sym = seq[i]
-
-            if sym == EPS:
-                out.add(EPS)
-                return out
-
-            if sym in nts:
-                out |= (first[sym] - {EPS})
-                if EPS in first[sym]:
-                    i += 1
-                    continue
-                return out
-
-            out.add(sym)
+def first_of_sequence(seq: List[str], first: Dict[str, Set[str]]) -> Set[str]:
+    """FIRST of a symbol sequence; contains EPS when the whole sequence can vanish."""
+    out: Set[str] = set()
+    i = 0
+    while i < len(seq):
+        sym = seq[i]
+        if sym == EPS:
+            i += 1
+            continue
+        if sym in first:
+            out |= first[sym]
+            if EPS in first[sym]:
+                i += 1
+                continue
+            out.discard(EPS)
             return out
-
-        out.add(EPS)
+        out.discard(EPS)
+        out.add(sym)
         return out
 
-    # FOLLOW
-    changed = True
-    while changed:
-        changed = False
+    out.add(EPS)
+    return out
 
-        items = list(grammar.items())
-        i_items = 0
-        while i_items < len(items):
-            A, prods = items[i_items]
 
-            i_prod = 0
-            while i_prod < len(prods):
-                prod = prods[i_prod]
+def _nullable(grammar: Dict[str, List[List[str]]]) -> Set[str]:
+    # A production becomes nullable when its last not-yet-nullable symbol does;
+    # each production keeps a count of those instead of being rescanned
+    remaining: List[int] = []
+    lhs: List[str] = []
+    uses: Dict[str, List[int]] = {A: [] for A in grammar}
+    nullable: Set[str] = set()
+    work: List[str] = []
 
+    items = list(grammar.items())
+    i_items = 0
+    while i_items < len(items):
+        A, prods = items[i_items]
+        i_prod = 0
+        while i_prod < len(prods):
+            syms = [s for s in prods[i_prod] if s != EPS]
+            p = len(remaining)
+            lhs.append(A)
+            if any(s not in grammar for s in syms):
+                remaining.append(-1)    # has a terminal: never nullable
+            else:
+                remaining.append(len(syms))
                 i = 0
-                while i < len(prod):
-                    B = prod[i]
-                    if B not in nts:
-                        i += 1
-                        continue
-
-                    beta = prod[i + 1:]
-                    fb = first_of_seq(beta)
+                while i < len(syms):
+                    uses[syms[i]].append(p)
+                    i += 1
+                if not syms and A not in nullable:
+                    nullable.add(A)
+                    work.append(A)
+            i_prod += 1
+        i_items += 1
 
-                    add1 = fb - {EPS}
-                    if not add1.issubset(follow[B]):
-                        follow[B] |= add1
-                        changed = True
+    while work:
+        X = work.pop()
+        ps = uses[X]
+        k = 0
+        while k < len(ps):
+            p = ps[k]
+            remaining[p] -= 1
+            if remaining[p] == 0 and lhs[p] not in nullable:
+                nullable.add(lhs[p])
+                work.append(lhs[p])
+            k += 1
+
+    return nullable
+
+
+def _propagate(sets: Dict[str, Set[str]], edges: Dict[str, Set[str]]) -> None:
+    # Worklist closure: every X -> Y edge means sets[X] is a subset of sets[Y].
+    # Only symbols whose set just grew are revisited.
+    work = [X for X in sets if sets[X] and edges[X]]
+    queued = set(work)
+    while work:
+        X = work.pop()
+        queued.discard(X)
+        src = sets[X]
+        targets = list(edges[X])
+        i = 0
+        while i < len(targets):
+            Y = targets[i]
+            dst = sets[Y]
+            if not src <= dst:
+                dst |= src
+                if Y not in queued and edges[Y]:
+                    queued.add(Y)
+                    work.append(Y)
+            i += 1
+
+
+def compute_first_follow(
+    grammar: Dict[str, List[List[str]]], start: Optional[str] = None
+) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]:
+    """FIRST and FOLLOW sets of every nonterminal; start defaults to the first rule."""
+    nts = set(grammar.keys())
+    if start is None:
+        start = next(iter(grammar))
+    nullable = _nullable(grammar)
 
-                    if (EPS in fb) or (not beta):
-                        if not follow[A].issubset(follow[B]):
-                            follow[B] |= follow[A]
-                            changed = True
+    items = list(grammar.items())
 
+    # FIRST: terminals that can begin a production seed its left side; a
+    # nonterminal X reachable through a nullable prefix adds an X -> A edge
+    first: Dict[str, Set[str]] = {A: set() for A in nts}
+    into: Dict[str, Set[str]] = {A: set() for A in nts}
+    i_items = 0
+    while i_items < len(items):
+        A, prods = items[i_items]
+        i_prod = 0
+        while i_prod < len(prods):
+            prod = prods[i_prod]
+            i = 0
+            while i < len(prod):
+                sym = prod[i]
+                if sym == EPS:
                     i += 1
+                    continue
+                if sym not in nts:
+                    first[A].add(sym)
+                    break
+                into[sym].add(A)
+                if sym not in nullable:
+                    break
+                i += 1
+            i_prod += 1
+        i_items += 1
 
-                i_prod += 1
+    _propagate(first, into)
+    nullable_list = list(nullable)
+    i = 0
+    while i < len(nullable_list):
+        first[nullable_list[i]].add(EPS)
+        i += 1
 
-            i_items += 1
+    # FOLLOW: scanning each production right to left, B gets FIRST of what
+    # follows it directly, and an A -> B edge when that rest can vanish
+    follow: Dict[str, Set[str]] = {A: set() for A in nts}
+    follow[start].add("$")
+    into = {A: set() for A in nts}
+    i_items = 0
+    while i_items < len(items):
+        A, prods = items[i_items]
+        i_prod = 0
+        while i_prod < len(prods):
+            prod = prods[i_prod]
+            trailer: Set[str] = set()
+            rest_nullable = True
+            i = len(prod) - 1
+            while i >= 0:
+                sym = prod[i]
+                if sym == EPS:
+                    i -= 1
+                    continue
+                if sym in nts:
+                    follow[sym] |= trailer
+                    if rest_nullable:
+                        into[A].add(sym)
+                    if sym in nullable:
+                        trailer = trailer | first[sym]
+                        trailer.discard(EPS)
+                    else:
+                        trailer = first[sym] - {EPS}
+                        rest_nullable = False
+                else:
+                    trailer = {sym}
+                    rest_nullable = False
+                i -= 1
+            i_prod += 1
+        i_items += 1
 
+    _propagate(follow, into)
     return first, follow
 
 
-FIRST, FOLLOW = compute_first_follow(GRAMMAR)
+@dataclass
+class Conflict:
+    """Several productions of one nonterminal claim the same table cell."""
+
+    nonterminal: str
+    terminal: str
+    kind: str                   # FIRST/FIRST, FIRST/FOLLOW or FOLLOW/FOLLOW
+    chosen: List[str]           # the production the table keeps
+    rejected: List[List[str]] = field(default_factory=list)
+
+    def describe(self) -> str:
+        A = self.nonterminal
+        alts = " | ".join(" ".join(p) for p in [self.chosen] + self.rejected)
+        return (
+            f"{A} on {self.terminal!r}: {self.kind} conflict between {alts}; "
+            f"kept {A} -> {' '.join(self.chosen)} (listed first)"
+        )
 
 
 def build_parse_table(
     grammar: Dict[str, List[List[str]]],
     first: Dict[str, Set[str]],
     follow: Dict[str, Set[str]],
+    conflicts: Optional[List[Conflict]] = None,
 ) -> Dict[str, Dict[str, List[str]]]:
-    nts = set(grammar.keys())
-
-    def first_of_seq(seq: List[str]) -> Set[str]:
-        out: Set[str] = set()
-        if not seq or seq == [EPS]:
-            out.add(EPS)
-            return out
-
-        i = 0
-        while i < len(seq):
-            sym = seq[i]
-
-            if sym == EPS:
-                out.add(EPS)
-                return out
-
-            if sym in nts:
-                out |= (first[sym] - {EPS})
-                if EPS in first[sym]:
-                    i += 1
-                    continue
-                return out
-
-            out.add(sym)
-            return out
-
-        out.add(EPS)
-        return out
-
-    table: Dict[str, Dict[str, List[str]]] = {A: {} for A in nts}
+    """LL(1) table; on a conflict the production listed first wins.
+
+    That resolution is relied upon: Else-stmt keeps "else Statement" over the
+    epsilon production on 'else'. Pass a list as conflicts to have every
+    conflict appended to it.
+    """
+    table: Dict[str, Dict[str, List[str]]] = {A: {} for A in grammar}
+    # Whether each filled cell came from FIRST or FOLLOW, and its conflict if any
+    via: Dict[Tuple[str, str], str] = {}
+    found: Dict[Tuple[str, str], Conflict] = {}
+
+    def put(A: str, t: str, prod: List[str], how: str) -> None:
+        row = table[A]
+        if t not in row:
+            row[t] = prod
+            via[(A, t)] = how
+            return
+        if conflicts is None or row[t] is prod:
+            return
+        c = found.get((A, t))
+        if c is None:
+            c = found[(A, t)] = Conflict(A, t, f"{via[(A, t)]}/{how}", row[t])
+        c.rejected.append(prod)
 
-    # IMPORTANT: epsilon productions must NOT overwrite existing entries (e.g. Else-stmt on 'else')
     items = list(grammar.items())
     i_items = 0
     while i_items < len(items):
@@ -245,30 +312,387 @@ def build_parse_table(
         i_prod = 0
         while i_prod < len(prods):
             prod = prods[i_prod]
-            fs = first_of_seq(prod)
+            fs = first_of_sequence(prod, first)
 
-            terms = list(fs - {EPS})
+            terms = sorted(fs - {EPS})
             j = 0
             while j < len(terms):
-                t = terms[j]
-                if t not in table[A]:
-                    table[A][t] = prod
+                put(A, terms[j], prod, "FIRST")
                 j += 1
 
             if EPS in fs:
-                flw = list(follow[A])
+                flw = sorted(follow[A])
                 k = 0
                 while k < len(flw):
-                    b = flw[k]
-                    if b not in table[A]:
-                        table[A][b] = prod
+                    put(A, flw[k], prod, "FOLLOW")
                     k += 1
 
             i_prod += 1
 
         i_items += 1
 
+    if conflicts is not None:
+        conflicts.extend(found.values())
     return table
 
 
-PARSE_TABLE = build_parse_table(GRAMMAR, FIRST, FOLLOW)
+# ---------------------------------------------------------------------------
+# Grammar files.
+#
+# One rule per line, alternatives separated by "|"; a line starting with "|"
+# continues the rule above it, and "#" starts a comment line:
+#
+#     Declaration-list -> Declaration Declaration-list
+#                       | EPSILON
+#
+# Symbols are whitespace-separated; those with rules are nonterminals, the
+# rest terminals. The first rule's left side is the start symbol.
+# ---------------------------------------------------------------------------
+
+def parse_grammar(text: str, name: str = "<grammar>") -> Dict[str, List[List[str]]]:
+    grammar: Dict[str, List[List[str]]] = {}
+    current: Optional[str] = None
+    lines = text.splitlines()
+    n = 0
+    while n < len(lines):
+        words = lines[n].split()
+        n += 1
+        if not words or words[0].startswith("#"):
+            continue
+        if len(words) >= 2 and words[1] == "->":
+            current = words[0]
+            words = words[2:]
+        elif words[0] == "|" and current is not None:
+            words = words[1:]
+        else:
+            raise ValueError(f"{name}:{n}: expected 'Nonterminal -> ...' or a '| ...' continuation")
+
+        alts = grammar.setdefault(current, [])
+        alt: List[str] = []
+        i = 0
+        while i <= len(words):
+            if i == len(words) or words[i] == "|":
+                if not alt:
+                    raise ValueError(f"{name}:{n}: empty alternative (write {EPS})")
+                alts.append(alt)
+                alt = []
+            else:
+                alt.append(words[i])
+            i += 1
+
+    if not grammar:
+        raise ValueError(f"{name}: no rules")
+    return grammar
+
+
+def load_grammar(path: str) -> Dict[str, List[List[str]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_grammar(f.read(), path)
+
+
+def format_grammar(grammar: Dict[str, List[List[str]]]) -> str:
+    out: List[str] = []
+    items = list(grammar.items())
+    i = 0
+    while i < len(items):
+        A, prods = items[i]
+        pad = " " * len(A)
+        out.append(f"{A} -> {' '.join(prods[0])}")
+        out.extend(f"{pad}  | {' '.join(p)}" for p in prods[1:])
+        i += 1
+    return "\n".join(out) + "\n"
+
+
+def analyze_grammar(
+    grammar: Dict[str, List[List[str]]]
+) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]], Dict[str, Dict[str, List[str]]], List[Conflict]]:
+    """FIRST, FOLLOW, the LL(1) table and its conflicts."""
+    first, follow = compute_first_follow(grammar)
+    conflicts: List[Conflict] = []
+    table = build_parse_table(grammar, first, follow, conflicts)
+    return first, follow, table, conflicts
+
+
+# ---------------------------------------------------------------------------
+# Integer-coded grammar: interned symbol ids and a flat LL(1) table.
+#
+# Terminals come first ("$" is 0), then OTHER_TERMINAL for lexemes that no
+# production mentions (e.g. ':'), then the nonterminals in GRAMMAR order.
+# PARSE_TABLE_FLAT[(A - NT_BASE) * N_TERMINALS + t] is a production index
+# (or -1), FOLLOW_FLAT uses the same layout with 0/1 flags.
+# ---------------------------------------------------------------------------
+
+def _collect_terminals(grammar: Dict[str, List[List[str]]]) -> List[str]:
+    out: List[str] = ["$"]
+    seen: Set[str] = {"$", EPS}
+
+    items = list(grammar.items())
+    i_items = 0
+    while i_items < len(items):
+        prods = items[i_items][1]
+        i_prod = 0
+        while i_prod < len(prods):
+            prod = prods[i_prod]
+            i_sym = 0
+            while i_sym < len(prod):
+                sym = prod[i_sym]
+                if sym not in grammar and sym not in seen:
+                    seen.add(sym)
+                    out.append(sym)
+                i_sym += 1
+            i_prod += 1
+        i_items += 1
+
+    return out
+
+
+TERMINALS: List[str] = _collect_terminals(GRAMMAR)
+OTHER_TERMINAL: int = len(TERMINALS)
+N_TERMINALS: int = OTHER_TERMINAL + 1
+NT_BASE: int = N_TERMINALS
+
+SYMBOLS: List[str] = TERMINALS + ["<other>"] + list(GRAMMAR.keys())
+SYMBOL_ID: Dict[str, int] = {name: i for i, name in enumerate(SYMBOLS)}
+TERMINAL_ID: Dict[str, int] = {name: i for i, name in enumerate(TERMINALS)}
+IS_NONTERMINAL: bytes = bytes(1 if i >= NT_BASE else 0 for i in range(len(SYMBOLS)))
+
+EOF_ID: int = TERMINAL_ID["$"]
+ID_ID: int = TERMINAL_ID["ID"]
+NUM_ID: int = TERMINAL_ID["NUM"]
+
+
+def build_int_tables(
+    grammar: Dict[str, List[List[str]]],
+    table: Dict[str, Dict[str, List[str]]],
+    follow: Dict[str, Set[str]],
+) -> Tuple[List[int], List[Tuple[int, ...]], array, array]:
+    prod_lhs: List[int] = []
+    prod_rhs: List[Tuple[int, ...]] = []
+    prod_index: Dict[int, int] = {}
+
+    items = list(grammar.items())
+    i_items = 0
+    while i_items < len(items):
+        A, prods = items[i_items]
+        i_prod = 0
+        while i_prod < len(prods):
+            prod = prods[i_prod]
+            prod_index[id(prod)] = len(prod_rhs)
+            prod_lhs.append(SYMBOL_ID[A])
+            prod_rhs.append(tuple(SYMBOL_ID[s] for s in prod if s != EPS))
+            i_prod += 1
+        i_items += 1
+
+    n_nt = len(SYMBOLS) - NT_BASE
+    flat = array("h", [-1]) * (n_nt * N_TERMINALS)
+    follow_flat = array("b", [0]) * (n_nt * N_TERMINALS)
+
+    rows = list(table.items())
+    i_rows = 0
+    while i_rows < len(rows):
+        A, row = rows[i_rows]
+        base = (SYMBOL_ID[A] - NT_BASE) * N_TERMINALS
+
+        entries = list(row.items())
+        j = 0
+        while j < len(entries):
+            t, prod = entries[j]
+            flat[base + TERMINAL_ID[t]] = prod_index[id(prod)]
+            j += 1
+
+        flw = list(follow[A])
+        k = 0
+        while k < len(flw):
+            follow_flat[base + TERMINAL_ID[flw[k]]] = 1
+            k += 1
+
+        i_rows += 1
+
+    return prod_lhs, prod_rhs, flat, follow_flat
+
+
+# ---------------------------------------------------------------------------
+# Table artifact cache.
+#
+# The computed tables are marshalled to a file keyed by the grammar; a
+# mismatching or unreadable artifact is rebuilt and rewritten. Set the
+# GRAMMAR_CACHE environment variable to another path, or to "" to disable.
+#
+# The artifact stores the full GRAMMAR_KEY and compares it exactly;
+# GRAMMAR_HASH is its CRC-32, used for display. (hashlib is avoided on
+# purpose: importing it costs more than computing the tables.)
+# ---------------------------------------------------------------------------
+
+# Bump when the artifact layout or the table algorithms change
+CACHE_VERSION = 1
+
+GRAMMAR_KEY: str = repr((CACHE_VERSION, sys.byteorder, EPS, list(GRAMMAR.items())))
+GRAMMAR_HASH: str = f"{zlib.crc32(GRAMMAR_KEY.encode('utf-8')):08x}"
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar_tables.bin")
+
+_LAZY_NAMES = ("FIRST", "FOLLOW", "PARSE_TABLE", "PROD_LHS", "PROD_RHS", "PARSE_TABLE_FLAT", "FOLLOW_FLAT")
+
+# Threads asking for the tables at once load (and write) them only once.
+# _thread rather than threading, which would add to the import time
+_LOAD_LOCK = _thread.RLock()
+
+
+def cache_path() -> Optional[str]:
+    path = os.environ.get("GRAMMAR_CACHE", DEFAULT_CACHE_PATH)
+    return path or None
+
+
+def compute_tables() -> Dict[str, object]:
+    first, follow = compute_first_follow(GRAMMAR)
+    table = build_parse_table(GRAMMAR, first, follow)
+    prod_lhs, prod_rhs, flat, follow_flat = build_int_tables(GRAMMAR, table, follow)
+    return {
+        "FIRST": first,
+        "FOLLOW": follow,
+        "PARSE_TABLE": table,
+        "PROD_LHS": prod_lhs,
+        "PROD_RHS": prod_rhs,
+        "PARSE_TABLE_FLAT": flat,
+        "FOLLOW_FLAT": follow_flat,
+    }
+
+
+def _encode(tables: Dict[str, object]) -> bytes:
+    # Table entries are stored as production indexes within GRAMMAR[A] so the
+    # loaded table shares the very same production lists as GRAMMAR.
+    table_idx: Dict[str, Dict[str, int]] = {}
+    rows = list(tables["PARSE_TABLE"].items())
+    i_rows = 0
+    while i_rows < len(rows):
+        A, row = rows[i_rows]
+        prods = GRAMMAR[A]
+        by_id = {id(prods[k]): k for k in range(len(prods))}
+        table_idx[A] = {t: by_id[id(prod)] for t, prod in row.items()}
+        i_rows += 1
+
+    return marshal.dumps({
+        "key": GRAMMAR_KEY,
+        "first": tables["FIRST"],
+        "follow": tables["FOLLOW"],
+        "table": table_idx,
+        "prod_lhs": tables["PROD_LHS"],
+        "prod_rhs": tables["PROD_RHS"],
+        "flat": tables["PARSE_TABLE_FLAT"].tobytes(),
+        "follow_flat": tables["FOLLOW_FLAT"].tobytes(),
+    })
+
+
+def _decode(data: bytes) -> Optional[Dict[str, object]]:
+    payload = marshal.loads(data)
+    if not isinstance(payload, dict) or payload.get("key") != GRAMMAR_KEY:
+        return None
+
+    table: Dict[str, Dict[str, List[str]]] = {}
+    rows = list(payload["table"].items())
+    i_rows = 0
+    while i_rows < len(rows):
+        A, row = rows[i_rows]
+        prods = GRAMMAR[A]
+        table[A] = {t: prods[k] for t, k in row.items()}
+        i_rows += 1
+
+    flat = array("h")
+    flat.frombytes(payload["flat"])
+    follow_flat = array("b")
+    follow_flat.frombytes(payload["follow_flat"])
+
+    return {
+        "FIRST": payload["first"],
+        "FOLLOW": payload["follow"],
+        "PARSE_TABLE": table,
+        "PROD_LHS": payload["prod_lhs"],
+        "PROD_RHS": payload["prod_rhs"],
+        "PARSE_TABLE_FLAT": flat,
+        "FOLLOW_FLAT": follow_flat,
+    }
+
+
+def read_cache(path: str) -> Optional[Dict[str, object]]:
+    try:
+        with open(path, "rb") as f:
+            return _decode(f.read())
+    except (OSError, ValueError, EOFError, TypeError, KeyError):
+        return None
+
+
+def write_cache(path: str, tables: Dict[str, object]) -> None:
+    # Write to a temp file first so concurrent readers never see a partial artifact
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_encode(tables))
+    os.replace(tmp, path)
+
+
+def load_tables() -> Dict[str, object]:
+    with _LOAD_LOCK:
+        path = cache_path()
+        tables = read_cache(path) if path else None
+        if tables is None:
+            tables = compute_tables()
+            if path:
+                try:
+                    write_cache(path, tables)
+                except OSError:
+                    pass    # read-only location: keep the freshly computed tables
+        globals().update(tables)
+        return tables
+
+
+def __getattr__(name: str) -> object:
+    if name in _LAZY_NAMES:
+        with _LOAD_LOCK:
+            # Another thread may have loaded them while this one waited
+            if name in globals():
+                return globals()[name]
+            return load_tables()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser(description="Grammar table artifact and analysis tools.")
+    ap.add_argument("--build-cache", action="store_true", help="(re)build the table artifact")
+    ap.add_argument("--path", default=None, help="artifact path (default: GRAMMAR_CACHE or grammar_tables.bin)")
+    ap.add_argument("--conflicts", action="store_true", help="report LL(1) conflicts and how they are resolved")
+    ap.add_argument("--grammar", metavar="FILE", help="analyze this grammar file instead of the built-in grammar")
+    ap.add_argument("--dump-grammar", action="store_true", help="print the built-in grammar in the file format")
+    args = ap.parse_args()
+
+    if args.dump_grammar:
+        sys.stdout.write(format_grammar(GRAMMAR))
+        sys.exit(0)
+
+    if args.conflicts or args.grammar:
+        try:
+            source = GRAMMAR if args.grammar is None else load_grammar(args.grammar)
+        except (OSError, ValueError) as exc:
+            sys.exit(f"grammar.py: {exc}")
+        t0 = time.perf_counter()
+        _, _, _, found = analyze_grammar(source)
+        elapsed = time.perf_counter() - t0
+        n_prods = sum(len(prods) for prods in source.values())
+        print(
+            f"{args.grammar or 'built-in grammar'}: {len(source)} nonterminals, {n_prods} productions, "
+            f"analyzed in {elapsed * 1e3:.1f} ms, {len(found)} conflict(s)"
+        )
+        i = 0
+        while i < len(found):
+            print(f"  {found[i].describe()}")
+            i += 1
+        sys.exit(0)
+
+    target = args.path or cache_path() or DEFAULT_CACHE_PATH
+    if args.build_cache:
+        write_cache(target, compute_tables())
+        print(f"wrote {target} (key {GRAMMAR_HASH})")
+    else:
+        state = "up to date" if read_cache(target) is not None else "missing or stale"
+        print(f"{target}: {state} (key {GRAMMAR_HASH})")
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""Incremental reparsing after a text edit.
+
+Only the tokens around the edit are rescanned; the rest of the previous token
+stream is kept (the suffix with shifted offsets and lines). Top-level
+Declarations whose tokens, including the lookahead that ended them, lie
+entirely before or entirely after the rescanned region are grafted from the
+previous tree instead of being parsed again. The result is identical to a
+full Scanner + Parser run over the new text.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from grammar import EPS, FOLLOW, PARSE_TABLE
+from parse_tree import PTNode
+from parser import Parser
+from scanner import Scanner, Token
+from source_index import LineIndex
+
+
+# Declaration-list -> Declaration Declaration-list | EPSILON
+_DECL_LIST = "Declaration-list"
+
+
+@dataclass
+class Edit:
+    offset: int     # where the edit starts in the old text
+    removed: int    # number of characters removed there
+    inserted: str   # text inserted in their place
+
+
+@dataclass
+class DeclInfo:
+    start: int                      # token index of the Declaration's first token
+    end: int                        # token index of the lookahead it finished on
+    node: PTNode                    # the Declaration subtree
+    errors: List[Tuple[int, str]]   # (line, message) pairs it reported
+    stopped: bool                   # it hit Unexpected EOF
+
+
+@dataclass
+class ParseState:
+    text: str
+    index: LineIndex
+    tokens: List[Token]     # ends with the EOF token
+    starts: List[int]       # Token.start / Token.end of every token, for bisecting
+    ends: List[int]
+    tree: PTNode
+    errors: List[str]
+    decls: List[DeclInfo]
+
+
+class _TokenFeed:
+    """Scanner stand-in over a token list; the parser's lookahead is tokens[i - 1]."""
+
+    def __init__(self, tokens: List[Token], index: LineIndex):
+        self.tokens = tokens
+        self.index = index
+        self.i = 0
+
+    def get_next_token(self) -> Token:
+        if self.i >= len(self.tokens):
+            return self.tokens[-1]
+        tok = self.tokens[self.i]
+        self.i += 1
+        return tok
+
+
+def _split_error(err: str) -> Tuple[int, str]:
+    # "#12 : syntax error, missing ;" -> (12, "syntax error, missing ;")
+    head, msg = err.split(" : ", 1)
+    return int(head[1:]), msg
+
+
+def _scan(
+    text: str,
+    index: LineIndex,
+    pos: int,
+    tokens: List[Token],
+    starts: List[int],
+    ends: List[int],
+    resync_from: int = -1,
+    resync_starts: Optional[List[int]] = None,
+    resync_lo: int = 0,
+    resync_hi: int = 0,
+    delta: int = 0,
+) -> int:
+    """Scan text from pos, appending to tokens/starts/ends.
+
+    When resync_starts is given, stop before the first token starting at or
+    after resync_from whose start, shifted back by delta, is also a token
+    start in the old stream (searched in resync_starts[resync_lo:resync_hi]);
+    return the old index of that token, or -1 if the scan reached EOF.
+    """
+    scanner = Scanner(text, "regex", index=index)
+    scanner.pos = pos
+
+    while True:
+        tok = scanner.get_next_token()
+        if tok.typ == "EOF":
+            tokens.append(tok)
+            starts.append(tok.start)
+            ends.append(tok.end)
+            return -1
+
+        if resync_starts is not None and tok.start >= resync_from:
+            old = tok.start - delta
+            k = bisect_left(resync_starts, old, resync_lo, resync_hi)
+            if k < resync_hi and resync_starts[k] == old:
+                return k
+
+        tokens.append(tok)
+        starts.append(tok.start)
+        ends.append(tok.end)
+
+
+def _parse(
+    tokens: List[Token],
+    index: LineIndex,
+    reuse: Dict[int, Tuple[DeclInfo, int, int]],
+) -> Tuple[PTNode, List[str], List[DeclInfo]]:
+    # Mirrors Parser.parse for Program -> Declaration-list, but walks the
+    # Declaration-list chain here so each Declaration can be reused or parsed
+    # on its own (their parse depends only on the tokens they look at).
+    feed = _TokenFeed(tokens, index)
+    parser = Parser(feed, engine="int")
+    root = PTNode("Program")
+    decls: List[DeclInfo] = []
+    row = PARSE_TABLE[_DECL_LIST]
+
+    owner = root
+    while True:
+        look = parser.la_term
+        prod = row.get(look)
+
+        if prod is None:
+            # Panic mode, as in Parser.parse_nonterminal
+            if look in FOLLOW[_DECL_LIST]:
+                parser._err_missing(parser.lookahead, _DECL_LIST)
+                break
+            if look == "$":
+                parser._err_unexpected_eof(parser.lookahead)
+                parser.stopped = True
+                break
+            parser._err_illegal(parser.lookahead)
+            parser.advance()
+            continue
+
+        node = PTNode(_DECL_LIST)
+        owner.add(node)
+        if prod == [EPS]:
+            node.add(PTNode("epsilon"))
+            break
+
+        start = feed.i - 1
+        hit = reuse.get(start)
+        if hit is not None:
+            old, shift, dline = hit
+            node.add(old.node)
+            errors = [(line + dline, msg) for line, msg in old.errors]
+            parser.errors.extend(f"#{line} : {msg}" for line, msg in errors)
+            feed.i = old.end + shift
+            parser.advance()
+            parser.stopped = old.stopped
+            decls.append(DeclInfo(start, old.end + shift, old.node, errors, old.stopped))
+        else:
+            n_errors = len(parser.errors)
+            parser.parse_nonterminal("Declaration", node)
+            errors = [_split_error(e) for e in parser.errors[n_errors:]]
+            decls.append(DeclInfo(start, feed.i - 1, node.children[0], errors, parser.stopped))
+
+        if parser.stopped:
+            break
+        owner = node
+
+    if not parser.stopped:
+        while parser.la_term != "$":
+            parser._err_illegal(parser.lookahead)
+            parser.advance()
+        root.add(PTNode("$"))
+
+    return root, parser.errors, decls
+
+
+def parse_document(text: str) -> ParseState:
+    index = LineIndex.from_text(text)
+    tokens: List[Token] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    _scan(text, index, 0, tokens, starts, ends)
+    tree, errors, decls = _parse(tokens, index, {})
+    return ParseState(text, index, tokens, starts, ends, tree, errors, decls)
+
+
+def reparse(state: ParseState, edit: Edit) -> ParseState:
+    """Apply edit to state.text and return the new state (state is not modified).
+
+    The new tree shares reused Declaration subtrees with the old one.
+    """
+    old_text = state.text
+    o = edit.offset
+    if o < 0 or edit.removed < 0 or o + edit.removed > len(old_text):
+        raise ValueError("edit out of range")
+
+    text = old_text[:o] + edit.inserted + old_text[o + edit.removed:]
+    index = state.index.edited(o, edit.removed, edit.inserted)
+    delta = len(edit.inserted) - edit.removed
+    old_tokens = state.tokens
+    n_old = len(old_tokens) - 1     # without EOF
+
+    # Tokens ending strictly before the edit are unaffected: the scanner never
+    # looks more than one character past a token's end.
+    p = bisect_left(state.ends, o, 0, n_old)
+    pos = state.ends[p - 1] if p > 0 else 0
+
+    tokens = old_tokens[:p]
+    starts = state.starts[:p]
+    ends = state.ends[:p]
+    k = _scan(
+        text, index, pos, tokens, starts, ends,
+        resync_from=o + len(edit.inserted),
+        resync_starts=state.starts,
+        resync_lo=p,
+        resync_hi=n_old,
+        delta=delta,
+    )
+
+    reuse: Dict[int, Tuple[DeclInfo, int, int]] = {}
+    decls = state.decls
+    i = 0
+    while i < len(decls) and decls[i].end < p:
+        reuse[decls[i].start] = (decls[i], 0, 0)
+        i += 1
+
+    if k >= 0:
+        # Resynchronised on old token k: the rest of the old stream carries over
+        dline = index.line(state.starts[k] + delta) - state.index.line(state.starts[k])
+        shift = len(tokens) - k
+        if delta:
+            tokens.extend(Token(t.typ, t.lex, t.start + delta, t.end + delta, t.term) for t in old_tokens[k:])
+        else:
+            tokens.extend(old_tokens[k:])
+        starts.extend(s + delta for s in state.starts[k:])
+        ends.extend(e + delta for e in state.ends[k:])
+
+        while i < len(decls):
+            if decls[i].start >= k:
+                reuse[decls[i].start + shift] = (decls[i], shift, dline)
+            i += 1
+
+    tree, errors, new_decls = _parse(tokens, index, reuse)
+    return ParseState(text, index, tokens, starts, ends, tree, errors, new_decls)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Optional instrumentation shared by Scanner, Parser and write_tree.
+
+Pass one Stats object as stats=... to the components you want measured; with
+the default stats=None they only pay an `is None` check per token/expansion.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
+
+if TYPE_CHECKING:
+    from scanner import Token
+
+
+class Stats:
+    def __init__(self) -> None:
+        # Wall time per phase, in seconds. "scan" is time spent inside
+        # Scanner.get_next_token, "parse" is Parser.parse minus that scan time,
+        # "panic" is the part of scan + parse spent discarding illegal tokens.
+        self.phases: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {}            # returned tokens by type
+        self.skipped: Dict[str, int] = {"comment": 0, "garbage": 0}    # characters
+        self.expansions: Dict[str, int] = {}        # per nonterminal
+        self.panic_discards: Dict[str, int] = {}    # tokens discarded while recovering, per nonterminal
+        self.nodes_rendered = 0
+        self.cache: Optional[str] = None    # "hit" / "miss" when the parse went through a ParseCache
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def count_token(self, tok: Token) -> None:
+        self.tokens[tok.typ] = self.tokens.get(tok.typ, 0) + 1
+
+    def skip(self, kind: str, chars: int) -> None:
+        self.skipped[kind] += chars
+
+    def expand(self, nonterminal: str) -> None:
+        self.expansions[nonterminal] = self.expansions.get(nonterminal, 0) + 1
+
+    def discard(self, nonterminal: str) -> None:
+        self.panic_discards[nonterminal] = self.panic_discards.get(nonterminal, 0) + 1
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "phases": dict(self.phases),
+            "tokens": dict(sorted(self.tokens.items())),
+            "skipped_chars": dict(self.skipped),
+            "expansions": dict(sorted(self.expansions.items())),
+            "panic_discards": dict(sorted(self.panic_discards.items())),
+            "nodes_rendered": self.nodes_rendered,
+            "cache": self.cache,
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
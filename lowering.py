@@ -0,0 +1,670 @@
+# -*- coding: utf-8 -*-
+"""Lower the LL(1) parse tree into a compact typed AST.
+
+The parse tree spells out every helper nonterminal of the grammar (B, H, D,
+G, C, the *-prime / *-zegond variants) and every epsilon; the AST keeps only
+declarations, statements and expressions, with operator precedence and
+associativity resolved (relational < additive < multiplicative < sign) and
+calls and array accesses as nodes of their own.
+
+Lowering reads a TreeStore (Parser(..., tree="store")) in one pass over the
+node ids from last to first: ids are pre-order, so every child is lowered
+before its parent and no recursion is needed. Trees with syntax errors are
+lowered as far as they go; parts the parser could not build come out as
+None.
+
+`start` is the source offset (see source_index.LineIndex) of the token a
+node begins with; it is kept on the nodes that begin with a token of their
+own (not on Program, ExprStmt, Assign and Binary).
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from grammar import ID_ID, NUM_ID, SYMBOL_ID
+from parse_tree import NODE_NAMES, NodeView
+from parser import Parser
+from scanner import Token
+
+
+class Node:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if name != "start")
+        return f"{type(self).__name__}({fields})"
+
+
+# -- declarations -------------------------------------------------------------
+
+class Program(Node):
+    __slots__ = ("decls",)
+
+    def __init__(self, decls: List[Node]):
+        self.decls = decls
+
+
+class VarDecl(Node):
+    __slots__ = ("start", "type", "name", "size")
+
+    def __init__(self, start: int, type: str, name: Optional[str], size: Optional[int]):
+        self.start = start
+        self.type = type
+        self.name = name
+        self.size = size    # None for a scalar
+
+
+class FunDecl(Node):
+    __slots__ = ("start", "type", "name", "params", "body")
+
+    def __init__(self, start: int, type: str, name: Optional[str], params: List["Param"], body: Optional["Compound"]):
+        self.start = start
+        self.type = type
+        self.name = name
+        self.params = params    # empty for (void)
+        self.body = body
+
+
+class Param(Node):
+    __slots__ = ("start", "type", "name", "is_array")
+
+    def __init__(self, start: int, type: str, name: Optional[str], is_array: bool):
+        self.start = start
+        self.type = type
+        self.name = name
+        self.is_array = is_array
+
+
+# -- statements -----------------------------------------------------------------
+
+class Compound(Node):
+    __slots__ = ("start", "decls", "stmts")
+
+    def __init__(self, start: int, decls: List[Node], stmts: List[Node]):
+        self.start = start
+        self.decls = decls
+        self.stmts = stmts
+
+
+class ExprStmt(Node):
+    __slots__ = ("expr",)
+
+    def __init__(self, expr: Optional[Node]):
+        self.expr = expr    # None for an empty statement ";"
+
+
+class Break(Node):
+    __slots__ = ("start",)
+
+    def __init__(self, start: int):
+        self.start = start
+
+
+class If(Node):
+    __slots__ = ("start", "cond", "then", "orelse")
+
+    def __init__(self, start: int, cond: Optional[Node], then: Optional[Node], orelse: Optional[Node]):
+        self.start = start
+        self.cond = cond
+        self.then = then
+        self.orelse = orelse
+
+
+class For(Node):
+    __slots__ = ("start", "init", "cond", "step", "body")
+
+    def __init__(self, start: int, init: Optional[Node], cond: Optional[Node], step: Optional[Node], body: Optional[Node]):
+        self.start = start
+        self.init = init
+        self.cond = cond
+        self.step = step
+        self.body = body
+
+
+class Return(Node):
+    __slots__ = ("start", "value")
+
+    def __init__(self, start: int, value: Optional[Node]):
+        self.start = start
+        self.value = value
+
+
+# -- expressions ----------------------------------------------------------------
+
+class Assign(Node):
+    __slots__ = ("target", "value")
+
+    def __init__(self, target: "Var", value: Optional[Node]):
+        self.target = target
+        self.value = value
+
+
+class Binary(Node):
+    __slots__ = ("op", "left", "right")
+
+    def __init__(self, op: str, left: Optional[Node], right: Optional[Node]):
+        self.op = op    # one of == < + - * /
+        self.left = left
+        self.right = right
+
+
+class Unary(Node):
+    __slots__ = ("start", "op", "operand")
+
+    def __init__(self, start: int, op: str, operand: Optional[Node]):
+        self.start = start
+        self.op = op    # + or -
+        self.operand = operand
+
+
+class Var(Node):
+    __slots__ = ("start", "name", "index")
+
+    def __init__(self, start: int, name: str, index: Optional[Node] = None):
+        self.start = start
+        self.name = name
+        self.index = index  # subscript expression of an array access
+
+
+class Call(Node):
+    __slots__ = ("start", "name", "args")
+
+    def __init__(self, start: int, name: str, args: List[Node]):
+        self.start = start
+        self.name = name
+        self.args = args
+
+
+class Num(Node):
+    __slots__ = ("start", "value")
+
+    def __init__(self, start: int, value: int):
+        self.start = start
+        self.value = value
+
+
+# Node-valued fields, in source order
+_CHILD_FIELDS = {
+    Program: ("decls",),
+    VarDecl: (),
+    FunDecl: ("params", "body"),
+    Param: (),
+    Compound: ("decls", "stmts"),
+    ExprStmt: ("expr",),
+    Break: (),
+    If: ("cond", "then", "orelse"),
+    For: ("init", "cond", "step", "body"),
+    Return: ("value",),
+    Assign: ("target", "value"),
+    Binary: ("left", "right"),
+    Unary: ("operand",),
+    Var: ("index",),
+    Call: ("args",),
+    Num: (),
+}
+
+
+def children(node: Node) -> List[Node]:
+    out: List[Node] = []
+    fields = _CHILD_FIELDS[type(node)]
+    i = 0
+    while i < len(fields):
+        value = getattr(node, fields[i])
+        if isinstance(value, list):
+            out.extend(value)
+        elif value is not None:
+            out.append(value)
+        i += 1
+    return out
+
+
+def walk(root: Node) -> Iterator[Node]:
+    """Pre-order over the AST, without recursion."""
+    stack: List[Node] = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        kids = children(node)
+        k = len(kids) - 1
+        while k >= 0:
+            stack.append(kids[k])
+            k -= 1
+
+
+# ---------------------------------------------------------------------------
+# Lowering
+# ---------------------------------------------------------------------------
+#
+# Each nonterminal's handler gets the values of its children in order (the
+# Token for a leaf, None for "epsilon", the handler result for a nonterminal)
+# and their symbols, so children missing after a syntax error are not
+# mistaken for their neighbours. Nullable helper nonterminals return "tails"
+# that still need the operand to their left: D and G give (op, operand, rest)
+# chains ending in (), C gives (op, operand) or (). Lists (Declaration-list,
+# Args, ...) are built in reverse by appending and put in order by the node
+# that uses them.
+
+_NO_TAIL: Tuple = ()
+
+_S = SYMBOL_ID
+
+
+def _child(kids: List[object], syms: List[int], sym: int) -> object:
+    i = 0
+    while i < len(syms):
+        if syms[i] == sym:
+            return kids[i]
+        i += 1
+    return None
+
+
+def _after(kids: List[object], syms: List[int], before: int, sym: int) -> object:
+    # The `sym` child right after a `before` child
+    i = 1
+    while i < len(syms):
+        if syms[i] == sym and syms[i - 1] == before:
+            return kids[i]
+        i += 1
+    return None
+
+
+def _fold(left: Optional[Node], tail: object) -> Optional[Node]:
+    # Left-associative chain of a D or G tail
+    while isinstance(tail, tuple) and len(tail) == 3:
+        op, right, tail = tail
+        left = Binary(op, left, right)
+    return left
+
+
+def _compare(left: Optional[Node], tail: object) -> Optional[Node]:
+    if isinstance(tail, tuple) and len(tail) == 2:
+        return Binary(tail[0], left, tail[1])
+    return left
+
+
+def _in_order(values: object) -> List[Node]:
+    if not isinstance(values, list):
+        return []
+    values.reverse()
+    return values
+
+
+def _prepend(item: object, rest: object) -> List[object]:
+    out = rest if isinstance(rest, list) else []
+    if item is not None:
+        out.append(item)
+    return out
+
+
+def _var(tok: Token, index: Optional[Node] = None) -> Var:
+    return Var(tok.start, tok.lex, index)
+
+
+def _operators(primary: Node, g: object, d: object, c: object) -> Optional[Node]:
+    return _compare(_fold(_fold(primary, g), d), c)
+
+
+def _program(kids: List[object], syms: List[int]) -> Program:
+    return Program(_in_order(_child(kids, syms, _S["Declaration-list"])))
+
+
+def _sequence(kids: List[object], syms: List[int]) -> List[object]:
+    # X-list -> X X-list | epsilon (Declaration-list, Statement-list)
+    if kids[0] is None:
+        return []
+    return _prepend(kids[0], kids[1] if len(kids) > 1 else None)
+
+
+def _declaration(kids: List[object], syms: List[int]) -> Optional[Node]:
+    head = kids[0]
+    if not isinstance(head, tuple):
+        return None
+    type_tok, id_tok = head
+    prime = _child(kids, syms, _S["Declaration-prime"])
+    name = id_tok.lex if id_tok is not None else None
+    if isinstance(prime, tuple) and prime[0] == "fun":
+        return FunDecl(type_tok.start, type_tok.lex, name, prime[1], prime[2])
+    return VarDecl(type_tok.start, type_tok.lex, name, prime[1] if isinstance(prime, tuple) else None)
+
+
+def _declaration_initial(kids: List[object], syms: List[int]) -> Optional[Tuple[Token, Optional[Token]]]:
+    if not isinstance(kids[0], Token):
+        return None     # Type-specifier gave up
+    return kids[0], _child(kids, syms, ID_ID)
+
+
+def _var_declaration_prime(kids: List[object], syms: List[int]) -> Tuple[str, Optional[int]]:
+    num = _child(kids, syms, NUM_ID)
+    return "var", int(num.lex) if num is not None else None
+
+
+def _fun_declaration_prime(kids: List[object], syms: List[int]) -> Tuple[str, List[Param], Optional[Compound]]:
+    return "fun", _in_order(_child(kids, syms, _S["Params"])), _child(kids, syms, _S["Compound-stmt"])
+
+
+def _params(kids: List[object], syms: List[int]) -> List[Param]:
+    first = kids[0]
+    if first.lex == "void":
+        return []
+    id_tok = _child(kids, syms, ID_ID)
+    is_array = _child(kids, syms, _S["Param-prime"]) is True
+    param = Param(first.start, "int", id_tok.lex if id_tok is not None else None, is_array)
+    return _prepend(param, _child(kids, syms, _S["Param-list"]))
+
+
+def _param_list(kids: List[object], syms: List[int]) -> List[object]:
+    if kids[0] is None:
+        return []
+    return _prepend(_child(kids, syms, _S["Param"]), _child(kids, syms, _S["Param-list"]))
+
+
+def _param(kids: List[object], syms: List[int]) -> Optional[Param]:
+    head = kids[0]
+    if not isinstance(head, tuple):
+        return None
+    type_tok, id_tok = head
+    is_array = _child(kids, syms, _S["Param-prime"]) is True
+    return Param(type_tok.start, type_tok.lex, id_tok.lex if id_tok is not None else None, is_array)
+
+
+def _param_prime(kids: List[object], syms: List[int]) -> bool:
+    return kids[0] is not None
+
+
+def _compound(kids: List[object], syms: List[int]) -> Compound:
+    decls = _child(kids, syms, _S["Declaration-list"])
+    stmts = _child(kids, syms, _S["Statement-list"])
+    return Compound(kids[0].start, _in_order(decls), _in_order(stmts))
+
+
+def _first(kids: List[object], syms: List[int]) -> object:
+    return kids[0]
+
+
+def _expression_stmt(kids: List[object], syms: List[int]) -> Node:
+    first = kids[0]
+    if isinstance(first, Token):
+        if first.lex == "break":
+            return Break(first.start)
+        return ExprStmt(None)
+    return ExprStmt(first)
+
+
+def _selection_stmt(kids: List[object], syms: List[int]) -> If:
+    cond = _child(kids, syms, _S["Expression"])
+    then = _child(kids, syms, _S["Statement"])
+    return If(kids[0].start, cond, then, _child(kids, syms, _S["Else-stmt"]))
+
+
+def _else_stmt(kids: List[object], syms: List[int]) -> Optional[Node]:
+    return _child(kids, syms, _S["Statement"])
+
+
+def _iteration_stmt(kids: List[object], syms: List[int]) -> For:
+    e = _S["Expression"]
+    init = _after(kids, syms, _S["("], e)
+    semi = _S[";"]
+    cond = step = None
+    i = 1
+    while i < len(syms):
+        if syms[i] == e and syms[i - 1] == semi:
+            if cond is None and i + 1 < len(syms) and syms[i + 1] == semi:
+                cond = kids[i]
+            else:
+                step = kids[i]
+        i += 1
+    return For(kids[0].start, init, cond, step, _child(kids, syms, _S["Compound-stmt"]))
+
+
+def _return_stmt(kids: List[object], syms: List[int]) -> Return:
+    return Return(kids[0].start, _child(kids, syms, _S["Return-stmt-prime"]))
+
+
+def _return_stmt_prime(kids: List[object], syms: List[int]) -> Optional[Node]:
+    return _child(kids, syms, _S["Expression"])
+
+
+def _expression(kids: List[object], syms: List[int]) -> Optional[Node]:
+    first = kids[0]
+    if not isinstance(first, Token):
+        return first
+    b = _child(kids, syms, _S["B"])
+    if not isinstance(b, tuple):
+        return _var(first)
+    if b[0] == "=":
+        return Assign(_var(first), b[1])
+    if b[0] == "[":
+        target = _var(first, b[1])
+        h = b[2]
+        if not isinstance(h, tuple):
+            return target
+        if h[0] == "=":
+            return Assign(target, h[1])
+        return _operators(target, h[1], h[2], h[3])
+    # Simple-expression-prime: (((Factor-prime, G), D), C)
+    sep = b[1]
+    if not (isinstance(sep, tuple) and isinstance(sep[0], tuple) and isinstance(sep[0][0], tuple)):
+        return _var(first)  # cut short by Unexpected EOF
+    ((args, g), d), c = sep
+    primary = Call(first.start, first.lex, args) if isinstance(args, list) else _var(first)
+    return _operators(primary, g, d, c)
+
+
+def _b(kids: List[object], syms: List[int]) -> Tuple:
+    first = kids[0]
+    if not isinstance(first, Token):
+        return "s", first
+    if first.lex == "=":
+        return "=", _child(kids, syms, _S["Expression"])
+    return "[", _child(kids, syms, _S["Expression"]), _child(kids, syms, _S["H"])
+
+
+def _h(kids: List[object], syms: List[int]) -> Tuple:
+    if isinstance(kids[0], Token):
+        return "=", _child(kids, syms, _S["Expression"])
+    return "ops", _child(kids, syms, _S["G"]), _child(kids, syms, _S["D"]), _child(kids, syms, _S["C"])
+
+
+def _simple_expression(kids: List[object], syms: List[int]) -> Optional[Node]:
+    return _compare(kids[0], _child(kids, syms, _S["C"]))
+
+
+def _pair(kids: List[object], syms: List[int]) -> Tuple[object, object]:
+    # Simple-expression-prime, Additive-expression-prime and Term-prime stay
+    # open until Expression supplies the identifier in front of them
+    return kids[0], kids[1] if len(kids) > 1 else _NO_TAIL
+
+
+def _c(kids: List[object], syms: List[int]) -> Tuple:
+    if kids[0] is None:
+        return _NO_TAIL
+    return kids[0], _child(kids, syms, _S["Additive-expression"])
+
+
+def _lex(kids: List[object], syms: List[int]) -> str:
+    return kids[0].lex
+
+
+_TAIL_SYMS = (_S["D"], _S["G"])
+
+
+def _additive(kids: List[object], syms: List[int]) -> Optional[Node]:
+    # Additive-expression -> Term D, Term -> Signed-factor G, and the -zegond variants
+    if syms[0] in _TAIL_SYMS:
+        return _fold(None, kids[0])     # the operand is missing
+    return _fold(kids[0], kids[1] if len(kids) > 1 else _NO_TAIL)
+
+
+def _d(kids: List[object], syms: List[int]) -> Tuple:
+    if kids[0] is None:
+        return _NO_TAIL
+    return kids[0], _child(kids, syms, _S["Term"]), _child(kids, syms, _S["D"])
+
+
+def _g(kids: List[object], syms: List[int]) -> Tuple:
+    if kids[0] is None:
+        return _NO_TAIL
+    return kids[0].lex, _child(kids, syms, _S["Signed-factor"]), _child(kids, syms, _S["G"])
+
+
+def _signed_factor(kids: List[object], syms: List[int]) -> Optional[Node]:
+    first = kids[0]
+    if isinstance(first, Token) and first.lex in ("+", "-"):
+        return Unary(first.start, first.lex, kids[1] if len(kids) > 1 else None)
+    return first
+
+
+def _factor(kids: List[object], syms: List[int]) -> Optional[Node]:
+    first = kids[0]
+    if first.typ == "NUM":
+        return Num(first.start, int(first.lex))
+    if first.typ == "ID":
+        rest = _child(kids, syms, _S["Var-call-prime"])
+        if isinstance(rest, list):
+            return Call(first.start, first.lex, rest)
+        return _var(first, rest)
+    return _child(kids, syms, _S["Expression"])    # ( Expression )
+
+
+def _var_call_prime(kids: List[object], syms: List[int]) -> object:
+    # Call arguments as a list, or the subscript (None if there is none)
+    if isinstance(kids[0], Token):
+        return _in_order(_child(kids, syms, _S["Args"]))
+    return kids[0]
+
+
+def _var_prime(kids: List[object], syms: List[int]) -> Optional[Node]:
+    return _child(kids, syms, _S["Expression"])
+
+
+def _factor_prime(kids: List[object], syms: List[int]) -> Optional[List[Node]]:
+    if kids[0] is None:
+        return None
+    return _in_order(_child(kids, syms, _S["Args"]))
+
+
+def _args(kids: List[object], syms: List[int]) -> List[object]:
+    # Arguments in reverse, like the other lists
+    return kids[0] if isinstance(kids[0], list) else []
+
+
+def _arg_list(kids: List[object], syms: List[int]) -> List[object]:
+    return _prepend(kids[0], _child(kids, syms, _S["Arg-list-prime"]))
+
+
+def _arg_list_prime(kids: List[object], syms: List[int]) -> List[object]:
+    if kids[0] is None:
+        return []
+    return _prepend(_child(kids, syms, _S["Expression"]), _child(kids, syms, _S["Arg-list-prime"]))
+
+
+_HANDLERS: List[Optional[Callable[[List[object], List[int]], object]]] = [None] * len(NODE_NAMES)
+
+_HANDLER_NAMES = {
+    "Program": _program,
+    "Declaration-list": _sequence,
+    "Declaration": _declaration,
+    "Declaration-initial": _declaration_initial,
+    "Declaration-prime": _first,
+    "Var-declaration-prime": _var_declaration_prime,
+    "Fun-declaration-prime": _fun_declaration_prime,
+    "Type-specifier": _first,
+    "Params": _params,
+    "Param-list": _param_list,
+    "Param": _param,
+    "Param-prime": _param_prime,
+    "Compound-stmt": _compound,
+    "Statement-list": _sequence,
+    "Statement": _first,
+    "Expression-stmt": _expression_stmt,
+    "Selection-stmt": _selection_stmt,
+    "Else-stmt": _else_stmt,
+    "Iteration-stmt": _iteration_stmt,
+    "Return-stmt": _return_stmt,
+    "Return-stmt-prime": _return_stmt_prime,
+    "Expression": _expression,
+    "B": _b,
+    "H": _h,
+    "Simple-expression-zegond": _simple_expression,
+    "Simple-expression-prime": _pair,
+    "C": _c,
+    "Relop": _lex,
+    "Additive-expression": _additive,
+    "Additive-expression-prime": _pair,
+    "Additive-expression-zegond": _additive,
+    "D": _d,
+    "Addop": _lex,
+    "Term": _additive,
+    "Term-prime": _pair,
+    "Term-zegond": _additive,
+    "G": _g,
+    "Signed-factor": _signed_factor,
+    "Signed-factor-zegond": _signed_factor,
+    "Factor": _factor,
+    "Var-call-prime": _var_call_prime,
+    "Var-prime": _var_prime,
+    "Factor-prime": _factor_prime,
+    "Factor-zegond": _factor,
+    "Args": _args,
+    "Arg-list": _arg_list,
+    "Arg-list-prime": _arg_list_prime,
+}
+
+_names = list(_HANDLER_NAMES)
+_i = 0
+while _i < len(_names):
+    _HANDLERS[SYMBOL_ID[_names[_i]]] = _HANDLER_NAMES[_names[_i]]
+    _i += 1
+del _names, _i
+
+
+def lower(tree: NodeView) -> Optional[Node]:
+    """AST of a TreeStore tree (or subtree); a Program for a whole parse."""
+    if not isinstance(tree, NodeView):
+        raise TypeError("lower() needs a TreeStore tree: Parser(..., engine='int', tree='store')")
+    store = tree.store
+    sym = store.sym
+    tok = store.tok
+    first = store.first
+    nxt = store.next
+    tokens = store.tokens
+    handlers = _HANDLERS
+
+    # The subtree of a pre-order node is the id range up to its last descendant
+    root = tree.index
+    last = root
+    c = first[last]
+    while c >= 0:
+        while nxt[c] >= 0:
+            c = nxt[c]
+        last = c
+        c = first[last]
+    values: List[object] = [None] * (last + 1 - root)
+
+    i = last
+    while i >= root:
+        t = tok[i]
+        if t >= 0:
+            values[i - root] = tokens[t]
+        else:
+            handler = handlers[sym[i]]
+            if handler is not None:
+                kids: List[object] = []
+                syms: List[int] = []
+                c = first[i]
+                while c >= 0:
+                    kids.append(values[c - root])
+                    syms.append(sym[c])
+                    c = nxt[c]
+                if kids:
+                    values[i - root] = handler(kids, syms)
+        i -= 1
+    return values[0]
+
+
+def parse_ast(scanner: object) -> Tuple[Optional[Node], List[str]]:
+    """Parse with the store engine and lower the result: (AST, syntax errors)."""
+    parser = Parser(scanner, engine="int", tree="store")
+    tree = parser.parse()
+    return lower(tree), parser.errors
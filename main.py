@@ -1,31 +1,124 @@
 # -*- coding: utf-8 -*-
-"""Entry point: read input.txt, write parse_tree.txt and syntax_errors.txt."""
+"""Entry point: read input.txt, write parse_tree.txt and syntax_errors.txt.
+
+With source arguments it runs in batch mode instead (see batch_main):
+
+    python main.py SRC... [--manifest FILE] [-o OUT_DIR] [-j WORKERS] [--cache DIR]
+
+--stats also writes stats.json (phase times and counters, see instrument.Stats)
+next to the outputs, in either mode. --errors-only validates without building
+or writing the parse tree: only syntax_errors.txt is produced. --format jsonl
+or --format binary writes the tree as parse_tree.jsonl / parse_tree.bin
+instead of parse_tree.txt (see tree_formats). --cache DIR reuses the parse of
+an unchanged source (see parse_cache.py), in either mode.
+
+    python main.py --split [-j WORKERS]
+
+parses one large input.txt with WORKERS processes, split between top-level
+declarations (see parallel.py); the outputs are the same as without it.
+--pipeline scans input.txt in a separate process that feeds the parser
+through a shared-memory ring buffer (see pipeline.py), also with the same
+outputs. --stream writes the parse tree (text or jsonl) one top-level
+declaration at a time as the parser finishes them (see Parser.events), so
+memory does not grow with the size of input.txt. --index also writes
+parse_tree.idx, an index of the tree for structural queries (see
+tree_index.py).
+"""
 
 from __future__ import annotations
 
+import argparse
+import fnmatch
+import io
+import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
 from scanner import Scanner
-from parser import Parser
-from parse_tree import render_tree
+from source_index import LineIndex
+from parser import ParseEvent, Parser
+from compiler import errors_text
+from parse_tree import PTNode
+from instrument import Stats
+from parse_cache import DEFAULT_MAX_BYTES, ParseCache, TokenRecorder
+from parallel import parse_parallel
+from pipeline import PipelinedScanner
+from tree_formats import FORMATS, STREAM_FORMATS, TREE_FILES, save_tree, save_tree_events
+from tree_index import build_index
+import grammar
+
+
+def write_errors(errors: List[str], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(errors_text(errors))
+
 
+def main(
+    stats_path: Optional[str] = None,
+    errors_only: bool = False,
+    split_workers: int = 0,
+    tree_format: str = "text",
+    pipeline: bool = False,
+    stream: bool = False,
+    index: bool = False,
+    cache_dir: Optional[str] = None,
+    cache_bytes: int = DEFAULT_MAX_BYTES,
+) -> None:
+    tree_file = TREE_FILES[tree_format]
+    if split_workers > 1 and not errors_only and not stats_path:
+        main_split(split_workers, tree_format, index)
+        return
 
-def main() -> None:
+    stats = Stats() if stats_path else None
     try:
-        with open("input.txt", "r", encoding="utf-8") as f:
-            src = f.read()
+        # Streamed in chunks (memory-mapped when possible) instead of read() into one str.
+        # Scanner stats are per process, so --stats keeps the scanner in this one.
+        # The cache is keyed by the raw bytes, so it reads the file whole
+        if cache_dir is not None:
+            with open("input.txt", "rb") as f:
+                source = f.read()
+        elif pipeline and stats is None:
+            scanner = PipelinedScanner.from_file("input.txt")
+        else:
+            scanner = Scanner.from_file("input.txt", stats=stats)
     except FileNotFoundError:
-        with open("parse_tree.txt", "w", encoding="utf-8") as f:
-            f.write("Program\n")
+        if not errors_only and tree_format == "text":
+            with open(tree_file, "w", encoding="utf-8") as f:
+                f.write("Program\n")
+        elif not errors_only:
+            save_tree(PTNode("Program"), tree_file, tree_format)
         with open("syntax_errors.txt", "w", encoding="utf-8") as f:
             f.write("No syntax errors found.")
         return
 
-    scanner = Scanner(src)
-    parser = Parser(scanner)
-    tree = parser.parse()
+    if cache_dir is not None:
+        cache = ParseCache(cache_dir, cache_bytes)
+        tree, errors, lines, _ = parse_cached(cache, source, "none" if errors_only else "store", stats)
+    else:
+        # Parsing and writing interleave when streaming, so --stats (which times
+        # them as separate phases) keeps the whole-tree path, as does --index
+        if stream and stats is None and not index and not errors_only and tree_format in STREAM_FORMATS:
+            parser = Parser(scanner, engine="int", tree="store")
+            errors = []
+            save_tree_events(_collect_errors(parser.events(), errors), tree_file, tree_format)
+            scanner.close()
+            write_errors(errors, "syntax_errors.txt")
+            return
 
-    files = ["parse_tree.txt", "syntax_errors.txt"]
+        if errors_only:
+            parser = Parser(scanner, engine="int", tree="none", stats=stats)
+        elif index:
+            parser = Parser(scanner, engine="int", tree="store", stats=stats)
+        else:
+            parser = Parser(scanner, stats=stats)
+        tree = parser.parse()
+        scanner.close()
+        errors, lines = parser.errors, parser.index
+
+    files = [tree_file, "syntax_errors.txt", "parse_tree.idx"]
     idx = 0
     while idx < len(files):
         name = files[idx]
@@ -36,15 +129,295 @@ def main() -> None:
             pass
         idx += 1
 
-    with open("parse_tree.txt", "w", encoding="utf-8") as f:
-        f.write(render_tree(tree))
+    if not errors_only:
+        # Streamed node by node through a large write buffer, never joined in memory
+        save_tree(tree, tree_file, tree_format, stats)
+        if index:
+            build_index(tree, lines).save("parse_tree.idx")
 
-    with open("syntax_errors.txt", "w", encoding="utf-8") as f:
-        if not parser.errors:
-            f.write("No syntax errors found.")
+    write_errors(errors, "syntax_errors.txt")
+    if stats is not None:
+        stats.write_json(stats_path)
+
+
+def _collect_errors(events: Iterator[ParseEvent], errors: List[str]) -> Iterator[ParseEvent]:
+    event = next(events, None)
+    while event is not None:
+        errors.extend(event.errors)
+        yield event
+        event = next(events, None)
+
+
+def main_split(workers: int, tree_format: str = "text", index: bool = False) -> None:
+    try:
+        # Decoded like Scanner.from_file: strict UTF-8, universal newlines
+        with open("input.txt", "r", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        main(tree_format=tree_format)
+        return
+    tree, errors, _ = parse_parallel(text, workers)
+
+    save_tree(tree, TREE_FILES[tree_format], tree_format)
+    write_errors(errors, "syntax_errors.txt")
+    if index:
+        # The stitched tree is numbered in pre-order like a serial one
+        build_index(tree, LineIndex.from_text(text)).save("parse_tree.idx")
+    elif os.path.exists("parse_tree.idx"):
+        os.remove("parse_tree.idx")
+
+
+# ---------------------------------------------------------------------------
+# Batch mode
+# ---------------------------------------------------------------------------
+
+def collect_inputs(paths: Sequence[str], manifest: Optional[str], pattern: str) -> List[Tuple[str, str]]:
+    """Return sorted (input path, output name) pairs.
+
+    Files inside a directory argument are named relative to that directory,
+    other files by their base name. Two inputs mapping to the same output
+    name are rejected.
+    """
+    by_name: Dict[str, str] = {}
+
+    def add(path: str, out_name: str) -> None:
+        path = os.path.normpath(path)
+        if by_name.setdefault(out_name, path) != path:
+            raise SystemExit(f"batch: {by_name[out_name]} and {path} map to the same output name {out_name!r}")
+
+    entries = list(paths)
+    if manifest is not None:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            if line and not line.startswith("#"):
+                entries.append(line if os.path.isabs(line) else os.path.join(base, line))
+            i += 1
+
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        if os.path.isdir(entry):
+            walked = list(os.walk(entry))
+            found: List[str] = []
+            k = 0
+            while k < len(walked):
+                dirpath, _, filenames = walked[k]
+                found.extend(os.path.join(dirpath, n) for n in filenames if fnmatch.fnmatchcase(n, pattern))
+                k += 1
+            found.sort()
+            j = 0
+            while j < len(found):
+                add(found[j], os.path.relpath(found[j], entry))
+                j += 1
+        else:
+            add(entry, os.path.basename(entry))
+        i += 1
+
+    return sorted(((path, name) for name, path in by_name.items()), key=lambda job: job[1])
+
+
+# Per-process parse cache, set up by _init_worker when --cache is given
+_CACHE: Optional[ParseCache] = None
+
+
+def _init_worker(cache_dir: Optional[str] = None, cache_bytes: int = DEFAULT_MAX_BYTES) -> None:
+    # Build (or load) the grammar tables once per worker process
+    global _CACHE
+    grammar.load_tables()
+    _CACHE = ParseCache(cache_dir, cache_bytes) if cache_dir else None
+
+
+def parse_cached(
+    cache: ParseCache, source: bytes, tree_kind: str, stats: Optional[Stats] = None
+) -> Tuple[Optional[PTNode], List[str], LineIndex, str]:
+    """(tree, errors, line index, "hit" or "miss") of source, from the cache when it has it.
+
+    With stats, the hit or miss is also recorded there (Stats.cache).
+    """
+    key = cache.key(source)
+    entry = cache.get(key)
+    if entry is not None:
+        if stats is not None:
+            stats.cache = "hit"
+        return entry.tree, entry.errors, entry.index, "hit"
+    if stats is not None:
+        stats.cache = "miss"
+
+    recorder = TokenRecorder(Scanner.from_stream(io.BytesIO(source), engine="regex", stats=stats))
+    parser = Parser(recorder, engine="int", tree=tree_kind, stats=stats)
+    tree = parser.parse()
+    try:
+        if tree is not None:
+            cache.put(key, recorder.tokens, recorder.index, tree, parser.errors)
+    except OSError:
+        pass    # an unwritable cache only costs the speedup
+    return tree, parser.errors, recorder.index, "miss"
+
+
+def compile_file(job: Tuple[str, str, str, bool, bool, str]) -> Dict[str, object]:
+    """Compile one input into OUT_DIR/<name>/{parse_tree,syntax_errors}.txt (+ stats.json)."""
+    src_path, out_name, out_dir, with_stats, errors_only, tree_format = job
+    tree_kind = "none" if errors_only else "store"
+    target = os.path.join(out_dir, out_name)
+    result: Dict[str, object] = {"input": src_path, "output": target}
+    stats = Stats() if with_stats else None
+
+    cache = _CACHE
+    scanner: Optional[Scanner] = None
+    t0 = time.perf_counter()
+    # Input is decoded while it is scanned, so a file that is not UTF-8
+    # fails inside parse(): that only fails this file, not the batch
+    try:
+        if cache is None:
+            scanner = Scanner.from_file(src_path, engine="regex", stats=stats)
+            parser = Parser(scanner, engine="int", tree=tree_kind, stats=stats)
+            tree = parser.parse()
+            errors = parser.errors
+        else:
+            with open(src_path, "rb") as f:
+                source = f.read()
+            tree, errors, _, result["cache"] = parse_cached(cache, source, tree_kind, stats)
+    except (OSError, ValueError) as exc:
+        result["failed"] = f"{type(exc).__name__}: {exc}"
+        return result
+    finally:
+        if scanner is not None:
+            scanner.close()
+    t1 = time.perf_counter()
+
+    os.makedirs(target, exist_ok=True)
+    if not errors_only:
+        save_tree(tree, os.path.join(target, TREE_FILES[tree_format]), tree_format, stats)
+        result["nodes"] = len(tree.store)
+    write_errors(errors, os.path.join(target, "syntax_errors.txt"))
+    t2 = time.perf_counter()
+    if stats is not None:
+        stats.write_json(os.path.join(target, "stats.json"))
+
+    result["errors"] = len(errors)
+    result["parse_seconds"] = t1 - t0
+    result["write_seconds"] = t2 - t1
+    return result
+
+
+def run_batch(
+    jobs: List[Tuple[str, str]],
+    out_dir: str,
+    workers: int,
+    stats: bool = False,
+    errors_only: bool = False,
+    cache_dir: Optional[str] = None,
+    cache_bytes: int = DEFAULT_MAX_BYTES,
+    tree_format: str = "text",
+) -> List[Dict[str, object]]:
+    work = [(src, name, out_dir, stats, errors_only, tree_format) for src, name in jobs]
+    if workers <= 1:
+        _init_worker(cache_dir, cache_bytes)
+        return [compile_file(job) for job in work]
+
+    # map() yields results in submission order, so the summary does not
+    # depend on the number of workers or on which one finishes first
+    chunksize = max(1, len(work) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir, cache_bytes)) as pool:
+        return list(pool.map(compile_file, work, chunksize=chunksize))
+
+
+def batch_main(argv: Sequence[str]) -> int:
+    ap = argparse.ArgumentParser(prog="main.py", description="Compile many C-minus sources in parallel.")
+    ap.add_argument("inputs", nargs="*", help="source files and/or directories")
+    ap.add_argument("--manifest", help="file listing one input path per line ('#' starts a comment)")
+    ap.add_argument("--pattern", default="*.txt", help="file name pattern inside directories (default: *.txt)")
+    ap.add_argument("-o", "--out-dir", default="build", help="output directory (default: build)")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    ap.add_argument("--stats", action="store_true", help="also write stats.json with phase times and counters")
+    ap.add_argument("--errors-only", action="store_true", help="only check syntax; write no parse_tree.txt")
+    ap.add_argument("--cache", metavar="DIR", help="reuse parse results of unchanged sources from this directory")
+    ap.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES >> 20, metavar="MIB", help="cache size cap")
+    ap.add_argument("--split", action="store_true", help="parse input.txt with -j workers, split between declarations")
+    ap.add_argument("--format", choices=FORMATS, default="text", help="parse tree output format (default: text)")
+    ap.add_argument("--pipeline", action="store_true", help="scan input.txt in a separate process")
+    ap.add_argument("--stream", action="store_true", help="write input.txt's tree as each declaration is parsed")
+    ap.add_argument("--index", action="store_true", help="also write parse_tree.idx for input.txt's tree")
+    args = ap.parse_args(argv)
+
+    if not args.inputs and args.manifest is None and args.cache and (args.split or args.pipeline or args.stream):
+        ap.error("--cache cannot be combined with --split, --pipeline or --stream")
+    if not args.inputs and args.manifest is None and args.split and (args.pipeline or args.stream):
+        ap.error("--split cannot be combined with --pipeline or --stream")
+    if not args.inputs and args.manifest is None:
+        # No sources given: the single-file input.txt mode
+        main(
+            "stats.json" if args.stats else None,
+            args.errors_only,
+            args.workers if args.split else 0,
+            args.format,
+            args.pipeline,
+            args.stream,
+            args.index,
+            args.cache,
+            args.cache_size << 20,
+        )
+        return 0
+
+    jobs = collect_inputs(args.inputs, args.manifest, args.pattern)
+    if not jobs:
+        ap.error("no input files")
+
+    t0 = time.perf_counter()
+    results = run_batch(
+        jobs,
+        args.out_dir,
+        args.workers,
+        args.stats,
+        args.errors_only,
+        args.cache,
+        args.cache_size << 20,
+        args.format,
+    )
+    wall = time.perf_counter() - t0
+
+    failed = [r for r in results if "failed" in r]
+    summary = {
+        "files": len(results),
+        "failed": len(failed),
+        "files_with_errors": sum(1 for r in results if r.get("errors")),
+        "total_errors": sum(r.get("errors", 0) for r in results),
+        "workers": args.workers,
+        "wall_seconds": wall,
+        "results": results,
+    }
+    if args.cache:
+        summary["cache"] = {
+            "hits": sum(1 for r in results if r.get("cache") == "hit"),
+            "misses": sum(1 for r in results if r.get("cache") == "miss"),
+        }
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    with open(os.path.join(args.out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    i = 0
+    while i < len(results):
+        r = results[i]
+        if "failed" in r:
+            print(f"FAILED  {r['input']}: {r['failed']}")
         else:
-            f.write("\n".join(parser.errors))
+            print(f"{r['errors']:6d} errors  {r['parse_seconds'] * 1e3:9.1f} ms  {r['input']}")
+        i += 1
+    print(
+        f"{summary['files']} files, {summary['total_errors']} errors in {summary['files_with_errors']} files, "
+        f"{summary['failed']} failed, {wall:.2f} s with {args.workers} worker(s)"
+    )
+    if args.cache:
+        print(f"cache: {summary['cache']['hits']} hits, {summary['cache']['misses']} misses")
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(batch_main(sys.argv[1:]))
     main()
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""Parse one large source in parallel, split between top-level declarations.
+
+A cheap pre-scan over the text (comments and braces only) finds lines that
+start with `int`/`void` + identifier at brace depth zero; the text is cut
+at some of them into chunks of about chunk_chars characters. Each worker
+scans its chunk and walks the top-level Declaration-list chain, with the
+first token of the next chunk standing in for EOF: the chunk is done when
+that token becomes the lookahead at Declaration-list level, which is exactly
+the state the serial parser would be in at that point. The chunks' trees are
+then stitched into one TreeStore and their errors concatenated.
+
+If the braces do not balance, or some chunk's parse did not end at its
+stand-in token (a declaration left open by a syntax error, or panic mode
+dropping out of the Declaration-list), the whole text is parsed serially
+instead. Either way the result is identical to
+Parser(Scanner(text), "int", "store").
+"""
+
+from __future__ import annotations
+
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from grammar import EOF_ID, FOLLOW_FLAT, N_TERMINALS, NT_BASE, PARSE_TABLE_FLAT, PROD_RHS, TERMINAL_ID
+from parse_tree import NodeView, TreeStore
+from parser import DECLARATION_ID, DECLARATION_LIST_ID, PROGRAM_ID, Parser
+from scanner import Token, Scanner
+from source_index import LineIndex
+import grammar
+
+
+DEFAULT_CHUNK_CHARS = 1 << 20
+
+# Comments are matched whole (so nothing inside them counts), then braces and
+# candidate declaration starts. Mirrors the scanner: every '/' outside a
+# comment starts a token, '//' runs to '\n' or '\f', '/*' to the next '*/'.
+_PRESCAN = re.compile(
+    r"//[^\n\f]*|/\*.*?(?:\*/|\Z)|\*/|(\{)|(\})|^(int|void)[ \t\r\v\f\n]+[A-Za-z_]",
+    re.S | re.M,
+)
+
+# (node arrays, leaf tokens, errors, local id of the Declaration-list left open)
+_ChunkResult = Tuple[bytes, bytes, bytes, bytes, bytes, List[str], bytes, bytes, bytes, List[str], int]
+
+
+def find_splits(text: str, chunk_chars: int) -> Optional[List[Tuple[int, str]]]:
+    """(offset, keyword) of the chunk starts after the first, or None if the braces do not balance."""
+    splits: List[Tuple[int, str]] = []
+    depth = 0
+    want = chunk_chars
+    it = _PRESCAN.finditer(text)
+    m = next(it, None)
+    while m is not None:
+        if m.group(1):
+            depth += 1
+        elif m.group(2):
+            depth -= 1
+            if depth < 0:
+                return None
+        elif m.group(3) and depth == 0 and m.start() >= want:
+            splits.append((m.start(), m.group(3)))
+            want = m.start() + chunk_chars
+        m = next(it, None)
+    return splits if depth == 0 else None
+
+
+class _ChunkFeed:
+    """Token list ending in the stand-in token; asking past it is an overrun."""
+
+    def __init__(self, tokens: List[Token], index: LineIndex):
+        self.tokens = tokens
+        self.index = index
+        self.i = 0
+        self.overrun = False
+
+    def get_next_token(self) -> Token:
+        if self.i < len(self.tokens):
+            tok = self.tokens[self.i]
+            self.i += 1
+            return tok
+        self.overrun = True
+        end = self.tokens[-1].end
+        return Token("EOF", "$", end, end, EOF_ID)
+
+
+def _parse_chunk(job: Tuple[str, int, int, Optional[str]]) -> Optional[_ChunkResult]:
+    text, offset, first_line, next_kw = job
+    index = LineIndex.from_text(text, first_line)
+    scanner = Scanner(text, "regex", index=index)
+    tokens: List[Token] = []
+    while True:
+        tok = scanner.get_next_token()
+        tokens.append(tok)
+        if tok.typ == "EOF":
+            break
+
+    sentinel: Optional[Token] = None
+    if next_kw is not None:
+        end = len(text)
+        sentinel = Token("KEYWORD", next_kw, end, end + len(next_kw), TERMINAL_ID[next_kw])
+        tokens[-1] = sentinel
+
+    feed = _ChunkFeed(tokens, index)
+    parser = Parser(feed, "int", "store")
+    store: TreeStore = parser.builder
+    root = store.node(None, PROGRAM_ID)
+
+    # Declaration-list chain, as Parser._parse_nonterminal_int would expand it
+    row = (DECLARATION_LIST_ID - NT_BASE) * N_TERMINALS
+    owner = root
+    while True:
+        la = parser.lookahead
+        if la is sentinel:
+            break
+        p = PARSE_TABLE_FLAT[row + la.term]
+        if p < 0:
+            if FOLLOW_FLAT[row + la.term]:
+                parser._err_missing(la, "Declaration-list")
+                break
+            if la.term == EOF_ID:
+                parser._err_unexpected_eof(la)
+                parser.stopped = True
+                break
+            parser._discard("Declaration-list")
+            continue
+
+        node = store.node(owner, DECLARATION_LIST_ID)
+        if not PROD_RHS[p]:
+            store.epsilon(node)
+            break
+        parser._parse_nonterminal_int(DECLARATION_ID, node)
+        if feed.overrun or parser.stopped:
+            break
+        owner = node
+
+    # Anything but reaching the stand-in at Declaration-list level means the
+    # serial parse continues differently from here
+    if sentinel is not None and (feed.overrun or parser.stopped or parser.lookahead is not sentinel):
+        return None
+
+    if sentinel is None and not parser.stopped:
+        while parser.lookahead.term != EOF_ID:
+            parser._discard("Program")
+        store.node(root, EOF_ID)
+
+    leaves = store.tokens
+    return (
+        store.sym.tobytes(),
+        store.tok.tobytes(),
+        store.first.tobytes(),
+        store.next.tobytes(),
+        leaves.code.tobytes(),
+        [leaves.lexemes[i] for i in leaves.lex],
+        array("q", [t + offset for t in leaves.start]).tobytes(),
+        array("q", [t + offset for t in leaves.end]).tobytes(),
+        leaves.term.tobytes(),
+        parser.errors,
+        owner if sentinel is not None else -1,
+    )
+
+
+def _append_child(store: TreeStore, parent: int, child: int) -> None:
+    c = store.first[parent]
+    if c < 0:
+        store.first[parent] = child
+        return
+    while store.next[c] >= 0:
+        c = store.next[c]
+    store.next[c] = child
+
+
+def _stitch(results: List[_ChunkResult]) -> Tuple[NodeView, List[str]]:
+    store = TreeStore()
+    root = store.node(None, PROGRAM_ID)
+    store._last = array("i")
+    errors: List[str] = []
+    attach = root
+
+    k = 0
+    while k < len(results):
+        sym_b, tok_b, first_b, next_b, typ, lexes, start_b, end_b, term_b, chunk_errors, open_dl = results[k]
+        sym = array("h")
+        sym.frombytes(sym_b)
+        tok = array("i")
+        tok.frombytes(tok_b)
+        first = array("i")
+        first.frombytes(first_b)
+        nxt = array("i")
+        nxt.frombytes(next_b)
+
+        # Local node i >= 1 becomes base + i; the chunk's own root is dropped
+        base = len(store.sym) - 1
+        tok_base = len(store.tokens)
+        store.sym.extend(sym[1:])
+        store.tok.extend(array("i", [t + tok_base if t >= 0 else -1 for t in tok[1:]]))
+        store.first.extend(array("i", [c + base if c >= 0 else -1 for c in first[1:]]))
+        store.next.extend(array("i", [c + base if c >= 0 else -1 for c in nxt[1:]]))
+
+        # Re-parent the chunk root's children: the Declaration-list continues
+        # the previous chunk's chain, a final "$" belongs to the real root
+        kids: List[int] = []
+        c = first[0]
+        while c >= 0:
+            kids.append(c)
+            c = nxt[c]
+        j = 0
+        while j < len(kids):
+            g = kids[j] + base
+            store.next[g] = -1
+            _append_child(store, root if sym[kids[j]] == EOF_ID else attach, g)
+            j += 1
+
+        starts = array("q")
+        starts.frombytes(start_b)
+        ends = array("q")
+        ends.frombytes(end_b)
+        terms = array("h")
+        terms.frombytes(term_b)
+        codes = array("b")
+        codes.frombytes(typ)
+        store.tokens.extend_arrays(codes, lexes, starts, ends, terms)
+
+        errors.extend(chunk_errors)
+        if open_dl > 0:
+            attach = open_dl + base
+        k += 1
+
+    return NodeView(store, root), errors
+
+
+def _parse_serial(text: str) -> Tuple[NodeView, List[str]]:
+    parser = Parser(Scanner(text, "regex"), "int", "store")
+    tree = parser.parse()
+    return tree, parser.errors
+
+
+def _init_worker() -> None:
+    grammar.load_tables()
+
+
+def parse_parallel(
+    text: str,
+    workers: int,
+    chunk_chars: int = DEFAULT_CHUNK_CHARS,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> Tuple[NodeView, List[str], bool]:
+    """Parse text; return (tree, errors, whether the parallel split was used)."""
+    splits = find_splits(text, chunk_chars)
+    if not splits or workers <= 1:
+        tree, errors = _parse_serial(text)
+        return tree, errors, False
+
+    offsets = [0] + [off for off, _ in splits]
+    jobs: List[Tuple[str, int, int, Optional[str]]] = []
+    line = 1
+    k = 0
+    while k < len(offsets):
+        end = offsets[k + 1] if k + 1 < len(offsets) else len(text)
+        next_kw = splits[k][1] if k < len(splits) else None
+        jobs.append((text[offsets[k]:end], offsets[k], line, next_kw))
+        line += text.count("\n", offsets[k], end)
+        k += 1
+
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as own:
+            results = list(own.map(_parse_chunk, jobs))
+    else:
+        results = list(pool.map(_parse_chunk, jobs))
+
+    if any(r is None for r in results):
+        tree, errors = _parse_serial(text)
+        return tree, errors, False
+
+    tree, errors = _stitch(results)
+    return tree, errors, True
+
+
+def parse_file_parallel(path: str, workers: int, chunk_chars: int = DEFAULT_CHUNK_CHARS) -> Tuple[NodeView, List[str], bool]:
+    # Decoded like Scanner.from_file: strict UTF-8, universal newlines
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return parse_parallel(text, workers, chunk_chars)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed on-disk cache of token streams and parse results.
+
+An entry is keyed by a hash of the grammar key plus the raw source bytes and
+holds the full token stream, the line index, the TreeStore arrays and the
+error list, marshalled and zlib-compressed. Restoring an entry gives the same tree and
+errors a fresh Scanner + Parser run would, so the rendered outputs are
+byte-identical.
+
+The cache directory may be shared by several processes: entries are written
+to a temp file and renamed into place, readers treat a missing or damaged
+entry as a miss, and eviction tolerates files vanishing underneath it. The
+total size is capped; the least recently used entries (by mtime, refreshed
+on every hit) are removed first.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+import zlib
+from array import array
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from grammar import GRAMMAR_KEY
+from parse_tree import NodeView, TreeStore
+from scanner import Token
+from source_index import LineIndex
+from token_buffer import TOKEN_TYPES, TYPE_CODE
+
+
+# Bump when the entry layout changes
+ENTRY_VERSION = 2
+
+DEFAULT_MAX_BYTES = 256 << 20
+
+# Eviction trims the cache down to this fraction of max_bytes, so it does
+# not have to rescan the directory on every store once the cap is reached
+_LOW_WATER = 0.9
+
+
+@dataclass
+class CachedParse:
+    tokens: List[Token]     # the full stream, ending with the EOF token
+    index: LineIndex
+    tree: NodeView
+    errors: List[str]
+
+
+class TokenRecorder:
+    """Scanner wrapper that keeps every token it hands out."""
+
+    def __init__(self, scanner: object):
+        self.scanner = scanner
+        self.index: LineIndex = scanner.index
+        self.tokens: List[Token] = []
+
+    def get_next_token(self) -> Token:
+        tok = self.scanner.get_next_token()
+        self.tokens.append(tok)
+        return tok
+
+
+def _encode(tokens: List[Token], index: LineIndex, tree: NodeView, errors: List[str]) -> bytes:
+    store = tree.store
+    if tree.index != 0:
+        raise ValueError("only whole TreeStore trees can be cached")
+
+    typ = bytes(TYPE_CODE[t.typ] for t in tokens)
+    starts = array("q", [t.start for t in tokens])
+    ends = array("q", [t.end for t in tokens])
+    terms = array("h", [t.term for t in tokens])
+
+    # Tree leaves point into store.tokens; re-point them into the stream
+    # (no two tokens that can be leaves start at the same offset)
+    position = {t.start: i for i, t in enumerate(tokens)}
+    leaf_pos = [position[start] for start in store.tokens.start]
+    tok = array("i", [leaf_pos[t] if t >= 0 else -1 for t in store.tok])
+
+    payload = (
+        ENTRY_VERSION,
+        GRAMMAR_KEY,
+        typ,
+        [t.lex for t in tokens],
+        starts.tobytes(),
+        ends.tobytes(),
+        terms.tobytes(),
+        index.starts.tobytes(),
+        store.sym.tobytes(),
+        tok.tobytes(),
+        store.first.tobytes(),
+        store.next.tobytes(),
+        errors,
+    )
+    return zlib.compress(marshal.dumps(payload), 1)
+
+
+def _decode(data: bytes) -> Optional[CachedParse]:
+    payload = marshal.loads(zlib.decompress(data))
+    if payload[0] != ENTRY_VERSION or payload[1] != GRAMMAR_KEY:
+        return None
+    _, _, typ, lexes, start_bytes, end_bytes, term_bytes, line_bytes, sym, tok, first, nxt, errors = payload
+
+    starts = array("q")
+    starts.frombytes(start_bytes)
+    ends = array("q")
+    ends.frombytes(end_bytes)
+    terms = array("h")
+    terms.frombytes(term_bytes)
+    types = TOKEN_TYPES
+    tokens = [Token(types[typ[i]], lexes[i], starts[i], ends[i], terms[i]) for i in range(len(typ))]
+
+    index = LineIndex()
+    index.starts = array("q")
+    index.starts.frombytes(line_bytes)
+
+    store = TreeStore()
+    store.sym.frombytes(sym)
+    store.tok.frombytes(tok)
+    store.first.frombytes(first)
+    store.next.frombytes(nxt)
+    store.tokens.extend_arrays(array("b", typ), lexes, starts, ends, terms)
+    return CachedParse(tokens, index, NodeView(store, 0), list(errors))
+
+
+class ParseCache:
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None    # estimate, refreshed when eviction scans
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(source: bytes) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        h.update(GRAMMAR_KEY.encode("utf-8"))
+        h.update(b"\0")
+        h.update(source)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".bin")
+
+    def get(self, key: str) -> Optional[CachedParse]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = _decode(f.read())
+        except FileNotFoundError:
+            entry = None
+        except Exception:
+            # Damaged entry (it is not trusted, so any error while decoding
+            # it counts): a store will overwrite it
+            entry = None
+
+        if entry is None:
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, tokens: List[Token], index: LineIndex, tree: NodeView, errors: List[str]) -> None:
+        data = _encode(tokens, index, tree, errors)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        if self._size is None:
+            self._size = self._scan()[1]
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _scan(self) -> Tuple[List[Tuple[float, int, str]], int]:
+        # (mtime, size, path) of every entry, and their total size
+        entries: List[Tuple[float, int, str]] = []
+        try:
+            subdirs = list(os.scandir(self.directory))
+        except OSError:
+            return entries, 0
+        i = 0
+        while i < len(subdirs):
+            if subdirs[i].is_dir():
+                try:
+                    files = list(os.scandir(subdirs[i].path))
+                except OSError:
+                    files = []
+                j = 0
+                while j < len(files):
+                    f = files[j]
+                    if f.name.endswith(".bin"):
+                        try:
+                            st = f.stat()
+                            entries.append((st.st_mtime, st.st_size, f.path))
+                        except OSError:
+                            pass    # removed by another process meanwhile
+                    j += 1
+            i += 1
+        return entries, sum(e[1] for e in entries)
+
+    def evict(self) -> int:
+        """Remove least recently used entries until under the low-water mark."""
+        entries, total = self._scan()
+        entries.sort()
+        target = int(self.max_bytes * _LOW_WATER)
+        removed = 0
+        i = 0
+        while i < len(entries) and total > target:
+            _, size, path = entries[i]
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass    # another process got there first
+            total -= size
+            i += 1
+        self._size = total
+        return removed
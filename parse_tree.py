@@ -1,10 +1,19 @@
 # -*- coding: utf-8 -*-
-"""Parse tree nodes + anytree-like renderer."""
+"""Parse tree nodes + anytree-like renderer (iterative, streams to a file)."""
 
 from __future__ import annotations
 
+import io
+from array import array
 from dataclasses import dataclass, field
-from typing import List
+from typing import TYPE_CHECKING, Iterator, List, Optional, TextIO, Tuple
+
+from grammar import SYMBOLS
+from scanner import Token, token_display
+from token_buffer import TokenBuffer
+
+if TYPE_CHECKING:
+    from instrument import Stats
 
 
 @dataclass
@@ -16,22 +25,330 @@ class PTNode:
         self.children.append(child)
 
 
-def render_tree(root: PTNode) -> str:
-    out: List[str] = []
+class PTNodeBuilder:
+    """Tree sink for the int parser engine that builds plain PTNode objects."""
+
+    def node(self, parent: Optional[PTNode], sym: int) -> PTNode:
+        node = PTNode(SYMBOLS[sym])
+        if parent is not None:
+            parent.children.append(node)
+        return node
+
+    def leaf(self, parent: PTNode, tok: Token) -> None:
+        parent.children.append(PTNode(token_display(tok)))
+
+    def epsilon(self, parent: PTNode) -> None:
+        parent.children.append(PTNode("epsilon"))
+
+    def result(self, root: PTNode) -> PTNode:
+        return root
+
+    def checkpoint(self, parent: PTNode) -> int:
+        return len(parent.children)
+
+    def rollback(self, parent: PTNode, mark: int) -> None:
+        # Drop what was added below parent since checkpoint(parent)
+        del parent.children[mark:]
+
+
+class NullBuilder:
+    """Tree sink for validate-only parsing: the decisions and errors are the same, nothing is built."""
+
+    def node(self, parent: None, sym: int) -> None:
+        return None
+
+    def leaf(self, parent: None, tok: Token) -> None:
+        pass
+
+    def epsilon(self, parent: None) -> None:
+        pass
+
+    def result(self, root: None) -> None:
+        return None
+
+    def checkpoint(self, parent: None) -> None:
+        return None
+
+    def rollback(self, parent: None, mark: None) -> None:
+        pass
+
+
+# Node symbol of the "epsilon" leaves in a TreeStore (grammar symbol ids come first)
+EPSILON_SYM = len(SYMBOLS)
+NODE_NAMES: List[str] = SYMBOLS + ["epsilon"]
 
-    def rec(node: PTNode, prefix: str, is_last: bool, is_root: bool) -> None:
-        if is_root:
-            out.append(node.name)
-            child_prefix = ""
+
+class TreeStore:
+    """Parse tree kept in parallel arrays instead of one object per node.
+
+    Node i has symbol sym[i] (a grammar symbol id or EPSILON_SYM), token
+    index tok[i] into the self.tokens TokenBuffer (-1 for non-token nodes)
+    and is linked to its children through first[i] / next[i] (-1
+    terminates). Nodes are numbered in pre-order; node 0 is the root. Leaf
+    names such as "(ID, x)" are only built when read.
+    """
+
+    def __init__(self) -> None:
+        self.sym = array("h")
+        self.tok = array("i")
+        self.first = array("i")
+        self.next = array("i")
+        self._last = array("i")     # last child, only needed while building
+        self.tokens = TokenBuffer()
+
+    def __len__(self) -> int:
+        return len(self.sym)
+
+    # -- builder side (same protocol as PTNodeBuilder) ----------------------
+
+    def _add(self, parent: Optional[int], sym: int, tok: int) -> int:
+        i = len(self.sym)
+        self.sym.append(sym)
+        self.tok.append(tok)
+        self.first.append(-1)
+        self.next.append(-1)
+        self._last.append(-1)
+        if parent is not None:
+            last = self._last[parent]
+            if last < 0:
+                self.first[parent] = i
+            else:
+                self.next[last] = i
+            self._last[parent] = i
+        return i
+
+    def node(self, parent: Optional[int], sym: int) -> int:
+        return self._add(parent, sym, -1)
+
+    def leaf(self, parent: int, tok: Token) -> None:
+        self.tokens.append(tok)
+        self._add(parent, tok.term, len(self.tokens) - 1)
+
+    def epsilon(self, parent: int) -> None:
+        self._add(parent, EPSILON_SYM, -1)
+
+    def result(self, root: int) -> "NodeView":
+        self._last = array("i")
+        return NodeView(self, root)
+
+    def checkpoint(self, parent: int) -> Tuple[int, int, int]:
+        return len(self.sym), len(self.tokens), self._last[parent]
+
+    def rollback(self, parent: int, mark: Tuple[int, int, int]) -> None:
+        # Nodes added since checkpoint(parent) all hang below parent, so
+        # truncating the arrays and unlinking the first of them drops them
+        n, t, last = mark
+        del self.sym[n:]
+        del self.tok[n:]
+        del self.first[n:]
+        del self.next[n:]
+        del self._last[n:]
+        self.tokens.truncate(t)
+        self._last[parent] = last
+        if last < 0:
+            self.first[parent] = -1
         else:
-            out.append(prefix + ("└── " if is_last else "├── ") + node.name)
-            child_prefix = prefix + ("    " if is_last else "│   ")
+            self.next[last] = -1
+
+    # -- read side ----------------------------------------------------------
+
+    def name(self, i: int) -> str:
+        t = self.tok[i]
+        if t >= 0:
+            return self.tokens.display(t)
+        return NODE_NAMES[self.sym[i]]
+
+    def token(self, i: int) -> Optional[Token]:
+        t = self.tok[i]
+        return self.tokens[t] if t >= 0 else None
+
+    def child_ids(self, i: int) -> List[int]:
+        out: List[int] = []
+        c = self.first[i]
+        while c >= 0:
+            out.append(c)
+            c = self.next[c]
+        return out
+
+    def walk(self, root: int = 0) -> Iterator[Tuple[int, int]]:
+        # Pre-order (node id, depth) pairs without recursion
+        stack: List[Tuple[int, int]] = [(root, 0)]
+        while stack:
+            i, depth = stack.pop()
+            yield i, depth
+            kids = self.child_ids(i)
+            k = len(kids) - 1
+            while k >= 0:
+                stack.append((kids[k], depth + 1))
+                k -= 1
+
+    def nbytes(self) -> int:
+        nodes = sum(a.itemsize * len(a) for a in (self.sym, self.tok, self.first, self.next, self._last))
+        return nodes + self.tokens.nbytes()
+
+
+class NodeView:
+    """Read-only cursor over one TreeStore node, shaped like PTNode (name/children)."""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: TreeStore, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.store.name(self.index)
+
+    @property
+    def sym(self) -> int:
+        return self.store.sym[self.index]
+
+    @property
+    def token(self) -> Optional[Token]:
+        return self.store.token(self.index)
+
+    @property
+    def children(self) -> List["NodeView"]:
+        store = self.store
+        return [NodeView(store, c) for c in store.child_ids(self.index)]
+
+    def first_child(self) -> Optional["NodeView"]:
+        c = self.store.first[self.index]
+        return NodeView(self.store, c) if c >= 0 else None
+
+    def next_sibling(self) -> Optional["NodeView"]:
+        c = self.store.next[self.index]
+        return NodeView(self.store, c) if c >= 0 else None
+
+    def to_ptnode(self) -> PTNode:
+        store = self.store
+        root = PTNode(store.name(self.index))
+        stack: List[Tuple[int, PTNode]] = [(self.index, root)]
+        while stack:
+            i, node = stack.pop()
+            c = store.first[i]
+            while c >= 0:
+                child = PTNode(store.name(c))
+                node.children.append(child)
+                stack.append((c, child))
+                c = store.next[c]
+        return root
+
+
+def write_tree(root: PTNode, out: TextIO, stats: Optional["Stats"] = None) -> None:
+    if stats is None:
+        _write(root, out)
+        return
+    with stats.phase("render"):
+        stats.nodes_rendered += _write(root, out)
+
+
+def write_subtree(node: PTNode, out: TextIO, prefix: str, is_last: bool) -> int:
+    """Write node as a child line of a larger tree: prefix is the indentation
+    of its own line, is_last whether it is its parent's last child."""
+    line = "\n" + prefix + ("└── " if is_last else "├── ")
+    return _write(node, out, line, [prefix, "    " if is_last else "│   "])
+
+
+def _write(root: PTNode, out: TextIO, line: str = "", prefix: Optional[List[str]] = None) -> int:
+    # Iterative renderer: one stack entry per open level instead of one frame
+    # per node, and each line is written as prefix + connector + name pieces,
+    # so lines are never concatenated. The prefix is a list of one segment
+    # per open level, pushed and popped with the level; only the open level's
+    # joined prefix is kept besides it, so the prefixes hold O(depth)
+    # characters instead of one string per level. Returns the number of
+    # nodes written.
+    if isinstance(root, NodeView):
+        return _write_store(root.store, root.index, out, line, prefix)
+
+    w = out.write
+    w(line)
+    w(root.name)
+    count = 1
+
+    # Parallel stacks: children of the open level, next child index; segments
+    # has the levels' prefix segments after the caller's ones
+    kids_stack: List[List[PTNode]] = [root.children]
+    idx_stack: List[int] = [0]
+    segments: List[str] = list(prefix) if prefix else []
+    joined = "".join(segments)
+
+    while kids_stack:
+        children = kids_stack[-1]
+        idx = idx_stack[-1]
+        if idx >= len(children):
+            kids_stack.pop()
+            idx_stack.pop()
+            if len(kids_stack) > 0:
+                joined = joined[:len(joined) - len(segments.pop())]
+            continue
+
+        idx_stack[-1] = idx + 1
+        count += 1
+        child = children[idx]
+        is_last = idx == len(children) - 1
+
+        w("\n")
+        w(joined)
+        w("└── " if is_last else "├── ")
+        w(child.name)
+
+        grand = child.children
+        if grand:
+            kids_stack.append(grand)
+            idx_stack.append(0)
+            seg = "    " if is_last else "│   "
+            segments.append(seg)
+            joined += seg
+
+    return count
+
+
+def _write_store(store: TreeStore, root: int, out: TextIO, line: str = "", prefix: Optional[List[str]] = None) -> int:
+    # Same output as write_tree, walking the first/next arrays directly
+    w = out.write
+    first = store.first
+    nxt = store.next
+    name = store.name
+
+    w(line)
+    w(name(root))
+    count = 1
+
+    cursor_stack: List[int] = [first[root]]
+    segments: List[str] = list(prefix) if prefix else []
+    joined = "".join(segments)
+
+    while cursor_stack:
+        c = cursor_stack[-1]
+        if c < 0:
+            cursor_stack.pop()
+            if len(cursor_stack) > 0:
+                joined = joined[:len(joined) - len(segments.pop())]
+            continue
+
+        sibling = nxt[c]
+        cursor_stack[-1] = sibling
+        count += 1
+        is_last = sibling < 0
+
+        w("\n")
+        w(joined)
+        w("└── " if is_last else "├── ")
+        w(name(c))
+
+        grand = first[c]
+        if grand >= 0:
+            cursor_stack.append(grand)
+            seg = "    " if is_last else "│   "
+            segments.append(seg)
+            joined += seg
+
+    return count
 
-        idx = 0
-        total = len(node.children)
-        while idx < total:
-            rec(node.children[idx], child_prefix, idx == total - 1, False)
-            idx += 1
 
-    rec(root, "", True, True)
-    return "\n".join(out)
+def render_tree(root: PTNode, stats: Optional["Stats"] = None) -> str:
+    buf = io.StringIO()
+    write_tree(root, buf, stats)
+    return buf.getvalue()
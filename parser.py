@@ -1,13 +1,74 @@
 # -*- coding: utf-8 -*-
-"""Predictive Recursive Descent parser with panic-mode recovery."""
+"""Predictive LL(1) parser (explicit-stack driver) with panic-mode recovery."""
 
 from __future__ import annotations
 
-from typing import List
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple, Union
 
-from scanner import Token, Scanner
-from parse_tree import PTNode
-from grammar import FOLLOW, NONTERMINALS, PARSE_TABLE, EPS
+from scanner import Token, Scanner, token_display
+from source_index import LineIndex
+from parse_tree import NodeView, NullBuilder, PTNode, PTNodeBuilder, TreeStore
+from token_buffer import TokenBuffer
+from grammar import (
+    EOF_ID,
+    EPS,
+    FOLLOW,
+    FOLLOW_FLAT,
+    IS_NONTERMINAL,
+    N_TERMINALS,
+    NONTERMINALS,
+    NT_BASE,
+    PARSE_TABLE,
+    PARSE_TABLE_FLAT,
+    PROD_RHS,
+    SYMBOL_ID,
+    SYMBOLS,
+)
+
+if TYPE_CHECKING:
+    from instrument import Stats
+
+# "gen" runs the recursive-descent module generated from GRAMMAR (parser_codegen)
+PARSER_ENGINES = ("dict", "int", "gen")
+
+# Tree representations the int and gen engines can build (see parse_tree); "none"
+# only validates: parse() returns None and self.errors is all there is
+TREE_KINDS = ("ptnode", "store", "none")
+
+_BUILDERS = {"ptnode": PTNodeBuilder, "store": TreeStore, "none": NullBuilder}
+
+PROGRAM_ID = SYMBOL_ID["Program"]
+DECLARATION_LIST_ID = SYMBOL_ID["Declaration-list"]
+DECLARATION_ID = SYMBOL_ID["Declaration"]
+
+# Right-hand sides reversed once, ready to be pushed on the driver stack
+_PROD_RHS_REVERSED: List[Tuple[int, ...]] = [tuple(reversed(rhs)) for rhs in PROD_RHS]
+
+
+@dataclass
+class ParseEvent:
+    """One step of Parser.events().
+
+    A "declaration" event carries a finished top-level Declaration subtree
+    (None with tree="none") and the errors reported since the previous event,
+    up to its end. depth is the nesting of its Declaration-list (1 for the
+    first) and last tells whether it is the last child there, i.e. no
+    Declaration-list follows it.
+
+    The "end" event carries the remaining errors; depth is then the number
+    of Declaration-list nodes, epsilon whether the innermost one derived
+    epsilon and eof whether Program got its "$" (False after Unexpected EOF).
+    """
+
+    kind: str
+    tree: Optional[PTNode]
+    errors: List[str] = field(default_factory=list)
+    depth: int = 0
+    last: bool = False
+    epsilon: bool = False
+    eof: bool = False
 
 
 def token_to_terminal(tok: Token) -> str:
@@ -22,23 +83,29 @@ def token_to_terminal(tok: Token) -> str:
     return "$"  # EOF
 
 
-def token_display(tok: Token) -> str:
-    if tok.typ == "EOF":
-        return "$"
-    if tok.typ == "ID":
-        return f"(ID, {tok.lex})"
-    if tok.typ == "NUM":
-        return f"(NUM, {tok.lex})"
-    if tok.typ == "KEYWORD":
-        return f"(KEYWORD, {tok.lex})"
-    if tok.typ == "SYMBOL":
-        return f"(SYMBOL, {tok.lex})"
-    return tok.lex
-
-
 class Parser:
-    def __init__(self, scanner: Scanner):
+    def __init__(
+        self,
+        scanner: Union[Scanner, TokenBuffer],
+        engine: str = "dict",
+        tree: str = "ptnode",
+        stats: Optional["Stats"] = None,
+        error_columns: bool = False,
+    ):
+        if engine not in PARSER_ENGINES:
+            raise ValueError(f"unknown parser engine: {engine!r}")
+        if tree not in TREE_KINDS:
+            raise ValueError(f"unknown tree kind: {tree!r}")
+        if tree != "ptnode" and engine == "dict":
+            raise ValueError(f"tree={tree!r} requires engine='int' or 'gen'")
+        if isinstance(scanner, TokenBuffer):
+            scanner = scanner.reader()
+        self.engine = engine
+        self.builder = _BUILDERS[tree]()
         self.scanner = scanner
+        self.index: LineIndex = scanner.index
+        self.error_columns = error_columns
+        self.stats = stats
         self.lookahead: Token = self.scanner.get_next_token()
         self.errors: List[str] = []
         self.stopped: bool = False
@@ -50,16 +117,34 @@ class Parser:
     def advance(self) -> None:
         self.lookahead = self.scanner.get_next_token()
 
+    def _where(self, tok: Token) -> str:
+        # "#12" by default, "#12:5" (line:column of the token) with error_columns
+        if self.error_columns:
+            line, col = self.index.position(tok.start)
+            return f"#{line}:{col}"
+        return f"#{self.index.line(tok.start)}"
+
     def _err_illegal(self, tok: Token) -> None:
         t = token_to_terminal(tok)
         shown = t if t in ("ID", "NUM", "$") else t
-        self.errors.append(f"#{tok.line} : syntax error, illegal {shown}")
+        self.errors.append(f"{self._where(tok)} : syntax error, illegal {shown}")
+
+    def _err_missing(self, tok: Token, sym: str) -> None:
+        self.errors.append(f"{self._where(tok)} : syntax error, missing {sym}")
 
-    def _err_missing(self, line: int, sym: str) -> None:
-        self.errors.append(f"#{line} : syntax error, missing {sym}")
+    def _err_unexpected_eof(self, tok: Token) -> None:
+        self.errors.append(f"{self._where(tok)} : syntax error, Unexpected EOF")
 
-    def _err_unexpected_eof(self, line: int) -> None:
-        self.errors.append(f"#{line} : syntax error, Unexpected EOF")
+    def _discard(self, nonterminal: str) -> None:
+        # Panic mode: drop the illegal lookahead while expanding nonterminal
+        self._err_illegal(self.lookahead)
+        if self.stats is None:
+            self.advance()
+            return
+        self.stats.discard(nonterminal)
+        t0 = time.perf_counter()
+        self.advance()
+        self.stats.add_time("panic", time.perf_counter() - t0)
 
     def match(self, expected: str, parent: PTNode) -> None:
         if self.stopped:
@@ -71,63 +156,311 @@ class Parser:
             return
 
         if self.la_term == "$":
-            self._err_unexpected_eof(self.lookahead.line)
+            self._err_unexpected_eof(self.lookahead)
             self.stopped = True
             return
 
         # Mismatch: report missing, but do not consume and do not add a node
-        self._err_missing(self.lookahead.line, expected)
+        self._err_missing(self.lookahead, expected)
 
     def parse_nonterminal(self, A: str, parent: PTNode) -> bool:
         if self.stopped:
             return False
+        if self.engine == "int":
+            return self._parse_nonterminal_int(SYMBOL_ID[A], parent)
 
-        while True:
-            look = self.la_term
-            prod = PARSE_TABLE[A].get(look)
+        # Table-driven LL(1) driver: pending (symbol, parent) pairs live on an
+        # explicit stack instead of one Python frame per expansion, so nesting
+        # depth is not limited by the recursion limit. Symbols are popped in the
+        # same pre-order the recursive descent visited them.
+        stack: List[Tuple[str, PTNode]] = [(A, parent)]
+        expanded = False
+        stats = self.stats
+
+        while stack:
+            if self.stopped:
+                break
 
-            if prod is not None:
-                node = PTNode(A)
-                parent.add(node)
+            sym, owner = stack.pop()
+            if sym not in NONTERMINALS:
+                self.match(sym, owner)
+                continue
 
-                if prod == [EPS]:
-                    node.add(PTNode("epsilon"))
-                    return True
+            while True:
+                look = self.la_term
+                prod = PARSE_TABLE[sym].get(look)
 
-                i = 0
-                while i < len(prod):
-                    sym = prod[i]
-                    if self.stopped:
+                if prod is not None:
+                    node = PTNode(sym)
+                    owner.add(node)
+                    if owner is parent and sym == A:
+                        expanded = True
+                    if stats is not None:
+                        stats.expand(sym)
+
+                    if prod == [EPS]:
+                        node.add(PTNode("epsilon"))
                         break
-                    if sym in NONTERMINALS:
-                        self.parse_nonterminal(sym, node)
-                    else:
-                        self.match(sym, node)
-                    i += 1
 
-                return True
+                    i = len(prod) - 1
+                    while i >= 0:
+                        stack.append((prod[i], node))
+                        i -= 1
+                    break
 
-            # Panic mode
-            if look in FOLLOW[A]:
-                self._err_missing(self.lookahead.line, A)
-                return False
+                # Panic mode
+                if look in FOLLOW[sym]:
+                    self._err_missing(self.lookahead, sym)
+                    break
 
-            if look == "$":
-                self._err_unexpected_eof(self.lookahead.line)
-                self.stopped = True
-                return False
+                if look == "$":
+                    self._err_unexpected_eof(self.lookahead)
+                    self.stopped = True
+                    break
 
-            self._err_illegal(self.lookahead)
-            self.advance()
+                self._discard(sym)
+
+        return expanded
+
+    def _parse_nonterminal_int(self, A: int, parent: object) -> bool:
+        # Same driver as parse_nonterminal, but every decision is made on
+        # interned ids: Token.term indexes the flat table/FOLLOW rows directly
+        # and productions are pre-reversed id tuples. Nodes are created through
+        # self.builder, so `parent`/owners are whatever handles it hands out
+        # (PTNode objects or TreeStore node ids).
+        syms: List[int] = [A]
+        owners: List[object] = [parent]
+        expanded = False
+        top = True
+
+        # Hot-loop locals
+        table = PARSE_TABLE_FLAT
+        follow = FOLLOW_FLAT
+        is_nt = IS_NONTERMINAL
+        names = SYMBOLS
+        rhs_rev = _PROD_RHS_REVERSED
+        next_token = self.scanner.get_next_token
+        new_node = self.builder.node
+        new_leaf = self.builder.leaf
+        new_epsilon = self.builder.epsilon
+        stats = self.stats
+
+        while syms:
+            if self.stopped:
+                break
+
+            sym = syms.pop()
+            owner = owners.pop()
+
+            if not is_nt[sym]:
+                la = self.lookahead
+                if la.term == sym:
+                    new_leaf(owner, la)
+                    self.lookahead = next_token()
+                elif la.term == EOF_ID:
+                    self._err_unexpected_eof(la)
+                    self.stopped = True
+                else:
+                    self._err_missing(la, names[sym])
+                continue
+
+            row = (sym - NT_BASE) * N_TERMINALS
+            while True:
+                la = self.lookahead
+                p = table[row + la.term]
+
+                if p >= 0:
+                    node = new_node(owner, sym)
+                    if top:
+                        expanded = True
+                    if stats is not None:
+                        stats.expand(names[sym])
+
+                    rhs = rhs_rev[p]
+                    if not rhs:
+                        new_epsilon(node)
+                        break
+
+                    syms.extend(rhs)
+                    owners.extend([node] * len(rhs))
+                    break
+
+                # Panic mode
+                if follow[row + la.term]:
+                    self._err_missing(la, names[sym])
+                    break
+
+                if la.term == EOF_ID:
+                    self._err_unexpected_eof(la)
+                    self.stopped = True
+                    break
+
+                self._discard(names[sym])
+
+            top = False
+
+        return expanded
+
+    def parse(self) -> Optional[PTNode]:
+        if self.stats is None:
+            return self._parse()
+        # "parse" is reported net of the scanner time spent inside it
+        scan_before = self.stats.phases.get("scan", 0.0)
+        t0 = time.perf_counter()
+        try:
+            return self._parse()
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.stats.add_time("parse", elapsed - (self.stats.phases.get("scan", 0.0) - scan_before))
+
+    def _parse(self) -> Optional[PTNode]:
+        if self.engine == "int":
+            return self._parse_int()
+        if self.engine == "gen":
+            return self._parse_gen()
 
-    def parse(self) -> PTNode:
         root = PTNode("Program")
         self.parse_nonterminal("Declaration-list", root)
 
         if not self.stopped:
             while self.la_term != "$":
-                self._err_illegal(self.lookahead)
-                self.advance()
+                self._discard("Program")
             root.add(PTNode("$"))
 
         return root
+
+    def _parse_int(self) -> Optional[PTNode]:
+        # Returns a PTNode, a NodeView over the TreeStore (same read API), or
+        # None when validating only
+        root = self.builder.node(None, PROGRAM_ID)
+        self._parse_nonterminal_int(DECLARATION_LIST_ID, root)
+        return self._finish_program(root)
+
+    def _finish_program(self, root: object) -> Optional[PTNode]:
+        # Program -> Declaration-list $, after the Declaration-list
+        if not self.stopped:
+            while self.lookahead.term != EOF_ID:
+                self._discard("Program")
+            self.builder.node(root, EOF_ID)
+        return self.builder.result(root)
+
+    def events(self) -> Iterator[ParseEvent]:
+        """Parse incrementally, one ParseEvent per top-level Declaration, then an "end" event.
+
+        Each Declaration is built in a builder of its own and dropped once its
+        event is handed out, and errors are moved into the events, so memory
+        does not grow with the input. Declarations are parsed by the int
+        driver whatever the engine; the trees and errors are those of parse().
+        An event is yielded when the parser has seen what follows it.
+        """
+        make = type(self.builder)
+        stats = self.stats
+        row = (DECLARATION_LIST_ID - NT_BASE) * N_TERMINALS
+        depth = 0
+        epsilon = False
+        pending: Optional[ParseEvent] = None
+
+        # The Declaration-list chain, as _parse_nonterminal_int expands it
+        while True:
+            la = self.lookahead
+            p = PARSE_TABLE_FLAT[row + la.term]
+            if p < 0:
+                if FOLLOW_FLAT[row + la.term]:
+                    self._err_missing(la, "Declaration-list")
+                    break
+                if la.term == EOF_ID:
+                    self._err_unexpected_eof(la)
+                    self.stopped = True
+                    break
+                self._discard("Declaration-list")
+                continue
+
+            # A nested Declaration-list: the previous Declaration was not the last child
+            if pending is not None:
+                yield pending
+                pending = None
+            depth += 1
+            if stats is not None:
+                stats.expand("Declaration-list")
+            if not PROD_RHS[p]:
+                epsilon = True
+                break
+
+            builder = self.builder = make()
+            holder = builder.node(None, DECLARATION_LIST_ID)
+            self._parse_nonterminal_int(DECLARATION_ID, holder)
+            errors, self.errors = self.errors, []
+            pending = ParseEvent("declaration", _first_child(builder.result(holder)), errors, depth)
+            if self.stopped:
+                break
+
+        if pending is not None:
+            pending.last = True
+            yield pending
+            pending = None
+
+        eof = False
+        if not self.stopped:
+            while self.lookahead.term != EOF_ID:
+                self._discard("Program")
+            eof = True
+        errors, self.errors = self.errors, []
+        yield ParseEvent("end", None, errors, depth, epsilon=epsilon, eof=eof)
+
+    def _parse_gen(self) -> Optional[PTNode]:
+        import parser_codegen
+
+        builder = self.builder
+        stats = self.stats
+        # Tokens read since the last top-level mark and what is needed to
+        # resume there: root, parent, builder checkpoint, error count, stats
+        seen: List[Token] = [self.lookahead]
+        resume: List[object] = []
+
+        def mark(root: object, parent: object, la: Token) -> None:
+            del seen[:]
+            seen.append(la)
+            counts = (dict(stats.expansions), dict(stats.panic_discards)) if stats is not None else None
+            resume[:] = [root, parent, builder.checkpoint(parent), len(self.errors), counts]
+
+        try:
+            return parser_codegen.load().parse(self, seen, mark)
+        except RecursionError:
+            # Nested deeper than the recursion limit allows: drop what the
+            # current top-level declaration added and parse from its first
+            # token on with the explicit-stack driver
+            root, parent, checkpoint, n_errors, counts = resume
+            builder.rollback(parent, checkpoint)
+            del self.errors[n_errors:]
+            self.stopped = False
+            if counts is not None:
+                stats.expansions, stats.panic_discards = counts
+            self.scanner = _Resume(seen, self.scanner)
+            self.lookahead = self.scanner.get_next_token()
+            self._parse_nonterminal_int(DECLARATION_LIST_ID, parent)
+            return self._finish_program(root)
+
+
+def _first_child(tree: Optional[PTNode]) -> Optional[PTNode]:
+    if isinstance(tree, NodeView):
+        return tree.first_child()
+    if tree is None or not tree.children:
+        return None
+    return tree.children[0]
+
+
+class _Resume:
+    """Replays already-read tokens, then continues with the scanner."""
+
+    def __init__(self, tokens: List[Token], scanner: Scanner):
+        self.tokens = tokens
+        self.scanner = scanner
+        self.index: LineIndex = scanner.index
+        self.i = 0
+
+    def get_next_token(self) -> Token:
+        if self.i < len(self.tokens):
+            tok = self.tokens[self.i]
+            self.i += 1
+            return tok
+        return self.scanner.get_next_token()
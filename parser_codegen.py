@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Generate a specialized recursive-descent parser from GRAMMAR.
+
+    python parser_codegen.py            # (re)write parser_generated.py
+    python parser_codegen.py --check    # is it up to date?
+
+The emitted module has one function per nonterminal that branches on the
+lookahead's terminal id with the FIRST/FOLLOW-derived sets of the LL(1)
+table written in as constants; terminal matches and panic-mode recovery are
+inlined. A production ending in its own nonterminal (the list rules, D, G,
+...) loops instead of recursing. Parser(..., engine="gen") uses it and gives
+the same trees and errors as the table-driven engines. The nonterminals of
+the start production (Declaration-list) get a second, top-level copy that
+calls mark() before each expansion, so that Parser only has to keep the
+tokens of the current top-level declaration to resume from when input nests
+deeper than the recursion limit.
+
+Like the table artifact, the module is keyed by GRAMMAR_KEY: load() writes
+a fresh one when it is missing or was generated from another grammar, or
+just executes the new source when the directory is read-only.
+"""
+
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+import types
+from typing import Callable, Dict, List, Optional
+
+import grammar
+from grammar import EOF_ID, EPS, GRAMMAR, GRAMMAR_KEY, SYMBOL_ID, TERMINAL_ID
+
+
+# Bump when the emitted code changes shape
+GENERATOR_VERSION = 2
+
+MODULE_NAME = "parser_generated"
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), MODULE_NAME + ".py")
+
+_KEY = f"{GENERATOR_VERSION}:{GRAMMAR_KEY}"
+
+
+def _fn(nonterminal: str) -> str:
+    return "n_" + nonterminal.replace("-", "_")
+
+
+def _top_fn(nonterminal: str) -> str:
+    return "top_" + nonterminal.replace("-", "_")
+
+
+def _test(terms: List[int]) -> str:
+    if len(terms) == 1:
+        return f"t == {terms[0]}"
+    return "t in {" + ", ".join(str(t) for t in terms) + "}"
+
+
+def _emit_body(out: List[str], A: str, prod: List[str], indent: str, node: str, fn: Callable[[str], str] = _fn) -> None:
+    # The symbols of one production, children of `node`; fn names the
+    # function called for a nonterminal
+    syms = [s for s in prod if s != EPS]
+    if not syms:
+        out.append(f"{indent}new_epsilon({node})")
+        return
+    i = 0
+    while i < len(syms):
+        s = syms[i]
+        if s in GRAMMAR:
+            if s == A and i == len(syms) - 1:
+                # Tail position: expand the nested occurrence in this loop
+                out.append(f"{indent}parent = {node}")
+                out.append(f"{indent}continue")
+                return
+            out.append(f"{indent}{fn(s)}({node})")
+        else:
+            out.append(f"{indent}if la.term == {TERMINAL_ID[s]}:")
+            out.append(f"{indent}    new_leaf({node}, la)")
+            out.append(f"{indent}    la = next_token()")
+            out.append(f"{indent}    record(la)")
+            out.append(f"{indent}elif la.term == {EOF_ID}:")
+            out.append(f"{indent}    stop()")
+            out.append(f"{indent}else:")
+            out.append(f"{indent}    err_missing(la, {s!r})")
+        i += 1
+
+
+def _emit_nonterminal(out: List[str], A: str, top: bool = False) -> None:
+    # top: the variant called from the start production, which reports every
+    # expansion of A (including the ones its tail loop makes) to mark()
+    prods = GRAMMAR[A]
+    row = grammar.PARSE_TABLE[A]
+
+    # Terminal ids each production is chosen on, in production order
+    chosen: Dict[int, List[int]] = {}
+    terms = sorted(row, key=lambda t: TERMINAL_ID[t])
+    i = 0
+    while i < len(terms):
+        k = next(j for j in range(len(prods)) if prods[j] is row[terms[i]])
+        chosen.setdefault(k, []).append(TERMINAL_ID[terms[i]])
+        i += 1
+    follow_only = sorted(TERMINAL_ID[t] for t in grammar.FOLLOW[A] if t not in row)
+
+    out.append("")
+    out.append(f"    def {_top_fn(A) if top else _fn(A)}(parent):")
+    out.append("        nonlocal la")
+    out.append("        while True:")
+    if top:
+        out.append("            mark(root, parent, la)")
+    out.append("            t = la.term")
+    k = 0
+    while k < len(prods):
+        if k in chosen:
+            out.append(f"            if {_test(chosen[k])}:")
+            out.append(f"                node = new_node(parent, {SYMBOL_ID[A]})")
+            out.append("                if stats is not None:")
+            out.append(f"                    stats.expand({A!r})")
+            body: List[str] = []
+            _emit_body(body, A, prods[k], " " * 16, "node")
+            out.extend(body)
+            if not body[-1].endswith("continue"):
+                out.append("                return")
+        k += 1
+
+    # Panic mode, as in Parser._parse_nonterminal_int
+    if follow_only:
+        out.append(f"            if {_test(follow_only)}:")
+        out.append(f"                err_missing(la, {A!r})")
+        out.append("                return")
+    if EOF_ID not in follow_only and "$" not in row:
+        out.append(f"            if t == {EOF_ID}:")
+        out.append("                stop()")
+    out.append(f"            discard({A!r})")
+
+
+def generate_source() -> str:
+    start = next(iter(GRAMMAR))
+    if len(GRAMMAR[start]) != 1:
+        raise ValueError(f"start symbol {start!r} must have exactly one production")
+
+    out: List[str] = [
+        "# -*- coding: utf-8 -*-",
+        '"""Generated by parser_codegen.py from grammar.GRAMMAR -- do not edit."""',
+        "",
+        f"KEY = {_KEY!r}",
+        "",
+        "",
+        "class _Stop(Exception):",
+        '    """Unexpected EOF: unwinds every open nonterminal at once."""',
+        "",
+        "",
+        "def parse(p, seen, mark):",
+        "    # p is the Parser; every token read is appended to seen. mark(root,",
+        "    # parent, la) is called before each top-level expansion of a nonterminal",
+        "    # of the start production: a point the parse can be resumed from",
+        "    builder = p.builder",
+        "    new_node = builder.node",
+        "    new_leaf = builder.leaf",
+        "    new_epsilon = builder.epsilon",
+        "    next_token = p.scanner.get_next_token",
+        "    err_missing = p._err_missing",
+        "    record = seen.append",
+        "    stats = p.stats",
+        "    la = p.lookahead",
+        "",
+        "    def stop():",
+        "        p._err_unexpected_eof(la)",
+        "        p.stopped = True",
+        "        raise _Stop()",
+        "",
+        "    def discard(name):",
+        "        nonlocal la",
+        "        p.lookahead = la",
+        "        p._discard(name)",
+        "        la = p.lookahead",
+        "        record(la)",
+    ]
+    names = list(GRAMMAR)
+    i = 0
+    while i < len(names):
+        if names[i] != start:
+            _emit_nonterminal(out, names[i])
+        i += 1
+    top = [s for s in dict.fromkeys(GRAMMAR[start][0]) if s in GRAMMAR and s != start]
+    i = 0
+    while i < len(top):
+        _emit_nonterminal(out, top[i], top=True)
+        i += 1
+
+    out.append("")
+    out.append(f"    root = new_node(None, {SYMBOL_ID[start]})")
+    out.append("    try:")
+    out.append("        while True:")
+    body: List[str] = []
+    _emit_body(body, start, GRAMMAR[start][0], " " * 12, "root", _top_fn)
+    out.extend(body)
+    out.append("            break")
+    out.append(f"        while la.term != {EOF_ID}:")
+    out.append(f"            discard({start!r})")
+    out.append(f"        new_node(root, {EOF_ID})")
+    out.append("    except _Stop:")
+    out.append("        pass")
+    out.append("    p.lookahead = la")
+    out.append("    return builder.result(root)")
+    return "\n".join(out) + "\n"
+
+
+def write_module(path: str = DEFAULT_PATH) -> str:
+    source = generate_source()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(source)
+    os.replace(tmp, path)
+    return source
+
+
+_loaded: Optional[types.ModuleType] = None
+
+
+def load() -> types.ModuleType:
+    """The generated module, regenerated first if it does not match GRAMMAR."""
+    global _loaded
+    if _loaded is not None:
+        return _loaded
+    try:
+        module = importlib.import_module(MODULE_NAME)
+        if getattr(module, "KEY", None) == _KEY:
+            _loaded = module
+            return module
+    except (ImportError, SyntaxError):
+        pass
+
+    try:
+        write_module()
+        importlib.invalidate_caches()
+        sys.modules.pop(MODULE_NAME, None)
+        module = importlib.import_module(MODULE_NAME)
+    except OSError:
+        # Read-only location: run the fresh source without keeping it
+        module = types.ModuleType(MODULE_NAME)
+        exec(compile(generate_source(), DEFAULT_PATH, "exec"), module.__dict__)
+    _loaded = module
+    return module
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Generate the specialized parser module.")
+    ap.add_argument("--check", action="store_true", help="only report whether the module is up to date")
+    args = ap.parse_args()
+
+    if args.check:
+        try:
+            with open(DEFAULT_PATH, "r", encoding="utf-8") as f:
+                current = f.read() == generate_source()
+        except OSError:
+            current = False
+        print(f"{DEFAULT_PATH}: {'up to date' if current else 'missing or stale'}")
+        sys.exit(0 if current else 1)
+    write_module()
+    print(f"wrote {DEFAULT_PATH} (key {grammar.GRAMMAR_HASH})")
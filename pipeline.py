@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""Scan in a separate process, parse in this one, with tokens passed through shared memory.
+
+PipelinedScanner is a drop-in scanner for Parser: a producer process runs
+the ordinary Scanner over the input and writes the tokens, a batch at a
+time, into a multiprocessing.shared_memory ring buffer; get_next_token
+hands them out in order. The two processes overlap, and the producer
+blocks while the ring is full, so it never runs more than the ring's size
+ahead of the parser.
+
+A batch is a frame: a header (token count, new line starts, lexeme bytes),
+then per token its terminal id, type code, start and end offsets, then the
+LineIndex line starts added since the previous batch and the lexemes
+joined by NUL. The consumer's index is rebuilt from those line starts, so
+line numbers in error messages are the same as in-process. If the producer
+fails (a decode error, say), it sends the pickled exception instead and
+get_next_token raises it. If it dies without a word (killed by a signal or
+the OOM killer), the parser notices within POLL_SECONDS and get_next_token
+raises RuntimeError instead of waiting forever.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import pickle
+import struct
+from array import array
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional, Union
+
+from scanner import DEFAULT_CHUNK_SIZE, Scanner, Token
+from source_index import LineIndex
+
+
+DEFAULT_RING_BYTES = 4 << 20
+BATCH_TOKENS = 4096
+
+# How often a side blocked on the ring checks that the other one still runs
+POLL_SECONDS = 0.5
+
+_TYPES = ("ID", "NUM", "KEYWORD", "SYMBOL", "EOF")
+_TYPE_CODE = {t: i for i, t in enumerate(_TYPES)}
+
+_POSITIONS = struct.Struct("<QQ")   # bytes ever written, bytes ever read
+_DATA = 64                          # ring data starts here, away from the counters
+_FRAME = struct.Struct("<iII")      # tokens (-1: pickled exception), line starts, lexeme bytes
+
+
+class _PeerGone(Exception):
+    """The process on the other end of the ring exited while this one waited for it."""
+
+
+class _Ring:
+    """Single-producer, single-consumer byte stream over a shared memory block.
+
+    The block starts with two byte counters: head (bytes ever written) is
+    only stored by the producer, tail (bytes ever read) only by the
+    consumer. The producer copies a payload into the ring before it
+    publishes the new head, and the consumer copies bytes out before it
+    publishes the new tail. So neither side ever sees a counter cover bytes
+    that are not there yet or are still needed. Counters are read and stored
+    under `lock`, whose acquire/release also orders the data copies around
+    them on CPUs with weaker memory ordering than x86.
+
+    `data` is released after every write and `space` after every read;
+    either side re-checks the counters after waking, so extra releases
+    only cost a loop turn. A side that finds nothing to do waits at most
+    POLL_SECONDS at a time (also for the lock, which a killed peer may
+    hold) and then asks peer_alive() whether to go on; if not, it raises
+    _PeerGone.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, data, space, lock, peer_alive: Callable[[], bool]):
+        self.shm = shm
+        self.buf = shm.buf
+        self.size = shm.size - _DATA
+        self.data = data
+        self.space = space
+        self.lock = lock
+        self.peer_alive = peer_alive
+
+    def _lock(self) -> None:
+        while not self.lock.acquire(timeout=POLL_SECONDS):
+            if not self.peer_alive():
+                raise _PeerGone()
+
+    def _positions(self):
+        self._lock()
+        try:
+            return _POSITIONS.unpack_from(self.buf, 0)
+        finally:
+            self.lock.release()
+
+    def _publish(self, offset: int, value: int) -> None:
+        self._lock()
+        try:
+            struct.pack_into("<Q", self.buf, offset, value)
+        finally:
+            self.lock.release()
+
+    def _wait(self, sem) -> None:
+        # The caller re-checks the counters after this, so a peer that wrote
+        # or read right before exiting is still noticed once more
+        if not sem.acquire(timeout=POLL_SECONDS) and not self.peer_alive():
+            head, tail = self._positions()
+            if head - tail == (0 if sem is self.data else self.size):
+                raise _PeerGone()
+
+    def write(self, payload: bytes) -> None:
+        buf = self.buf
+        size = self.size
+        view = memoryview(payload)
+        done = 0
+        while done < len(view):
+            head, tail = self._positions()
+            free = size - (head - tail)
+            if free == 0:
+                self._wait(self.space)
+                continue
+            k = min(free, len(view) - done)
+            at = head % size
+            first = min(k, size - at)
+            buf[_DATA + at:_DATA + at + first] = view[done:done + first]
+            if first < k:
+                buf[_DATA:_DATA + k - first] = view[done + first:done + k]
+            self._publish(0, head + k)
+            self.data.release()
+            done += k
+
+    def read(self, n: int) -> bytes:
+        buf = self.buf
+        size = self.size
+        out = bytearray()
+        while len(out) < n:
+            head, tail = self._positions()
+            avail = head - tail
+            if avail == 0:
+                self._wait(self.data)
+                continue
+            k = min(avail, n - len(out))
+            at = tail % size
+            first = min(k, size - at)
+            out += buf[_DATA + at:_DATA + at + first]
+            if first < k:
+                out += buf[_DATA:_DATA + k - first]
+            self._publish(8, tail + k)
+            self.space.release()
+        return bytes(out)
+
+
+def _send_batch(ring: _Ring, tokens: List[Token], index: LineIndex, sent_lines: int) -> int:
+    lex = "\0".join([t.lex for t in tokens]).encode("utf-8")
+    starts = index.starts[sent_lines:]
+    ring.write(
+        _FRAME.pack(len(tokens), len(starts), len(lex))
+        + array("h", [t.term for t in tokens]).tobytes()
+        + bytes([_TYPE_CODE[t.typ] for t in tokens])
+        + array("q", [t.start for t in tokens]).tobytes()
+        + array("q", [t.end for t in tokens]).tobytes()
+        + starts.tobytes()
+        + lex
+    )
+    return sent_lines + len(starts)
+
+
+def _produce(
+    shm_name: str, data, space, lock, parent_pid: int, source: Union[str, bytes], engine: str, chunk_size: int
+) -> None:
+    # Children share the parent's resource tracker, so attaching here does
+    # not register the block a second time; the parent unlinks it
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # A parser that went away without close() leaves this process blocked on
+    # a full ring; it is reparented then, which ends the wait
+    ring = _Ring(shm, data, space, lock, lambda: os.getppid() == parent_pid)
+    try:
+        try:
+            if isinstance(source, bytes):
+                scanner = Scanner.from_file(os.fsdecode(source), engine, chunk_size)
+            else:
+                scanner = Scanner(source, engine)
+            sent_lines = 1    # both indexes start with line 1 at offset 0
+            batch: List[Token] = []
+            while True:
+                tok = scanner.get_next_token()
+                batch.append(tok)
+                if tok.typ == "EOF":
+                    break
+                if len(batch) == BATCH_TOKENS:
+                    sent_lines = _send_batch(ring, batch, scanner.index, sent_lines)
+                    batch = []
+            _send_batch(ring, batch, scanner.index, sent_lines)
+            scanner.close()
+        except _PeerGone:
+            raise
+        except Exception as exc:
+            try:
+                blob = pickle.dumps(exc)
+            except Exception:
+                blob = pickle.dumps(RuntimeError(f"{type(exc).__name__}: {exc}"))
+            ring.write(_FRAME.pack(-1, 0, len(blob)) + blob)
+    except _PeerGone:
+        pass    # nobody left to tell
+    finally:
+        ring.buf = None
+        shm.close()
+
+
+class PipelinedScanner:
+    """Scanner interface over tokens produced by a scanner process.
+
+    Use from_file() or pass the source text. Call close() (or use it as a
+    context manager) to release the process and the shared memory.
+    """
+
+    def __init__(
+        self,
+        src: Optional[str] = None,
+        engine: str = "char",
+        ring_bytes: int = DEFAULT_RING_BYTES,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        _path: Optional[str] = None,
+    ):
+        if ring_bytes < 1:
+            raise ValueError("ring_bytes must be positive")
+        self.index = LineIndex()
+        self._tokens: List[Token] = []
+        self._i = 0
+        self._eof: Optional[Token] = None
+
+        ctx = multiprocessing.get_context()
+        self._shm = shared_memory.SharedMemory(create=True, size=_DATA + ring_bytes)
+        _POSITIONS.pack_into(self._shm.buf, 0, 0, 0)
+        data = ctx.Semaphore(0)
+        space = ctx.Semaphore(0)
+        lock = ctx.Lock()
+        self._ring = _Ring(self._shm, data, space, lock, self._producer_alive)
+        source: Union[str, bytes] = os.fsencode(_path) if _path is not None else src
+        self._proc = ctx.Process(
+            target=_produce,
+            args=(self._shm.name, data, space, lock, os.getpid(), source, engine, chunk_size),
+            daemon=True,
+        )
+        self._proc.start()
+
+    @classmethod
+    def from_file(
+        cls,
+        path: Union[str, os.PathLike],
+        engine: str = "char",
+        ring_bytes: int = DEFAULT_RING_BYTES,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> "PipelinedScanner":
+        # Fail here, like Scanner.from_file, rather than at the first token
+        os.stat(path)
+        return cls(None, engine, ring_bytes, chunk_size, _path=os.fspath(path))
+
+    def __enter__(self) -> "PipelinedScanner":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _producer_alive(self) -> bool:
+        return self._proc is not None and self._proc.is_alive()
+
+    def _next_batch(self) -> None:
+        ring = self._ring
+        try:
+            n, n_starts, lex_len = _FRAME.unpack(ring.read(_FRAME.size))
+            if n < 0:
+                exc = pickle.loads(ring.read(lex_len))
+            else:
+                exc = None
+                body = ring.read(n * 19 + n_starts * 8 + lex_len)
+        except _PeerGone:
+            code = self._proc.exitcode if self._proc is not None else None
+            self.close()
+            raise RuntimeError(f"scanner process exited (code {code}) before the end of the input") from None
+        if exc is not None:
+            self.close()
+            raise exc
+
+        terms = array("h")
+        terms.frombytes(body[:2 * n])
+        at = 2 * n
+        types = body[at:at + n]
+        at += n
+        starts = array("q")
+        starts.frombytes(body[at:at + 8 * n])
+        at += 8 * n
+        ends = array("q")
+        ends.frombytes(body[at:at + 8 * n])
+        at += 8 * n
+        lines = array("q")
+        lines.frombytes(body[at:at + 8 * n_starts])
+        at += 8 * n_starts
+        lexes = body[at:].decode("utf-8").split("\0")
+
+        self.index.starts.extend(lines)
+        self._tokens = list(map(Token, map(_TYPES.__getitem__, types), lexes, starts, ends, terms))
+        self._i = 0
+
+    def get_next_token(self) -> Token:
+        if self._i == len(self._tokens):
+            if self._eof is not None:
+                return self._eof
+            self._next_batch()
+        tok = self._tokens[self._i]
+        self._i += 1
+        if tok.typ == "EOF":
+            self._eof = tok
+            self.close()
+        return tok
+
+    def close(self) -> None:
+        if self._proc is None:
+            return
+        proc = self._proc
+        self._proc = None
+        if self._eof is None:
+            # Closed early: the producer may be blocked on a full ring
+            proc.terminate()
+        proc.join()
+        self._ring.buf = None
+        self._shm.close()
+        self._shm.unlink()
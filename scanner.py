@@ -3,8 +3,20 @@
 
 from __future__ import annotations
 
+import codecs
+import io
+import mmap
+import os
+import re
+import time
 from dataclasses import dataclass
-from typing import Set
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Optional, Pattern, Set, Union
+
+from grammar import EOF_ID, ID_ID, NUM_ID, OTHER_TERMINAL, TERMINAL_ID
+from source_index import LineIndex
+
+if TYPE_CHECKING:
+    from instrument import Stats
 
 
 KEYWORDS: Set[str] = {"break", "else", "for", "if", "int", "return", "void"}
@@ -13,6 +25,21 @@ WHITESPACE: Set[str] = {" ", "\n", "\r", "\t", "\v", "\f"}
 # Used as "safe boundaries" when we decide to skip a garbage chunk
 BOUNDARY_SYMBOLS: Set[str] = {";", ":", ",", "[", "]", "(", ")", "{", "}", "+", "-", "*", "/", "=", "<"}
 
+# Patterns for the "regex" engine. They are ASCII-only on purpose: whenever a
+# non-ASCII character could change a decision (isalpha/isdigit/isalnum), the
+# regex engine hands that token over to the char engine.
+_WS_RE = re.compile(r"[ \n\r\t\v\f]+")
+_ID_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_NUM_RE = re.compile(r"[0-9]+")
+_ALNUM_RE = re.compile(r"[A-Za-z0-9_]*")
+_GARBAGE_RE = re.compile(r"[^ \n\r\t\v\f;:,\[\]()\{\}+\-*/=<]*")
+_LINE_COMMENT_RE = re.compile(r"[^\n\f]*")
+
+ENGINES = ("char", "regex")
+
+# Streaming input is decoded this many bytes at a time
+DEFAULT_CHUNK_SIZE = 1 << 20
+
 
 def _is_letter(ch: str) -> bool:
     return bool(ch) and ch.isalpha()
@@ -26,24 +53,172 @@ def _is_alnum_or_underscore(ch: str) -> bool:
     return bool(ch) and (ch.isalnum() or ch == "_")
 
 
+class _ChunkReader:
+    """Decodes a binary stream chunk by chunk, like open(..., "r", encoding="utf-8")."""
+
+    def __init__(self, raw: BinaryIO, chunk_size: int, owned: Optional[List] = None):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.owned = owned or []
+        self.decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(), translate=True)
+        self.clean = True   # decoder holds no partial character / pending '\r'
+        self.done = False
+
+    def read(self) -> str:
+        while True:
+            chunk = self.raw.read(self.chunk_size)
+            if not chunk:
+                text = self.decoder.decode(b"", final=True)
+                self.done = True
+                self.close()
+                return text
+
+            # ASCII fast path: nothing to decode and no newlines to translate
+            if self.clean and chunk.isascii() and b"\r" not in chunk:
+                text = chunk.decode("ascii")
+            else:
+                text = self.decoder.decode(chunk)
+                self.clean = self.decoder.getstate() == (b"", 0)
+
+            if text:
+                return text
+
+    def close(self) -> None:
+        while self.owned:
+            self.owned.pop().close()
+
+
+# Terminal ids of the one-character symbols (':' is not used by any production)
+SYMBOL_TERMINALS: Dict[str, int] = {
+    ch: TERMINAL_ID.get(ch, OTHER_TERMINAL)
+    for ch in (";", ":", ",", "[", "]", "(", ")", "{", "}", "+", "-", "<")
+}
+
+
 @dataclass
 class Token:
     typ: str    # KEYWORD, ID, NUM, SYMBOL, EOF
     lex: str
-    line: int
+    start: int  # source offsets of the lexeme; line/column come from Scanner.index
+    end: int
+    term: int   # grammar terminal id (grammar.TERMINAL_ID), see token_to_terminal
+
+
+def token_display(tok: Token) -> str:
+    if tok.typ == "EOF":
+        return "$"
+    if tok.typ == "ID":
+        return f"(ID, {tok.lex})"
+    if tok.typ == "NUM":
+        return f"(NUM, {tok.lex})"
+    if tok.typ == "KEYWORD":
+        return f"(KEYWORD, {tok.lex})"
+    if tok.typ == "SYMBOL":
+        return f"(SYMBOL, {tok.lex})"
+    return tok.lex
 
 
 class Scanner:
     # One-character symbols returned as SYMBOL tokens
     SINGLE_SYMBOLS: Set[str] = {";", ":", ",", "[", "]", "(", ")", "{", "}", "+", "-", "<"}
 
-    def __init__(self, src: str):
+    def __init__(
+        self,
+        src: str,
+        engine: str = "char",
+        stats: Optional["Stats"] = None,
+        index: Optional[LineIndex] = None,
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown scanner engine: {engine!r}")
         self.src = src
         self.n = len(src)
         self.pos = 0
-        self.line = 1
+        self.base = 0       # source offset of src[0] (moves as streamed input is refilled)
+        # Newline offsets, indexed in one pass per chunk (a prebuilt index of src may be passed);
+        # unlike the streamed text window it keeps all of them, O(lines)
+        self.index = index if index is not None else LineIndex.from_text(src)
+        self.engine = engine
+        self.stats = stats
+        self._reader: Optional[_ChunkReader] = None
+
+    @classmethod
+    def from_stream(
+        cls,
+        stream: BinaryIO,
+        engine: str = "char",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        stats: Optional["Stats"] = None,
+    ) -> "Scanner":
+        scanner = cls("", engine, stats)
+        scanner._reader = _ChunkReader(stream, chunk_size)
+        return scanner
+
+    @classmethod
+    def from_file(
+        cls,
+        path: Union[str, os.PathLike],
+        engine: str = "char",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        use_mmap: bool = True,
+        stats: Optional["Stats"] = None,
+    ) -> "Scanner":
+        f = open(path, "rb")
+        owned: List = [f]
+        raw: BinaryIO = f
+        if use_mmap:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                pass    # empty file or not mappable: read it as a stream
+            else:
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                owned.append(mm)
+                raw = mm
+
+        scanner = cls("", engine, stats)
+        scanner._reader = _ChunkReader(raw, chunk_size, owned)
+        return scanner
+
+    @property
+    def line(self) -> int:
+        return self.index.line(self.base + self.pos)
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _fill(self) -> None:
+        # Drop the consumed prefix of the window and append the next chunk
+        text = self._reader.read()
+        if self._reader.done:
+            self._reader = None
+        self.index.add(text, self.base + self.n)
+        self.base += self.pos
+        self.src = self.src[self.pos:] + text
+        self.n = len(self.src)
+        self.pos = 0
+
+    def _refill(self, k: int) -> None:
+        while self._reader is not None and self.pos + k > self.n:
+            self._fill()
+
+    def _skip_run(self, pattern: Pattern[str], start: int) -> None:
+        # Skip a newline-free run, pulling in more chunks while it reaches the window end
+        end = pattern.match(self.src, start).end()
+        while end == self.n and self._reader is not None:
+            self.pos = end
+            self._fill()
+            end = pattern.match(self.src, 0).end()
+        self.pos = end
 
     def peek(self, k: int = 1) -> str:
+        if self.pos + k > self.n and self._reader is not None:
+            self._refill(k)
         if self.pos >= self.n:
             return ""
         return self.src[self.pos:self.pos + k]
@@ -53,27 +228,49 @@ class Scanner:
         steps = 0
         while steps < k:
             if self.pos >= self.n:
-                return grabbed
-            ch = self.src[self.pos]
+                if self._reader is None:
+                    return grabbed
+                self._refill(1)
+                continue
+            grabbed += self.src[self.pos]
             self.pos += 1
-            grabbed += ch
-            if ch == "\n":
-                self.line += 1
             steps += 1
         return grabbed
 
+    def _eof(self) -> Token:
+        end = self.base + self.pos
+        return Token("EOF", "$", end, end, EOF_ID)
+
+    def _note_skip(self, kind: str, start: int) -> None:
+        self.stats.skip(kind, self.base + self.pos - start)
+
     def get_next_token(self) -> Token:
+        if self.stats is not None:
+            return self._timed_next_token()
+        if self.engine == "regex":
+            return self._regex_next_token()
+        return self._char_next_token()
+
+    def _timed_next_token(self) -> Token:
+        t0 = time.perf_counter()
+        tok = self._regex_next_token() if self.engine == "regex" else self._char_next_token()
+        self.stats.add_time("scan", time.perf_counter() - t0)
+        self.stats.count_token(tok)
+        return tok
+
+    def _char_next_token(self) -> Token:
         while True:
-            start_line = self.line
             ch = self.peek(1)
 
             if not ch:
-                return Token("EOF", "$", self.line)
+                return self._eof()
 
             if ch in WHITESPACE:
                 self.advance(1)
                 continue
 
+            start = self.base + self.pos
+
             # ID / KEYWORD
             if _is_letter(ch) or ch == "_":
                 lexeme = self.advance(1)
@@ -88,11 +285,13 @@ class Scanner:
                         if (not t) or (t in WHITESPACE) or (t in BOUNDARY_SYMBOLS):
                             break
                         self.advance(1)
+                    if self.stats is not None:
+                        self._note_skip("garbage", start)
                     continue
 
                 if lexeme in KEYWORDS:
-                    return Token("KEYWORD", lexeme, start_line)
-                return Token("ID", lexeme, start_line)
+                    return Token("KEYWORD", lexeme, start, start + len(lexeme), TERMINAL_ID[lexeme])
+                return Token("ID", lexeme, start, start + len(lexeme), ID_ID)
 
             # NUM
             if _is_digit(ch):
@@ -106,10 +305,14 @@ class Scanner:
                 if nxt and (_is_letter(nxt) or nxt == "_"):
                     while _is_alnum_or_underscore(self.peek(1)):
                         self.advance(1)
+                    if self.stats is not None:
+                        self._note_skip("garbage", start)
                     continue
 
                 # Example: 012 => ignore it (keeps behavior identical to previous version)
                 if len(lexeme) > 1 and lexeme[0] == "0":
+                    if self.stats is not None:
+                        self._note_skip("garbage", start)
                     continue
 
                 # If garbage is stuck to a number, skip it up to a boundary
@@ -119,9 +322,11 @@ class Scanner:
                         if (not t) or (t in WHITESPACE) or (t in BOUNDARY_SYMBOLS):
                             break
                         self.advance(1)
+                    if self.stats is not None:
+                        self._note_skip("garbage", start)
                     continue
 
-                return Token("NUM", lexeme, start_line)
+                return Token("NUM", lexeme, start, start + len(lexeme), NUM_ID)
 
             # comments or '/'
             if ch == "/":
@@ -131,42 +336,50 @@ class Scanner:
                     self.advance(2)
                     while self.peek(1) not in ["\n", "\f", ""]:
                         self.advance(1)
+                    if self.stats is not None:
+                        self._note_skip("comment", start)
                     continue
 
                 if two == "/*":
                     self.advance(2)
                     while True:
                         if not self.peek(1):
-                            return Token("EOF", "$", self.line)
+                            if self.stats is not None:
+                                self._note_skip("comment", start)
+                            return self._eof()
                         if self.peek(2) == "*/":
                             self.advance(2)
                             break
                         self.advance(1)
+                    if self.stats is not None:
+                        self._note_skip("comment", start)
                     continue
 
                 self.advance(1)
-                return Token("SYMBOL", "/", start_line)
+                return Token("SYMBOL", "/", start, start + 1, TERMINAL_ID["/"])
 
             # '=' or '=='
             if ch == "=":
                 if self.peek(2) == "==":
                     self.advance(2)
-                    return Token("SYMBOL", "==", start_line)
+                    return Token("SYMBOL", "==", start, start + 2, TERMINAL_ID["=="])
                 self.advance(1)
-                return Token("SYMBOL", "=", start_line)
+                return Token("SYMBOL", "=", start, start + 1, TERMINAL_ID["="])
 
             # '*' (and ignore stray '*/')
             if ch == "*":
                 self.advance(1)
                 if self.peek(1) == "/":
                     self.advance(1)
+                    if self.stats is not None:
+                        self._note_skip("garbage", start)
                     continue
-                return Token("SYMBOL", "*", start_line)
+                return Token("SYMBOL", "*", start, start + 1, TERMINAL_ID["*"])
 
             # Other one-char symbols
             if ch in self.SINGLE_SYMBOLS:
                 self.advance(1)
-                return Token("SYMBOL", ch, start_line)
+                return Token("SYMBOL", ch, start, start + 1, SYMBOL_TERMINALS[ch])
 
             # Anything else: discard up to the next boundary
             self.advance(1)
@@ -175,4 +388,158 @@ class Scanner:
                 if (not t) or (t in WHITESPACE) or (t in BOUNDARY_SYMBOLS):
                     break
                 self.advance(1)
+            if self.stats is not None:
+                self._note_skip("garbage", start)
             continue
+
+    def _regex_next_token(self) -> Token:
+        # Same token stream as _char_next_token, but whole lexemes are matched
+        # with compiled patterns and comments/garbage are skipped by jumping.
+        # With streaming input a lexeme that reaches the end of the window is
+        # retried once the next chunk has been appended.
+        while True:
+            src = self.src
+            n = self.n
+            pos = self.pos
+
+            # Two characters of lookahead are enough for '//', '/*', '==' and '*/'
+            if n - pos < 2 and self._reader is not None:
+                self._refill(2)
+                continue
+
+            if pos >= n:
+                return self._eof()
+
+            ch = src[pos]
+
+            if ch in WHITESPACE:
+                self.pos = _WS_RE.match(src, pos).end()
+                continue
+
+            if ch >= "\x80":
+                return self._char_next_token()
+
+            # ID / KEYWORD
+            if ch.isalpha() or ch == "_":
+                end = _ID_RE.match(src, pos).end()
+                if end == n and self._reader is not None:
+                    self._fill()
+                    continue
+                if end < n:
+                    nxt = src[end]
+                    if nxt >= "\x80":
+                        return self._char_next_token()
+                    if nxt not in WHITESPACE and nxt not in BOUNDARY_SYMBOLS:
+                        start = self.base + pos
+                        self._skip_run(_GARBAGE_RE, end)
+                        if self.stats is not None:
+                            self._note_skip("garbage", start)
+                        continue
+
+                self.pos = end
+                lexeme = src[pos:end]
+                start = self.base + pos
+                if lexeme in KEYWORDS:
+                    return Token("KEYWORD", lexeme, start, start + end - pos, TERMINAL_ID[lexeme])
+                return Token("ID", lexeme, start, start + end - pos, ID_ID)
+
+            # NUM
+            if ch.isdigit():
+                end = _NUM_RE.match(src, pos).end()
+                if end == n and self._reader is not None:
+                    self._fill()
+                    continue
+                nxt = src[end] if end < n else ""
+                if nxt >= "\x80":
+                    return self._char_next_token()
+
+                # Example: 12abc => drop the whole token
+                if nxt.isalpha() or nxt == "_":
+                    start = self.base + pos
+                    self._skip_run(_ALNUM_RE, end)
+                    while _is_alnum_or_underscore(self.peek(1)):
+                        self.advance(1)
+                    if self.stats is not None:
+                        self._note_skip("garbage", start)
+                    continue
+
+                self.pos = end
+
+                # Example: 012 => ignore it
+                if end - pos > 1 and ch == "0":
+                    if self.stats is not None:
+                        self.stats.skip("garbage", end - pos)
+                    continue
+
+                if nxt and nxt not in WHITESPACE and nxt not in BOUNDARY_SYMBOLS:
+                    start = self.base + pos
+                    self._skip_run(_GARBAGE_RE, end)
+                    if self.stats is not None:
+                        self._note_skip("garbage", start)
+                    continue
+
+                start = self.base + pos
+                return Token("NUM", src[pos:end], start, start + end - pos, NUM_ID)
+
+            # comments or '/'
+            if ch == "/":
+                two = src[pos:pos + 2]
+
+                if two == "//":
+                    start = self.base + pos
+                    self._skip_run(_LINE_COMMENT_RE, pos + 2)
+                    if self.stats is not None:
+                        self._note_skip("comment", start)
+                    continue
+
+                if two == "/*":
+                    start = self.base + pos
+                    search = pos + 2
+                    close = src.find("*/", search)
+                    while close < 0 and self._reader is not None:
+                        # Keep the last character: it may be the '*' of a split '*/'
+                        self.pos = max(self.n - 1, search)
+                        self._fill()
+                        search = 0
+                        close = self.src.find("*/", search)
+
+                    if close < 0:
+                        self.pos = self.n
+                        if self.stats is not None:
+                            self._note_skip("comment", start)
+                        return self._eof()
+                    self.pos = close + 2
+                    if self.stats is not None:
+                        self._note_skip("comment", start)
+                    continue
+
+                self.pos = pos + 1
+                return Token("SYMBOL", "/", self.base + pos, self.base + pos + 1, TERMINAL_ID["/"])
+
+            # '=' or '=='
+            if ch == "=":
+                if src[pos:pos + 2] == "==":
+                    self.pos = pos + 2
+                    return Token("SYMBOL", "==", self.base + pos, self.base + pos + 2, TERMINAL_ID["=="])
+                self.pos = pos + 1
+                return Token("SYMBOL", "=", self.base + pos, self.base + pos + 1, TERMINAL_ID["="])
+
+            # '*' (and ignore stray '*/')
+            if ch == "*":
+                if src[pos + 1:pos + 2] == "/":
+                    self.pos = pos + 2
+                    if self.stats is not None:
+                        self.stats.skip("garbage", 2)
+                    continue
+                self.pos = pos + 1
+                return Token("SYMBOL", "*", self.base + pos, self.base + pos + 1, TERMINAL_ID["*"])
+
+            if ch in self.SINGLE_SYMBOLS:
+                self.pos = pos + 1
+                return Token("SYMBOL", ch, self.base + pos, self.base + pos + 1, SYMBOL_TERMINALS[ch])
+
+            # Anything else: discard up to the next boundary
+            start = self.base + pos
+            self._skip_run(_GARBAGE_RE, pos + 1)
+            if self.stats is not None:
+                self._note_skip("garbage", start)
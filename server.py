@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Long-running compile server: grammar tables stay loaded between requests.
+
+    python server.py --socket /tmp/cminus.sock [-j WORKERS]
+    python server.py --stdio [-j WORKERS]
+
+Requests are read with asyncio (framing in client.py) and handed to a pool of
+worker processes, each of which loads the tables once at start-up; with
+-j 0 they are compiled in the server process itself. Requests on one
+connection are served concurrently and answered as they finish.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from client import HEADER, MAX_FRAME, OUTPUTS, decode_body, encode_frame
+from compiler import compile_source, errors_text
+import grammar
+
+
+def _init_worker() -> None:
+    grammar.load_tables()
+
+
+def _compile_request(source: str, want_tree: bool) -> Dict[str, object]:
+    result = compile_source(source, ("tree", "errors") if want_tree else ("errors",))
+    out: Dict[str, object] = {"errors": errors_text(result.errors)}
+    if want_tree:
+        out["tree"] = result.tree
+    return out
+
+
+class CompileServer:
+    def __init__(self, executor: Executor):
+        self.executor = executor
+        self.served = 0
+
+    async def _answer(self, body: bytes, writer: asyncio.StreamWriter, lock: asyncio.Lock) -> None:
+        reply: Dict[str, object]
+        try:
+            request = decode_body(body)
+        except ValueError as exc:
+            reply = {"id": None, "error": f"bad request: {exc}"}
+        else:
+            reply = {"id": request.get("id")}
+            source = request.get("source")
+            outputs = request.get("outputs", list(OUTPUTS))
+            if not isinstance(source, str):
+                reply["error"] = "bad request: 'source' must be a string"
+            elif not isinstance(outputs, list) or not outputs or any(o not in OUTPUTS for o in outputs):
+                reply["error"] = f"bad request: 'outputs' must be a non-empty subset of {list(OUTPUTS)}"
+            else:
+                loop = asyncio.get_running_loop()
+                try:
+                    result = await loop.run_in_executor(self.executor, _compile_request, source, "tree" in outputs)
+                except Exception as exc:
+                    reply["error"] = f"compile failed: {type(exc).__name__}: {exc}"
+                else:
+                    if "tree" in outputs:
+                        reply["tree"] = result["tree"]
+                    if "errors" in outputs:
+                        reply["errors"] = result["errors"]
+                    self.served += 1
+
+        async with lock:
+            writer.write(encode_frame(reply))
+            await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        lock = asyncio.Lock()
+        pending: Set[asyncio.Task] = set()
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                    (n,) = HEADER.unpack(header)
+                    if n > MAX_FRAME:
+                        break   # not a peer speaking our protocol
+                    body = await reader.readexactly(n)
+                except asyncio.IncompleteReadError:
+                    break
+                task = asyncio.create_task(self._answer(body, writer, lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve_unix(self, path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)     # stale socket from an earlier run
+        server = await asyncio.start_unix_server(self.handle, path=path)
+        # SIGTERM stops serving cleanly so the socket file gets removed
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def serve_stdio(self) -> None:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_FRAME)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout.buffer)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        await self.handle(reader, writer)
+
+
+def make_executor(workers: int) -> Executor:
+    if workers <= 0:
+        _init_worker()
+        return ThreadPoolExecutor(max_workers=1)
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    where = ap.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", help="listen on this Unix domain socket")
+    where.add_argument("--stdio", action="store_true", help="serve one client over stdin/stdout")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="parse worker processes (0: in-process)")
+    args = ap.parse_args(argv)
+
+    executor = make_executor(args.workers)
+    server = CompileServer(executor)
+    try:
+        if args.stdio:
+            asyncio.run(server.serve_stdio())
+        else:
+            asyncio.run(server.serve_unix(args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
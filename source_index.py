@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Newline offset index: line/column of a source offset by binary search."""
+
+from __future__ import annotations
+
+import re
+from array import array
+from bisect import bisect_right
+from typing import Tuple
+
+_NEWLINE = re.compile("\n")
+
+
+class LineIndex:
+    """Start offsets of every line, built in bulk passes over the text.
+
+    Lines and columns are 1-based; columns count characters of the decoded
+    text. Only "\\n" ends a line, as in the scanner's original line counting.
+    An index over a slice of a larger text that starts at the beginning of
+    line N is numbered from first_line=N.
+
+    Every line start is kept (8 bytes per line) for as long as the index
+    lives, since tokens and errors ask for lines of any earlier offset. With
+    streamed input (Scanner.from_file / from_stream) the scanner's window
+    stays bounded, but the index still grows linearly with the line count.
+    """
+
+    def __init__(self, first_line: int = 1) -> None:
+        self.starts = array("q", [0])
+        self.first_line = first_line
+
+    @classmethod
+    def from_text(cls, text: str, first_line: int = 1) -> "LineIndex":
+        index = cls(first_line)
+        index.add(text, 0)
+        return index
+
+    def add(self, text: str, offset: int) -> None:
+        # text sits at source offset `offset`, after everything indexed so far
+        self.starts.extend(m.end() + offset for m in _NEWLINE.finditer(text))
+
+    def line(self, offset: int) -> int:
+        return bisect_right(self.starts, offset) + self.first_line - 1
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        k = bisect_right(self.starts, offset)
+        return k + self.first_line - 1, offset - self.starts[k - 1] + 1
+
+    def edited(self, offset: int, removed: int, inserted: str) -> "LineIndex":
+        """Index of the text after replacing [offset, offset + removed) with inserted."""
+        starts = self.starts
+        lo = bisect_right(starts, offset)
+        hi = bisect_right(starts, offset + removed)
+        delta = len(inserted) - removed
+
+        index = LineIndex(self.first_line)
+        index.starts = starts[:lo]
+        index.add(inserted, offset)
+        index.starts.extend(s + delta for s in starts[hi:])
+        return index
+
+    def __len__(self) -> int:
+        return len(self.starts)
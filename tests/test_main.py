@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""main.py batch and single-file modes, run in a temporary directory."""
+
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+
+import main
+
+
+GOOD = "int main(void) {\n    return;\n}\n"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_reports_undecodable_input_as_failed(tmp_path, workers):
+    src = tmp_path / "in"
+    src.mkdir()
+    (src / "a.c").write_text(GOOD, encoding="utf-8")
+    (src / "b.c").write_bytes(b"int x;\n\xff\xfe\n")
+    (src / "c.c").write_text(GOOD, encoding="utf-8")
+    out = tmp_path / "out"
+
+    argv = [str(src / "a.c"), str(src / "b.c"), str(src / "c.c"), "-o", str(out), "-j", str(workers)]
+    assert main.batch_main(argv) == 1     # some file failed
+
+    summary = json.loads((out / "summary.json").read_text(encoding="utf-8"))
+    assert summary["files"] == 3
+    assert summary["failed"] == 1
+    by_name = {os.path.basename(r["input"]): r for r in summary["results"]}
+    assert by_name["b.c"]["failed"].startswith("UnicodeDecodeError")
+    assert "failed" not in by_name["a.c"] and "failed" not in by_name["c.c"]
+    assert (out / "a.c" / "syntax_errors.txt").read_text(encoding="utf-8") == "No syntax errors found."
+    assert (out / "c.c" / "parse_tree.txt").exists()
+
+
+def test_single_file_cache_miss_then_hit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "input.txt").write_text(GOOD, encoding="utf-8")
+
+    seen = []
+    outputs = []
+    k = 0
+    while k < 2:
+        assert main.batch_main(["--cache", "cache", "--stats"]) == 0
+        seen.append(json.loads((tmp_path / "stats.json").read_text(encoding="utf-8"))["cache"])
+        outputs.append((tmp_path / "parse_tree.txt").read_text(encoding="utf-8"))
+        k += 1
+
+    assert seen == ["miss", "hit"]
+    assert outputs[0] == outputs[1]
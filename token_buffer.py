@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Token storage as parallel typed arrays instead of one Token object per token.
+
+Token i has type code code[i] (an index into TOKEN_TYPES), grammar terminal
+id term[i], source offsets start[i] / end[i] and lexeme lexemes[lex[i]].
+Lexemes are interned: each distinct one is stored once. Display strings
+such as "(KEYWORD, int)" are built the first time a token with that type
+and lexeme is rendered, and shared after that. Lines come from the
+LineIndex of the source, when the buffer has one.
+
+TreeStore keeps its leaves in a TokenBuffer, and Parser accepts one in
+place of a scanner.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Dict, List, Optional
+
+from scanner import Token, token_display
+from source_index import LineIndex
+
+
+TOKEN_TYPES = ("ID", "NUM", "KEYWORD", "SYMBOL", "EOF")
+TYPE_CODE = {t: i for i, t in enumerate(TOKEN_TYPES)}
+
+
+class TokenBuffer:
+    def __init__(self, index: Optional[LineIndex] = None) -> None:
+        self.code = array("b")
+        self.term = array("h")
+        self.start = array("q")
+        self.end = array("q")
+        self.lex = array("i")
+        self.lexemes: List[str] = []
+        self.index = index
+        self._lex_ids: Dict[str, int] = {}
+        self._display: Dict[int, str] = {}      # by lexeme id * len(TOKEN_TYPES) + type code
+
+    @classmethod
+    def from_scanner(cls, scanner: object) -> "TokenBuffer":
+        """Every token of the scanner, up to and including EOF."""
+        buf = cls(scanner.index)
+        append = buf.append
+        next_token = scanner.get_next_token
+        while True:
+            tok = next_token()
+            append(tok)
+            if tok.typ == "EOF":
+                return buf
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+    def append(self, tok: Token) -> None:
+        lid = self._lex_ids.get(tok.lex)
+        if lid is None:
+            lid = self._lex_ids[tok.lex] = len(self.lexemes)
+            self.lexemes.append(tok.lex)
+        self.code.append(TYPE_CODE[tok.typ])
+        self.term.append(tok.term)
+        self.start.append(tok.start)
+        self.end.append(tok.end)
+        self.lex.append(lid)
+
+    def extend_arrays(self, codes: array, lexemes: List[str], starts: array, ends: array, terms: array) -> None:
+        """Append tokens given as columns (lexemes has one entry per token)."""
+        lex_ids = self._lex_ids
+        table = self.lexemes
+        ids = array("i")
+        k = 0
+        while k < len(lexemes):
+            lid = lex_ids.get(lexemes[k])
+            if lid is None:
+                lid = lex_ids[lexemes[k]] = len(table)
+                table.append(lexemes[k])
+            ids.append(lid)
+            k += 1
+        self.code.extend(codes)
+        self.term.extend(terms)
+        self.start.extend(starts)
+        self.end.extend(ends)
+        self.lex.extend(ids)
+
+    def truncate(self, n: int) -> None:
+        """Drop every token from the n-th on (their lexemes stay interned)."""
+        del self.code[n:]
+        del self.term[n:]
+        del self.start[n:]
+        del self.end[n:]
+        del self.lex[n:]
+
+    # -- read side ----------------------------------------------------------
+
+    def typ(self, i: int) -> str:
+        return TOKEN_TYPES[self.code[i]]
+
+    def lexeme(self, i: int) -> str:
+        return self.lexemes[self.lex[i]]
+
+    def line(self, i: int) -> int:
+        return self.index.line(self.start[i])
+
+    def display(self, i: int) -> str:
+        key = self.lex[i] * len(TOKEN_TYPES) + self.code[i]
+        s = self._display.get(key)
+        if s is None:
+            s = self._display[key] = token_display(self[i])
+        return s
+
+    def __getitem__(self, i: int) -> Token:
+        # A new Token object each time: compare tokens by value, not identity
+        return Token(TOKEN_TYPES[self.code[i]], self.lexemes[self.lex[i]], self.start[i], self.end[i], self.term[i])
+
+    def reader(self) -> "TokenReader":
+        return TokenReader(self)
+
+    def nbytes(self) -> int:
+        """Bytes in the per-token arrays (the interned lexemes are not counted)."""
+        return sum(a.itemsize * len(a) for a in (self.code, self.term, self.start, self.end, self.lex))
+
+
+class TokenReader:
+    """Scanner interface over a TokenBuffer; after the last token it keeps returning it."""
+
+    def __init__(self, buf: TokenBuffer):
+        if buf.index is None:
+            raise ValueError("a TokenBuffer needs the source's LineIndex to be parsed")
+        self.buf = buf
+        self.index: LineIndex = buf.index
+        self.i = 0
+        self._last = len(buf) - 1
+        self._columns = (buf.code, buf.lex, buf.start, buf.end, buf.term, buf.lexemes)
+
+    def get_next_token(self) -> Token:
+        i = self.i
+        code, lex, start, end, term, lexemes = self._columns
+        if i < self._last:
+            self.i = i + 1
+        return Token(TOKEN_TYPES[code[i]], lexemes[lex[i]], start[i], end[i], term[i])
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""Machine-readable parse tree outputs: JSON lines and a compact binary file.
+
+Both list the nodes in pre-order as (depth, symbol, token): symbol is the
+grammar symbol ("Declaration", "ID", "int", "+", "$", or "epsilon") and
+token is (type, lexeme) for leaves matched from the input, None otherwise.
+
+JSON lines: one object per node,
+
+    {"depth": 2, "symbol": "ID", "token": ["ID", "main"]}
+
+Binary: MAGIC, then one record per node, then the string table and a
+trailer. Symbols and lexemes are interned in the string table; a record is
+varint(string id * 5 + token type code), varint(lexeme string id) for
+leaves, and varint(number of children). The trailer holds the node count
+and the string table offset, so BinaryTreeReader can memory-map a file and
+walk its records without reading the whole tree into memory.
+
+save_tree_events writes the text and JSON lines formats from the events of
+Parser.events() as they arrive, so only one top-level Declaration is held
+at a time; the output is the same as save_tree's.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from parse_tree import NODE_NAMES, NodeView, PTNode, write_subtree, write_tree
+
+if TYPE_CHECKING:
+    from instrument import Stats
+    from parser import ParseEvent
+
+
+FORMATS = ("text", "jsonl", "binary")
+
+# Formats save_tree_events can write; a binary record needs its child count
+# up front, which for Program is only known at the end
+STREAM_FORMATS = ("text", "jsonl")
+
+# Output file name per format, as main.py writes them
+TREE_FILES = {"text": "parse_tree.txt", "jsonl": "parse_tree.jsonl", "binary": "parse_tree.bin"}
+
+MAGIC = b"CMPT\x01"
+_TRAILER = struct.Struct("<QQ")     # node count, string table offset
+
+# Token type codes in a binary record; 0 is a node without a token
+_TOKEN_TYPES = (None, "ID", "NUM", "KEYWORD", "SYMBOL")
+_TOKEN_CODE = {t: i for i, t in enumerate(_TOKEN_TYPES) if t is not None}
+
+_FLUSH_BYTES = 1 << 16
+
+Record = Tuple[int, str, Optional[Tuple[str, str]]]
+
+
+def _leaf_fields(name: str) -> Tuple[str, Optional[Tuple[str, str]]]:
+    # Symbol and token of a PTNode, whose leaves are named like "(ID, x)"
+    if not name.startswith("("):
+        return name, None
+    typ = name[1:name.index(", ")]
+    lex = name[len(typ) + 3:-1]
+    return (typ if typ in ("ID", "NUM") else lex), (typ, lex)
+
+
+def iter_records(root: PTNode) -> Iterator[Tuple[int, str, Optional[Tuple[str, str]], int]]:
+    """Pre-order (depth, symbol, token, number of children) of a PTNode or TreeStore tree."""
+    if isinstance(root, NodeView):
+        yield from _iter_store(root)
+        return
+    stack: List[Tuple[PTNode, int]] = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        kids = node.children
+        symbol, token = _leaf_fields(node.name)
+        yield depth, symbol, token, len(kids)
+        k = len(kids) - 1
+        while k >= 0:
+            stack.append((kids[k], depth + 1))
+            k -= 1
+
+
+def _iter_store(view: NodeView) -> Iterator[Tuple[int, str, Optional[Tuple[str, str]], int]]:
+    store = view.store
+    sym = store.sym
+    tok = store.tok
+    tokens = store.tokens
+    names = NODE_NAMES
+    child_ids = store.child_ids
+    stack: List[Tuple[int, int]] = [(view.index, 0)]
+    while stack:
+        i, depth = stack.pop()
+        kids = child_ids(i)
+        t = tok[i]
+        token = None
+        if t >= 0:
+            token = (tokens.typ(t), tokens.lexeme(t))
+        yield depth, names[sym[i]], token, len(kids)
+        k = len(kids) - 1
+        while k >= 0:
+            stack.append((kids[k], depth + 1))
+            k -= 1
+
+
+# ---------------------------------------------------------------------------
+# Writers
+# ---------------------------------------------------------------------------
+
+def write_jsonl(root: PTNode, out: TextIO, depth: int = 0) -> int:
+    """Write one JSON object per node, root at the given depth; returns the number of nodes."""
+    w = out.write
+    encoded: Dict[str, str] = {}    # JSON string literals, built once per symbol / lexeme
+    count = 0
+    base = depth
+    for_each = iter_records(root)
+    record = next(for_each, None)
+    while record is not None:
+        depth, symbol, token, _ = record
+        depth += base
+        s = encoded.get(symbol)
+        if s is None:
+            s = encoded[symbol] = json.dumps(symbol)
+        if token is None:
+            w(f'{{"depth": {depth}, "symbol": {s}, "token": null}}\n')
+        else:
+            lex = encoded.get(token[1])
+            if lex is None:
+                lex = encoded[token[1]] = json.dumps(token[1])
+            w(f'{{"depth": {depth}, "symbol": {s}, "token": ["{token[0]}", {lex}]}}\n')
+        count += 1
+        record = next(for_each, None)
+    return count
+
+
+def _put_varint(buf: bytearray, n: int) -> None:
+    while n >= 0x80:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def write_binary(root: PTNode, out: BinaryIO) -> int:
+    """Write the binary format to a byte stream; returns the number of nodes."""
+    strings: Dict[str, int] = {}
+    buf = bytearray(MAGIC)
+    written = 0
+    count = 0
+    for_each = iter_records(root)
+    record = next(for_each, None)
+    while record is not None:
+        _, symbol, token, n_children = record
+        sid = strings.get(symbol)
+        if sid is None:
+            sid = strings[symbol] = len(strings)
+        if token is None:
+            _put_varint(buf, sid * 5)
+        else:
+            _put_varint(buf, sid * 5 + _TOKEN_CODE[token[0]])
+            lid = strings.get(token[1])
+            if lid is None:
+                lid = strings[token[1]] = len(strings)
+            _put_varint(buf, lid)
+        _put_varint(buf, n_children)
+        count += 1
+        if len(buf) >= _FLUSH_BYTES:
+            out.write(buf)
+            written += len(buf)
+            buf = bytearray()
+        record = next(for_each, None)
+
+    table_offset = written + len(buf)
+    _put_varint(buf, len(strings))
+    # dicts keep insertion order, which is string id order
+    table = list(strings)
+    i = 0
+    while i < len(table):
+        data = table[i].encode("utf-8")
+        _put_varint(buf, len(data))
+        buf += data
+        i += 1
+    buf += _TRAILER.pack(count, table_offset)
+    out.write(buf)
+    return count
+
+
+def save_tree(root: PTNode, path: str, fmt: str = "text", stats: Optional["Stats"] = None) -> None:
+    """Write the tree to path in one of FORMATS (buffered, streamed)."""
+    if fmt == "text":
+        with open(path, "w", encoding="utf-8", buffering=_FLUSH_BYTES) as f:
+            write_tree(root, f, stats)
+        return
+    if stats is None:
+        _save_tree(root, path, fmt)
+        return
+    with stats.phase("render"):
+        stats.nodes_rendered += _save_tree(root, path, fmt)
+
+
+def _save_tree(root: PTNode, path: str, fmt: str) -> int:
+    if fmt == "jsonl":
+        with open(path, "w", encoding="utf-8", buffering=_FLUSH_BYTES) as f:
+            return write_jsonl(root, f)
+    if fmt == "binary":
+        with open(path, "wb") as f:
+            return write_binary(root, f)
+    raise ValueError(f"unknown tree format {fmt!r}, expected one of {FORMATS}")
+
+
+def save_tree_events(events: Iterator["ParseEvent"], path: str, fmt: str = "text", stats: Optional["Stats"] = None) -> None:
+    """Write the tree of Parser.events() to path in one of STREAM_FORMATS.
+
+    Each Declaration subtree is written before the next one is parsed. The
+    events must carry trees (tree="ptnode" or "store").
+    """
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"tree format {fmt!r} cannot be streamed, expected one of {STREAM_FORMATS}")
+    with open(path, "w", encoding="utf-8", buffering=_FLUSH_BYTES) as f:
+        if fmt == "text":
+            count, eof = _write_text_events(events, f)
+        else:
+            count, eof = _write_jsonl_events(events, f)
+    if fmt == "text" and not eof:
+        _close_program(path)
+    if stats is not None:
+        stats.nodes_rendered += count
+
+
+def _write_text_events(events: Iterator["ParseEvent"], out: TextIO) -> Tuple[int, bool]:
+    # Program's Declaration-list is written as if "$" followed it; after an
+    # Unexpected EOF _close_program fixes that up
+    w = out.write
+    w("Program")
+    count = 1
+    opened = 0
+    event = next(events)
+    while True:
+        while opened < event.depth:
+            if opened == 0:
+                w("\n├── Declaration-list")
+            else:
+                w("\n│   " + "    " * (opened - 1) + "└── Declaration-list")
+            opened += 1
+            count += 1
+        if event.kind == "end":
+            break
+        if event.tree is not None:
+            count += write_subtree(event.tree, out, "│   " + "    " * (event.depth - 1), event.last)
+        event = next(events)
+
+    if event.epsilon:
+        w("\n│   " + "    " * (event.depth - 1) + "└── epsilon")
+        count += 1
+    if event.eof:
+        w("\n└── $")
+        count += 1
+    return count, event.eof
+
+
+def _close_program(path: str) -> None:
+    # Without "$" the Declaration-list is Program's last child: its line and
+    # the first column of every line below it change
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(path, "r", encoding="utf-8", newline="") as src, \
+            open(tmp, "w", encoding="utf-8", newline="", buffering=_FLUSH_BYTES) as dst:
+        dst.write(src.readline())
+        line = src.readline()
+        if line:
+            dst.write("└── " + line[4:])
+            line = src.readline()
+        while line:
+            dst.write("    " + line[4:])
+            line = src.readline()
+    os.replace(tmp, path)
+
+
+def _write_jsonl_events(events: Iterator["ParseEvent"], out: TextIO) -> Tuple[int, bool]:
+    w = out.write
+    w('{"depth": 0, "symbol": "Program", "token": null}\n')
+    count = 1
+    opened = 0
+    event = next(events)
+    while True:
+        while opened < event.depth:
+            opened += 1
+            w(f'{{"depth": {opened}, "symbol": "Declaration-list", "token": null}}\n')
+            count += 1
+        if event.kind == "end":
+            break
+        if event.tree is not None:
+            count += write_jsonl(event.tree, out, event.depth + 1)
+        event = next(events)
+
+    if event.epsilon:
+        w(f'{{"depth": {event.depth + 1}, "symbol": "epsilon", "token": null}}\n')
+        count += 1
+    if event.eof:
+        w('{"depth": 1, "symbol": "$", "token": null}\n')
+        count += 1
+    return count, event.eof
+
+
+# ---------------------------------------------------------------------------
+# Binary reader
+# ---------------------------------------------------------------------------
+
+class BinaryTreeReader:
+    """Memory-mapped view of a binary tree file; nodes are decoded as they are iterated.
+
+    Strings are decoded on first use. Use as a context manager or call
+    close(); records already yielded stay valid after closing.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ValueError(f"{path}: not a parse tree file")
+        m = self._map
+        if len(m) < len(MAGIC) + _TRAILER.size or m[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: not a parse tree file")
+        self.count, self._table = _TRAILER.unpack_from(m, len(m) - _TRAILER.size)
+
+        # Offsets of the strings in the table; decoding waits until they are used
+        n, pos = _get_varint(m, self._table)
+        self._offsets: List[int] = []
+        self._strings: List[Optional[str]] = [None] * n
+        i = 0
+        while i < n:
+            self._offsets.append(pos)
+            length, pos = _get_varint(m, pos)
+            pos += length
+            i += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "BinaryTreeReader":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def string(self, sid: int) -> str:
+        s = self._strings[sid]
+        if s is None:
+            length, pos = _get_varint(self._map, self._offsets[sid])
+            s = self._strings[sid] = self._map[pos:pos + length].decode("utf-8")
+        return s
+
+    def __iter__(self) -> Iterator[Record]:
+        """Pre-order (depth, symbol, token) of every node."""
+        m = self._map
+        string = self.string
+        types = _TOKEN_TYPES
+        pos = len(MAGIC)
+        end = self._table
+        # Children still to come at each open level
+        pending: List[int] = []
+        while pos < end:
+            code, pos = _get_varint(m, pos)
+            sid, typ = divmod(code, 5)
+            token = None
+            if typ:
+                lid, pos = _get_varint(m, pos)
+                token = (types[typ], string(lid))
+            n_children, pos = _get_varint(m, pos)
+
+            yield len(pending), string(sid), token
+
+            if pending:
+                pending[-1] -= 1
+            if n_children:
+                pending.append(n_children)
+            else:
+                while pending and pending[-1] == 0:
+                    pending.pop()
+
+
+def _get_varint(buf: mmap.mmap, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
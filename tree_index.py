@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""Index over a parse tree for structural queries without walking it.
+
+    index = build_index(tree, parser.index)     # tree from Parser(..., tree="store")
+    f = index.function("main")
+    index.nodes("Return-stmt", within=f)        # every return inside main
+    index.uses("x")                             # every ID leaf spelled x
+    index.lines(f)                              # (first line, last line)
+
+It is built in one pass over a TreeStore. The ids are the TreeStore's
+pre-order node ids, so the subtree of node i is the id range
+[i, end(i)]. For every node the index keeps its symbol, parent, subtree
+end and the lines of its first and last tokens. It also keeps a sorted id
+list for every symbol (nonterminals, terminals and "epsilon") and for every
+identifier lexeme. A query "inside" a node is two binary searches in one
+of those lists.
+
+save() / load_index() write the index to a file of its own, e.g.
+parse_tree.idx next to parse_tree.txt. A loaded index answers every query
+without the tree. Pass the tree to load_index to check that the index was
+built from it.
+"""
+
+from __future__ import annotations
+
+import marshal
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from grammar import GRAMMAR_KEY, ID_ID, SYMBOL_ID
+from parse_tree import NODE_NAMES, NodeView
+from source_index import LineIndex
+
+
+# Bump when the file layout changes
+INDEX_VERSION = 1
+
+NAME_ID: Dict[str, int] = {name: i for i, name in enumerate(NODE_NAMES)}
+
+_DECLARATION = SYMBOL_ID["Declaration"]
+_DECLARATION_INITIAL = SYMBOL_ID["Declaration-initial"]
+_FUN_DECLARATION_PRIME = SYMBOL_ID["Fun-declaration-prime"]
+_CALL_SYMS = (SYMBOL_ID["Var-call-prime"], SYMBOL_ID["Factor-prime"])
+_OPEN_PAREN = SYMBOL_ID["("]
+
+
+def _ints(data: bytes) -> array:
+    a = array("i")
+    a.frombytes(data)
+    return a
+
+
+class TreeIndex:
+    def __init__(
+        self,
+        sym: array,
+        parent: array,
+        end: array,
+        first_line: array,
+        last_line: array,
+        by_symbol: Dict[int, array],
+        by_lexeme: Dict[str, array],
+    ):
+        self.sym = sym                  # "h": symbol id (NODE_NAMES) per node
+        self.parent = parent            # "i": parent id, -1 for the root
+        self.end = end                  # "i": last id of the node's subtree
+        self.first_line = first_line    # "i": line of the subtree's first token, 0 if it has none
+        self.last_line = last_line      # "i": line of its last token, 0 if it has none
+        self.by_symbol = by_symbol
+        self.by_lexeme = by_lexeme
+
+    def __len__(self) -> int:
+        return len(self.sym)
+
+    # -- queries --------------------------------------------------------------
+
+    def _range(self, ids: Optional[array], within: Optional[int]) -> List[int]:
+        if ids is None:
+            return []
+        if within is None:
+            return ids.tolist()
+        return ids[bisect_left(ids, within):bisect_right(ids, self.end[within])].tolist()
+
+    def nodes(self, symbol: str, within: Optional[int] = None) -> List[int]:
+        """Ids of the nodes with this symbol, in pre-order; only inside `within` if given."""
+        if symbol not in NAME_ID:
+            raise KeyError(f"unknown symbol {symbol!r}")
+        return self._range(self.by_symbol.get(NAME_ID[symbol]), within)
+
+    def uses(self, name: str, within: Optional[int] = None) -> List[int]:
+        """Ids of the ID leaves spelled `name`."""
+        return self._range(self.by_lexeme.get(name), within)
+
+    def calls(self, within: Optional[int] = None) -> List[int]:
+        """Call nodes: Var-call-prime / Factor-prime nodes that start with "(", in pre-order."""
+        sym = self.sym
+        end = self.end
+        found: List[int] = []
+        k = 0
+        while k < len(_CALL_SYMS):
+            ids = self._range(self.by_symbol.get(_CALL_SYMS[k]), within)
+            found.extend(i for i in ids if end[i] > i and sym[i + 1] == _OPEN_PAREN)
+            k += 1
+        found.sort()
+        return found
+
+    def function(self, name: str) -> Optional[int]:
+        """Id of the first Declaration of function `name` in pre-order.
+
+        Like the grammar, this includes declarations nested in a compound statement.
+        """
+        sym = self.sym
+        parent = self.parent
+        end = self.end
+        ids = self.uses(name)
+        k = 0
+        while k < len(ids):
+            initial = parent[ids[k]]
+            if initial >= 0 and sym[initial] == _DECLARATION_INITIAL:
+                decl = parent[initial]
+                # Declaration-prime follows the initial part; its first child tells functions apart
+                prime = end[initial] + 1
+                if (
+                    decl >= 0 and sym[decl] == _DECLARATION
+                    and prime < end[decl] and sym[prime + 1] == _FUN_DECLARATION_PRIME
+                ):
+                    return decl
+            k += 1
+        return None
+
+    def symbol(self, i: int) -> str:
+        return NODE_NAMES[self.sym[i]]
+
+    def subtree(self, i: int) -> range:
+        return range(i, self.end[i] + 1)
+
+    def lines(self, i: int) -> Tuple[int, int]:
+        """(first, last) source line of the node's tokens; (0, 0) if it has none."""
+        return self.first_line[i], self.last_line[i]
+
+    def ancestors(self, i: int) -> List[int]:
+        """Ids from the parent of i up to the root."""
+        out: List[int] = []
+        p = self.parent[i]
+        while p >= 0:
+            out.append(p)
+            p = self.parent[p]
+        return out
+
+    # -- files ----------------------------------------------------------------
+
+    def save(self, path: str) -> None:
+        payload = (
+            INDEX_VERSION,
+            GRAMMAR_KEY,
+            self.sym.tobytes(),
+            self.parent.tobytes(),
+            self.end.tobytes(),
+            self.first_line.tobytes(),
+            self.last_line.tobytes(),
+            {s: ids.tobytes() for s, ids in self.by_symbol.items()},
+            {lex: ids.tobytes() for lex, ids in self.by_lexeme.items()},
+        )
+        with open(path, "wb") as f:
+            f.write(zlib.compress(marshal.dumps(payload), 1))
+
+
+def build_index(tree: NodeView, lines: LineIndex) -> TreeIndex:
+    """Index a whole TreeStore tree; lines is the source's LineIndex (Parser.index)."""
+    if not isinstance(tree, NodeView):
+        raise TypeError("build_index() needs a TreeStore tree: Parser(..., engine='int', tree='store')")
+    if tree.index != 0:
+        raise ValueError("only whole TreeStore trees can be indexed")
+    store = tree.store
+    sym = store.sym
+    tok = store.tok
+    first = store.first
+    nxt = store.next
+    tokens = store.tokens
+    n = len(sym)
+
+    parent = array("i", [-1]) * n
+    end = array("i", range(n))
+    by_symbol: Dict[int, array] = {}
+    by_lexeme: Dict[str, array] = {}
+    # Line of every leaf (0 elsewhere) and the nearest leaf at or before each id
+    leaf_line = array("i", [0]) * n
+    prev_leaf = array("i", [-1]) * n
+
+    last_leaf = -1
+    i = 0
+    while i < n:
+        s = sym[i]
+        ids = by_symbol.get(s)
+        if ids is None:
+            ids = by_symbol[s] = array("i")
+        ids.append(i)
+
+        t = tok[i]
+        if t >= 0:
+            leaf_line[i] = lines.line(tokens.start[t])
+            last_leaf = i
+            if s == ID_ID:
+                lex = tokens.lexeme(t)
+                ids = by_lexeme.get(lex)
+                if ids is None:
+                    ids = by_lexeme[lex] = array("i")
+                ids.append(i)
+        prev_leaf[i] = last_leaf
+
+        c = first[i]
+        while c >= 0:
+            parent[c] = i
+            c = nxt[c]
+        i += 1
+
+    # Children have larger ids than their parent, so one backward pass
+    # settles every subtree end; the nearest leaf at or after each id comes
+    # from the same pass
+    first_line = array("i", [0]) * n
+    last_line = array("i", [0]) * n
+    next_leaf = -1
+    i = n - 1
+    while i >= 0:
+        if tok[i] >= 0:
+            next_leaf = i
+        e = end[i]
+        if next_leaf >= 0 and next_leaf <= e:
+            first_line[i] = leaf_line[next_leaf]
+            last_line[i] = leaf_line[prev_leaf[e]]
+        p = parent[i]
+        if p >= 0 and e > end[p]:
+            end[p] = e
+        i -= 1
+
+    return TreeIndex(sym, parent, end, first_line, last_line, by_symbol, by_lexeme)
+
+
+def load_index(path: str, tree: Optional[NodeView] = None) -> TreeIndex:
+    """Read an index written by TreeIndex.save; with tree, check that it was built from it."""
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        payload = marshal.loads(zlib.decompress(data))
+    except (zlib.error, ValueError, EOFError, TypeError) as exc:
+        raise ValueError(f"{path}: not a tree index file") from exc
+    if not isinstance(payload, tuple) or len(payload) != 9 or payload[0] != INDEX_VERSION:
+        raise ValueError(f"{path}: not a tree index file of version {INDEX_VERSION}")
+    _, key, sym_b, parent_b, end_b, first_b, last_b, by_symbol, by_lexeme = payload
+    if key != GRAMMAR_KEY:
+        raise ValueError(f"{path}: built for another grammar")
+
+    sym = array("h")
+    sym.frombytes(sym_b)
+    if tree is not None and (tree.index != 0 or tree.store.sym != sym):
+        raise ValueError(f"{path}: index does not match the tree")
+    return TreeIndex(
+        sym,
+        _ints(parent_b),
+        _ints(end_b),
+        _ints(first_b),
+        _ints(last_b),
+        {s: _ints(ids) for s, ids in by_symbol.items()},
+        {lex: _ints(ids) for lex, ids in by_lexeme.items()},
+    )